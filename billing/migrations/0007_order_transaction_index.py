@@ -0,0 +1,17 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0006_alter_order_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'transaction_id'], name='billing_ord_user_id_ddc43b_idx'),
+        ),
+    ]
@@ -53,6 +53,11 @@ class Order(TimeStampedModel):
     transaction_id = models.CharField(max_length=100, blank=True, help_text="ID from Stripe/PayPal")
     external_transaction_id = models.CharField(max_length=100, blank=True, null=True, verbose_name="Provider Ref / UTR")
     currency = models.CharField(max_length=10, default='INR')
+
+    class Meta:
+        # Payment callbacks look orders up by (transaction_id, user)
+        indexes = [models.Index(fields=['user', 'transaction_id'])]
+
     def __str__(self):
         return f"Order #{self.id} - {self.user} ({self.status})"
 
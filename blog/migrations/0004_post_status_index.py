@@ -0,0 +1,17 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_post_tags_post_views'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', 'created_at'], name='blog_post_status_9deff2_idx'),
+        ),
+    ]
@@ -40,6 +40,8 @@ class Post(models.Model):
 
     class Meta:
         ordering = ('-created_at',)
+        # Published listings, newest first
+        indexes = [models.Index(fields=['status', 'created_at'])]
 
     def __str__(self):
         return self.title
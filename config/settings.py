@@ -167,6 +167,71 @@ DATABASES = {
 }
 
 
+# Cache
+# 'answers' backs the write-behind answer buffer (mocktests/answer_buffer.py),
+# the attempt-token denylist and the event buffer. It must be shared by every
+# web node, survive a web-process crash and never evict live entries: set
+# REDIS_URL to a Redis (or compatible) server with maxmemory-policy noeviction.
+# Without REDIS_URL it falls back to DurableFileBasedCache on local disk
+# (mocktests/cache_backends.py), which is only correct on a single node (dev).
+# Never use locmem or the stock FileBasedCache (which culls random entries once
+# MAX_ENTRIES is reached).
+
+# 'default' must be shared by every web worker (Redis, Memcached) for
+# `manage.py prewarm_test`, which refuses to run against locmem.
+REDIS_URL = env('REDIS_URL', default='')
+
+if REDIS_URL:
+    ANSWERS_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'TIMEOUT': None,
+    }
+else:
+    ANSWERS_CACHE = {
+        'BACKEND': env('ANSWER_BUFFER_BACKEND', default='mocktests.cache_backends.DurableFileBasedCache'),
+        'LOCATION': env('ANSWER_BUFFER_LOCATION', default=os.path.join(BASE_DIR, 'var', 'answer_buffer')),
+        'TIMEOUT': None,
+        # Hard limit: past it (after expired entries are removed) saves are written straight to the database
+        'OPTIONS': {'MAX_ENTRIES': env('ANSWER_BUFFER_MAX_ENTRIES', cast=int, default=500000)},
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('CACHE_LOCATION', default=''),
+    },
+    'answers': ANSWERS_CACHE,
+}
+
+# Stage autosaves in the 'answers' cache and flush them to UserAnswer in bulk
+# (`manage.py flush_answer_buffer --loop 30` plus on every submit).
+ANSWER_WRITE_BEHIND = env('ANSWER_WRITE_BEHIND', cast=bool, default=False)
+ANSWER_BUFFER_CACHE = 'answers'
+
+# Denylist for revoked attempt tokens; must be shared by every web worker
+ATTEMPT_TOKEN_CACHE = 'answers'
+
+# Buffered exam events (see mocktests/attempt_events.py), drained by
+# `manage.py flush_attempt_events --loop 60` and on every submit
+EVENT_BUFFER_CACHE = 'answers'
+
+# Partial chunked audio uploads (see mocktests/audio_uploads.py); must be shared by every web worker
+AUDIO_UPLOAD_TEMP_DIR = env('AUDIO_UPLOAD_TEMP_DIR', default=os.path.join(BASE_DIR, 'var', 'audio_uploads'))
+
+# Queue submissions in SubmissionJob and grade them in `manage.py process_submissions`
+# instead of inside the submit request.
+ASYNC_SUBMISSIONS = env('ASYNC_SUBMISSIONS', cast=bool, default=False)
+
+# Essay answers are scored in batches by `manage.py score_essays` (inline when
+# ASYNC_SUBMISSIONS is off) through ESSAY_SCORER, a dotted path to an
+# EssayScorer (see mocktests/essay_scoring.py). RemoteEssayScorer posts the
+# batches to ESSAY_SCORER_URL.
+ESSAY_SCORER = env('ESSAY_SCORER', default='mocktests.essay_scoring.HeuristicEssayScorer')
+ESSAY_SCORER_URL = env('ESSAY_SCORER_URL', default='')
+ESSAY_SCORER_TIMEOUT = env('ESSAY_SCORER_TIMEOUT', cast=int, default=30)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -1,3 +1,165 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from billing.models import Order
+from blog.models import Post
+from enrollments.models import UserEnrollment
+from marketplace.models import MarketplaceItem
+from mocktests.grading import clear_answer_keys
+from mocktests.models import (
+    MockTestAttributes, TestSection, TestQuestion, QuestionOption, UserTestAttempt
+)
+
+User = get_user_model()
+
+# Queries each hot view may run, session and user lookups included.
+# Raise a budget only together with the change that needs it.
+QUERY_BUDGETS = {
+    'take_test': 6,
+    'test_result': 3,
+    'item_list': 7,
+    'item_detail': 11,
+    'leaderboard': 6,
+    'dashboard': 7,
+}
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Seeds a few hundred candidates, attempts, enrollments, orders and posts,
+    then pins the number of queries of the hottest views. A view that starts
+    querying per row (N+1) blows its budget and fails the volume check.
+    """
+    CANDIDATES = 200
+    ITEMS = 24
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='student', email='student@test.com', password='password')
+        cls.candidates = User.objects.bulk_create([
+            User(username=f'candidate{i}', email=f'candidate{i}@test.com', first_name=f'C{i}')
+            for i in range(cls.CANDIDATES)
+        ])
+
+        cls.items = MarketplaceItem.objects.bulk_create([
+            MarketplaceItem(title=f"Mock {i}", slug=f"mock-{i}", item_type='MOCK_TEST', is_active=True, price=10)
+            for i in range(cls.ITEMS)
+        ])
+        cls.tests = MockTestAttributes.objects.bulk_create([
+            MockTestAttributes(item=item, duration_minutes=60, pass_percentage=50) for item in cls.items
+        ])
+        cls.item, cls.test = cls.items[0], cls.tests[0]
+
+        sections = TestSection.objects.bulk_create([
+            TestSection(test=cls.test, title=f"Section {s}", sort_order=s) for s in range(3)
+        ])
+        questions = TestQuestion.objects.bulk_create([
+            TestQuestion(section=section, question_text=f"Q{s}-{i}", marks=4, sort_order=i)
+            for s, section in enumerate(sections) for i in range(10)
+        ])
+        QuestionOption.objects.bulk_create([
+            QuestionOption(question=q, option_text=f"O{j}", is_correct=(j == 0), mask_bit=j) for q in questions for j in range(4)
+        ])
+
+        cls.seed_volume(cls.candidates)
+        UserEnrollment.objects.bulk_create([UserEnrollment(user=cls.user, item=item) for item in cls.items])
+
+        cls.in_progress = UserTestAttempt.objects.create(user=cls.user, test=cls.test)
+        cls.submitted = UserTestAttempt.objects.create(
+            user=cls.user, test=cls.test, status=UserTestAttempt.Status.SUBMITTED, score=40
+        )
+        Post.objects.bulk_create([
+            Post(title=f"Post {i}", slug=f"post-{i}", author=cls.user, content="...",
+                 status='published' if i % 4 else 'draft')
+            for i in range(60)
+        ])
+
+    @classmethod
+    def seed_volume(cls, users):
+        """Two graded attempts at each test, an enrollment and an order per candidate."""
+        UserTestAttempt.objects.bulk_create([
+            UserTestAttempt(user=user, test=test, status=UserTestAttempt.Status.SUBMITTED, score=(user.pk * 7 + n) % 120)
+            for user in users for test in cls.tests[:2] for n in range(2)
+        ])
+        UserEnrollment.objects.bulk_create(
+            [UserEnrollment(user=user, item=cls.items[user.pk % cls.ITEMS]) for user in users],
+            ignore_conflicts=True,
+        )
+        Order.objects.bulk_create([
+            Order(user=user, total_amount=10, status=Order.OrderStatus.PAID, transaction_id=f"TXN{user.pk}")
+            for user in users
+        ])
+
+    def setUp(self):
+        cache.clear()
+        clear_answer_keys()
+        self.client.force_login(self.user)
+
+    def urls(self):
+        return {
+            'take_test': reverse('take_test', args=[self.in_progress.id]),
+            'test_result': reverse('test_result', args=[self.submitted.id]),
+            'item_list': reverse('marketplace:item_list'),
+            'item_detail': reverse('marketplace:item_detail', args=[self.item.slug]),
+            'leaderboard': reverse('leaderboard_slug', args=[self.item.slug]),
+            'dashboard': reverse('dashboard'),
+        }
+
+    def count_queries(self, url):
+        # Warm caches (paper, result snapshot) first: the budget is for the steady state
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return ctx
+
+    def test_hot_views_stay_within_budget(self):
+        for name, url in self.urls().items():
+            with self.subTest(view=name):
+                ctx = self.count_queries(url)
+                self.assertLessEqual(
+                    len(ctx), QUERY_BUDGETS[name],
+                    "\n".join(q['sql'] for q in ctx.captured_queries)
+                )
+
+    def test_query_counts_do_not_grow_with_volume(self):
+        before = {name: len(self.count_queries(url)) for name, url in self.urls().items()}
+
+        more = User.objects.bulk_create([
+            User(username=f'late{i}', email=f'late{i}@test.com') for i in range(self.CANDIDATES)
+        ])
+        self.seed_volume(more)
+        UserTestAttempt.objects.bulk_create([
+            UserTestAttempt(user=self.user, test=test, status=UserTestAttempt.Status.SUBMITTED, score=10)
+            for test in self.tests
+        ])
+
+        after = {name: len(self.count_queries(url)) for name, url in self.urls().items()}
+        self.assertEqual(before, after)
 
-# Create your tests here.
+    @skipUnless(connection.vendor == 'postgresql', "EXPLAIN plans are checked on PostgreSQL")
+    def test_hot_lookups_use_indexes(self):
+        lookups = {
+            'attempts of a candidate': UserTestAttempt.objects.filter(
+                user=self.user, test=self.test, status=UserTestAttempt.Status.SUBMITTED
+            ),
+            'test leaderboard': UserTestAttempt.objects.filter(
+                test=self.test, status=UserTestAttempt.Status.SUBMITTED, score__isnull=False
+            ).order_by('-score'),
+            'enrollment check': UserEnrollment.objects.filter(user=self.user, item=self.item, is_active=True),
+            'payment callback': Order.objects.filter(user=self.user, transaction_id='TXN1'),
+            'published posts': Post.objects.filter(status='published').order_by('-created_at'),
+        }
+        with connection.cursor() as cursor:
+            # Test tables are tiny; make the planner show which index it would use
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        for name, queryset in lookups.items():
+            with self.subTest(lookup=name):
+                plan = queryset.explain()
+                self.assertNotIn('Seq Scan', plan)
+                self.assertIn('Index', plan)
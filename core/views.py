@@ -5,7 +5,8 @@ from .utils import get_leaderboard_data, get_user_rank
 
 from marketplace.models import MarketplaceItem
 from enrollments.models import UserEnrollment
-from mocktests.models import UserTestAttempt
+from mocktests.models import UserTestAttempt, ScoreHistogram
+from mocktests.percentiles import standing
 from .models import Category
 from django.db.models import Q
 from django.core.paginator import Paginator
@@ -130,21 +131,28 @@ def dashboard_view(request):
     enrolled_qs = UserEnrollment.objects.filter(user=user, is_active=True)
     my_enrollments = list(enrolled_qs.select_related('item').order_by('-created')[:6])
 
+    # Latest submitted attempt per enrolled item in one query
+    latest = {}
+    for attempt in UserTestAttempt.objects.filter(
+        user=user,
+        test__item__in=[e.item_id for e in my_enrollments],
+        status='SUBMITTED'
+    ).select_related('test').order_by('-created'):
+        latest.setdefault(attempt.test.item_id, attempt)
     for enrollment in my_enrollments:
-        enrollment.latest_attempt = UserTestAttempt.objects.filter(
-            user=user, 
-            test__item=enrollment.item,
-            status='SUBMITTED'
-        ).order_by('-created').first()
+        enrollment.latest_attempt = latest.get(enrollment.item_id)
 
     recent_attempts = UserTestAttempt.objects.filter(
         user=user
     ).select_related('test__item').order_by('-modified')[:5]
 
+    submitted = UserTestAttempt.objects.filter(user=user, status='SUBMITTED').aggregate(
+        count=Count('id'), avg=Avg('score')
+    )
     stats = {
         'enrolled_count': enrolled_qs.count(),
-        'tests_taken': UserTestAttempt.objects.filter(user=user, status='SUBMITTED').count(),
-        'avg_score': UserTestAttempt.objects.filter(user=user, status='SUBMITTED').aggregate(Avg('score'))['score__avg'] or 0
+        'tests_taken': submitted['count'],
+        'avg_score': submitted['avg'] or 0
     }
 
     context = {
@@ -267,6 +275,12 @@ def leaderboard(request, slug=None):
                 final_leaderboard.append(user_entry)
 
     rankings = final_leaderboard
+
+    # Percentiles from the test's score histogram (O(bins) per row)
+    if selected_test:
+        histogram = ScoreHistogram.objects.filter(test__item=selected_test).first()
+        for entry in rankings:
+            entry['standing'] = standing(histogram, entry['total_score'])
     
     # 3. Get User's Latest Attempt for "View Result" button
     user_latest_attempt = None
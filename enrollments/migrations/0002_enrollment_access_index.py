@@ -0,0 +1,17 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userenrollment',
+            index=models.Index(fields=['user', 'item', 'is_active'], name='enrollments_user_id_eba972_idx'),
+        ),
+    ]
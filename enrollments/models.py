@@ -22,6 +22,8 @@ class UserEnrollment(TimeStampedModel):
     class Meta:
         # Prevent double enrollment
         unique_together = ('user', 'item')
+        # Access checks and the dashboard filter on is_active too
+        indexes = [models.Index(fields=['user', 'item', 'is_active'])]
 
     def __str__(self):
         return f"{self.user} -> {self.item}"
\ No newline at end of file
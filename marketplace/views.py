@@ -1,5 +1,5 @@
 from django.views.generic import DetailView, ListView
-from django.db.models import Avg, Max
+from django.db.models import Avg, Max, Sum
 from django.utils import timezone
 from .models import MarketplaceItem, Testimonial
 from enrollments.models import UserEnrollment
@@ -131,19 +131,19 @@ class ItemDetailView(DetailView):
     context_object_name = 'item'
 
     def get_queryset(self):
-        return MarketplaceItem.objects.filter(is_active=True)
+        return MarketplaceItem.objects.filter(is_active=True).select_related('mock_test_details')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        item = self.get_object()
+        item = self.object
         user = self.request.user
         
         # 1. Reviews & Ratings
         reviews = Testimonial.objects.filter(item=item).order_by('-created')
-        avg_rating = reviews.aggregate(Avg('rating'))['rating__avg']
+        rating = reviews.aggregate(avg=Avg('rating'), count=Count('id'))
         context['reviews'] = reviews
-        context['avg_rating'] = avg_rating if avg_rating else 0
-        context['review_count'] = reviews.count()
+        context['avg_rating'] = rating['avg'] if rating['avg'] else 0
+        context['review_count'] = rating['count']
 
         # 2. Enrollment Check
         is_enrolled = False
@@ -171,24 +171,27 @@ class ItemDetailView(DetailView):
             
             # Stats (Total Questions, Total Marks)
             # Efficiently sum up questions and marks from all sections
-            questions = TestQuestion.objects.filter(section__test=details)
-            context['total_questions'] = questions.count()
-            
-            total_marks = 0
-            for q in questions:
-                total_marks += q.marks
-            context['total_marks'] = total_marks
-
-            # Quick Stats (Attempts, Scores)
-            attempts = UserTestAttempt.objects.filter(test=details, status=UserTestAttempt.Status.SUBMITTED)
-            total_attempts = attempts.count()
-            
-            agg = attempts.aggregate(Avg('score'), Max('score'))
-            avg_score = agg['score__avg'] or 0
-            top_score = agg['score__max'] or 0
-            
-            pass_count = attempts.filter(is_passed=True).count()
-            pass_rate = (pass_count / total_attempts * 100) if total_attempts > 0 else 0
+            paper = TestQuestion.objects.filter(section__test=details).aggregate(
+                count=Count('id'), marks=Sum('marks')
+            )
+            context['total_questions'] = paper['count']
+            context['total_marks'] = paper['marks'] or 0
+            # Section-wise breakdown with question counts in one query
+            context['test_sections'] = list(
+                details.sections.annotate(question_count=Count('questions')).order_by('sort_order')
+            )
+
+            # Quick Stats (Attempts, Scores) in one pass over the (test, status, score) index
+            agg = UserTestAttempt.objects.filter(
+                test=details, status=UserTestAttempt.Status.SUBMITTED
+            ).aggregate(
+                total=Count('id'), avg=Avg('score'), top=Max('score'),
+                passed=Count('id', filter=Q(is_passed=True)),
+            )
+            total_attempts = agg['total']
+            avg_score = agg['avg'] or 0
+            top_score = agg['top'] or 0
+            pass_rate = (agg['passed'] / total_attempts * 100) if total_attempts > 0 else 0
 
             context['quick_stats'] = {
                 'total_attempts': total_attempts,
@@ -5,13 +5,17 @@ from django.urls import path
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.http import HttpResponse
+from django.utils.html import format_html, format_html_join
 
 from .models import (
     MockTestAttributes, TestSection, TestQuestion, 
     QuestionOption, UserTestAttempt, QuestionReport, 
     QuestionAudio, QuestionMedia, UserAnswer,
-    TestSyllabus, TestEligibility
+    TestSyllabus, TestEligibility, SubmissionJob, EssayScoringJob, QuestionStats, ShiftSet
 )
+from .dedup import DuplicateIndex
+from .essay_scoring import rescore_attempts
+from .regrade import regrade_questions
 
 # --- FORMS ---
 
@@ -57,19 +61,64 @@ class TestEligibilityInline(admin.StackedInline):
 
 @admin.register(TestQuestion)
 class TestQuestionAdmin(admin.ModelAdmin):
-    list_display = ('short_text', 'section', 'question_type', 'marks')
-    list_filter = ('section', 'question_type')
+    list_display = ('short_text', 'section', 'question_type', 'marks', 'difficulty', 'p_value', 'discrimination')
+    list_filter = ('section', 'question_type', 'difficulty')
+    list_select_related = ('section', 'stats')
     search_fields = ('question_text',)
+    readonly_fields = ('item_analysis',)
     # Add the new inlines here
     inlines = [QuestionImageInline, QuestionAudioInline, QuestionOptionInline]
     
     def short_text(self, obj):
         return obj.question_text[:50] + "..." if obj.question_text else ""
 
+    def _stats(self, obj):
+        try:
+            return obj.stats
+        except QuestionStats.DoesNotExist:
+            return None
+
+    @admin.display(description="P-value", ordering='stats__p_value')
+    def p_value(self, obj):
+        stats = self._stats(obj)
+        return f"{stats.p_value:.2f}" if stats and stats.p_value is not None else "-"
+
+    @admin.display(description="Discrimination", ordering='stats__discrimination')
+    def discrimination(self, obj):
+        stats = self._stats(obj)
+        return f"{stats.discrimination:.2f}" if stats and stats.discrimination is not None else "-"
+
+    @admin.display(description="Item analysis")
+    def item_analysis(self, obj):
+        stats = self._stats(obj)
+        if stats is None:
+            return "Not computed yet (manage.py compute_item_stats)"
+        summary = format_html(
+            "{} attempts, {} answered, p-value {}, discrimination {}, suggested difficulty {} (computed {})",
+            stats.attempts, stats.answered,
+            self.p_value(obj), self.discrimination(obj),
+            stats.suggested_difficulty or "-", stats.computed_at.strftime("%Y-%m-%d %H:%M"),
+        )
+        option_rows = []
+        for option in obj.options.all():
+            picked = stats.options.get(str(option.id), {})
+            option_rows.append((
+                option.option_text[:80], "✔" if option.is_correct else "", picked.get('count', 0),
+                f"{picked['rate']:.1%}" if picked.get('rate') is not None else "-",
+                picked.get('discrimination') if picked.get('discrimination') is not None else "-",
+            ))
+        rows = format_html_join("", "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>", option_rows)
+        if not rows:
+            return summary
+        return format_html(
+            "{}<table><tr><th>Option</th><th>Key</th><th>Picks</th><th>Rate</th><th>Discrimination</th></tr>{}</table>",
+            summary, rows,
+        )
+
 @admin.register(TestSection)
 class TestSectionAdmin(admin.ModelAdmin):
-    list_display = ('title', 'test', 'sort_order')
-    list_filter = ('test',)
+    list_display = ('title', 'test', 'subject', 'module', 'sort_order')
+    list_filter = ('test', 'subject', 'module')
     search_fields = ('title',)
     inlines = [TestQuestionInline]
     
@@ -130,6 +179,8 @@ class TestSectionAdmin(admin.ModelAdmin):
                 df = df.where(pd.notnull(df), None)
 
                 count = 0
+                duplicates = []
+                dedup = DuplicateIndex.load()
                 
                 # 3. ITERATE
                 for index, row in df.iterrows():
@@ -140,11 +191,22 @@ class TestSectionAdmin(admin.ModelAdmin):
                     except (TestSection.DoesNotExist, ValueError):
                         continue # Skip invalid rows
 
+                    question_type = str(row['Type']).strip().upper()
+                    option_texts = [
+                        row.get(f'Option_{key}') for key in 'ABCD' if row.get(f'Option_{key}')
+                    ] if question_type in ('MCQ', 'MULTI') else []
+
+                    # Skip near-duplicates of the bank (and of earlier rows of this file)
+                    match = dedup.find(row['Question_Text'], option_texts)
+                    if match:
+                        duplicates.append(f"row {index + 2} ~ Q{match[0]}")
+                        continue
+
                     # Create Question
                     q = TestQuestion.objects.create(
                         section=section,
                         question_text=row['Question_Text'],
-                        question_type=str(row['Type']).strip().upper(),
+                        question_type=question_type,
                         marks=row['Marks'] if row['Marks'] else 1,
                         explanation=row.get('Explanation', ''),
                         sort_order=index + 1
@@ -152,9 +214,10 @@ class TestSectionAdmin(admin.ModelAdmin):
 
                     raw_correct = str(row['Correct_Option']).strip() if row['Correct_Option'] else ''
 
-                    # Create Options (Only for MCQ)
-                    if q.question_type == 'MCQ':
-                        
+                    # Create Options (MCQ, or MULTI with several letters: "A,C")
+                    if q.question_type in ('MCQ', 'MULTI'):
+                        correct_keys = set(raw_correct.upper().replace(' ', '').split(','))
+
                         options_map = {
                             'A': row.get('Option_A'),
                             'B': row.get('Option_B'),
@@ -167,15 +230,22 @@ class TestSectionAdmin(admin.ModelAdmin):
                                 QuestionOption.objects.create(
                                     question=q,
                                     option_text=text,
-                                    is_correct=(key == raw_correct.upper())
+                                    is_correct=(key in correct_keys)
                                 )
                     elif q.question_type == 'NUMERIC' or q.question_type == 'INPUT':
                         q.correct_answer_value = raw_correct
                         q.save()
                         
+                    dedup.add(q.id, q.question_text, option_texts)
                     count += 1
                 
                 self.message_user(request, f"Successfully imported {count} questions from {file.name}!")
+                if duplicates:
+                    self.message_user(
+                        request,
+                        f"Skipped {len(duplicates)} near-duplicate questions: {', '.join(duplicates)}",
+                        level=messages.WARNING
+                    )
                 return redirect("..")
                 
             except Exception as e:
@@ -186,10 +256,16 @@ class TestSectionAdmin(admin.ModelAdmin):
         payload = {"form": form}
         return render(request, "admin/excel_import_form.html", payload)
 
+@admin.register(ShiftSet)
+class ShiftSetAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug')
+    prepopulated_fields = {'slug': ('name',)}
+
 @admin.register(MockTestAttributes)
 class MockTestAdmin(admin.ModelAdmin):
     # Added 'exam_type' so you can see which test is SAT/IELTS in the list
-    list_display = ('item', 'exam_type', 'level', 'duration_minutes', 'pass_percentage')
+    list_display = ('item', 'exam_type', 'shift_set', 'level', 'duration_minutes', 'pass_percentage')
+    list_filter = ('exam_type', 'shift_set')
     inlines = [TestSectionInline, TestSyllabusInline, TestEligibilityInline]
 
 # --- 3. Student Progress & Reports ---
@@ -210,9 +286,52 @@ class UserTestAttemptAdmin(admin.ModelAdmin):
     
     inlines = [UserAnswerInline]
 
+    def save_formset(self, request, form, formset, change):
+        super().save_formset(request, form, formset, change)
+        # Examiner marks (Writing/Speaking) re-total the attempt, its result and standings
+        if formset.model is UserAnswer and any('score_awarded' in f.changed_data for f in formset.forms):
+            rescore_attempts([form.instance.pk])
+
 @admin.register(QuestionReport)
 class QuestionReportAdmin(admin.ModelAdmin):
     list_display = ('question', 'user', 'is_resolved', 'created')
     list_filter = ('is_resolved',)
     list_editable = ('is_resolved',)
-    readonly_fields = ('report_text',)
\ No newline at end of file
+    readonly_fields = ('report_text',)
+    actions = ['regrade']
+
+    @admin.action(description="Regrade reported questions (after fixing their keys)")
+    def regrade(self, request, queryset):
+        question_ids = set(queryset.values_list('question_id', flat=True))
+        summary = regrade_questions(question_ids)
+        QuestionReport.objects.filter(question_id__in=question_ids, is_resolved=False).update(is_resolved=True)
+        self.message_user(
+            request,
+            f"Re-graded {len(question_ids)} questions: {summary['answers']} answers, "
+            f"{summary['attempts']} attempt scores, {summary['users']} leaderboard entries changed.",
+        )
+
+@admin.register(SubmissionJob)
+class SubmissionJobAdmin(admin.ModelAdmin):
+    list_display = ('attempt', 'status', 'tries', 'locked_by', 'created', 'modified')
+    list_filter = ('status',)
+    readonly_fields = ('attempt', 'tries', 'locked_at', 'locked_by', 'last_error')
+    actions = ['requeue']
+
+    @admin.action(description="Requeue selected jobs")
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status=SubmissionJob.Status.DONE).update(status=SubmissionJob.Status.PENDING, tries=0, locked_at=None)
+        self.message_user(request, f"Requeued {updated} jobs.")
+
+
+@admin.register(EssayScoringJob)
+class EssayScoringJobAdmin(admin.ModelAdmin):
+    list_display = ('answer', 'attempt', 'status', 'tries', 'scorer', 'locked_by', 'created', 'modified')
+    list_filter = ('status', 'scorer')
+    readonly_fields = ('answer', 'attempt', 'tries', 'locked_at', 'locked_by', 'last_error', 'scorer', 'details')
+    actions = ['requeue']
+
+    @admin.action(description="Requeue selected essays")
+    def requeue(self, request, queryset):
+        updated = queryset.update(status=EssayScoringJob.Status.PENDING, tries=0, locked_at=None)
+        self.message_user(request, f"Requeued {updated} essays.")
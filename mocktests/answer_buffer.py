@@ -0,0 +1,164 @@
+"""
+Write-behind staging for exam answers.
+
+Autosaves are acknowledged once they are in the 'answers' cache and are copied
+to UserAnswer in bulk by `flush_answer_buffer` (timer) and by submit_test.
+
+Layout (one key per question, so concurrent saves never overwrite each other):
+    answerbuf:<attempt_id>:q:<question_id>  -> normalized answer row
+    answerbuf:<attempt_id>:dirty            -> set after every write
+    answerbuf:<attempt_id>:closed           -> set by the submit flush
+
+A flush deletes the dirty flag *before* reading the rows. A save that lands
+during the flush re-sets the flag after writing its row, so it is picked up by
+the next flush instead of being lost. Rows stay in the store until the attempt
+is submitted, so a crash between reading and upserting is recovered by the next
+full flush (submit, or `flush_answer_buffer --all`).
+
+The submit flush sets the closed flag before reading, and a save checks it
+after writing, so a save whose rows may have missed that read is refused
+instead of acknowledged. When the store is full (CacheFull), saves are written
+straight to UserAnswer.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+from .cache_backends import CacheFull
+from .models import TestQuestion, UserTestAttempt
+from .utils import upsert_answers
+
+# Rows outlive any exam; they are cleared explicitly on submit
+ROW_TIMEOUT = 7 * 24 * 3600
+# Only saves already in flight when the attempt was submitted read the closed flag
+CLOSED_TIMEOUT = 3600
+
+
+def is_enabled():
+    return getattr(settings, 'ANSWER_WRITE_BEHIND', False)
+
+
+def _store():
+    return caches[getattr(settings, 'ANSWER_BUFFER_CACHE', 'answers')]
+
+
+def _row_key(attempt_id, question_id):
+    return f"answerbuf:{attempt_id}:q:{question_id}"
+
+
+def _dirty_key(attempt_id):
+    return f"answerbuf:{attempt_id}:dirty"
+
+
+def _closed_key(attempt_id):
+    return f"answerbuf:{attempt_id}:closed"
+
+
+def _question_ids(test_id, _memo=None):
+    if _memo is not None and test_id in _memo:
+        return _memo[test_id]
+    ids = list(TestQuestion.objects.filter(section__test_id=test_id).values_list('id', flat=True))
+    if _memo is not None:
+        _memo[test_id] = ids
+    return ids
+
+
+def buffer_answers(attempt, rows):
+    """
+    Stages normalized rows for an attempt. Returns the acknowledged question
+    ids, or None if the attempt was closed for grading meanwhile.
+    """
+    if not rows:
+        return []
+    store = _store()
+    latest = {row['question_id']: row for row in rows}
+    try:
+        store.set_many({_row_key(attempt.id, qid): row for qid, row in latest.items()}, timeout=ROW_TIMEOUT)
+        # Flag goes last: a flush that misses these rows will still see the flag
+        store.set(_dirty_key(attempt.id), True, timeout=ROW_TIMEOUT)
+    except CacheFull:
+        # Drop older staged rows of these questions so no later flush overwrites the write-through
+        store.delete_many([_row_key(attempt.id, qid) for qid in latest])
+        return upsert_answers(attempt, list(latest.values()))
+    if store.get(_closed_key(attempt.id)):
+        return None
+    return list(latest.keys())
+
+
+def get_buffered_rows(attempt, question_ids=None):
+    """Returns {question_id: row} for every answer currently staged for the attempt."""
+    if question_ids is None:
+        question_ids = _question_ids(attempt.test_id)
+    keys = {_row_key(attempt.id, qid): qid for qid in question_ids}
+    found = _store().get_many(list(keys))
+    return {keys[k]: row for k, row in found.items()}
+
+
+def flush_attempt(attempt, clear=False, question_ids=None):
+    """
+    Copies staged rows to UserAnswer with one bulk upsert.
+    With clear=True (used on submit, with the attempt row locked) the attempt is
+    closed to further saves and the staged rows are removed afterwards.
+    Returns the number of rows written.
+    """
+    if not is_enabled():
+        return 0
+    if question_ids is None:
+        question_ids = _question_ids(attempt.test_id)
+
+    store = _store()
+    if clear:
+        try:
+            store.set(_closed_key(attempt.id), True, timeout=CLOSED_TIMEOUT)
+        except CacheFull:
+            # Saves cannot stage rows either, so they are written through
+            pass
+    store.delete(_dirty_key(attempt.id))
+    rows = get_buffered_rows(attempt, question_ids)
+    if rows:
+        upsert_answers(attempt, list(rows.values()))
+    if clear:
+        store.delete_many([_row_key(attempt.id, qid) for qid in question_ids])
+    return len(rows)
+
+
+def flush_pending(include_clean=False, batch_size=500):
+    """
+    Timer flush: writes every IN_PROGRESS attempt whose dirty flag is set.
+    include_clean=True flushes all in-progress attempts (crash recovery).
+    Attempts pre-created by prewarm_test are skipped until opened (started_at
+    is set before the first save). Returns (attempts_flushed, rows_written).
+    """
+    store = _store()
+    memo = {}
+    attempts_flushed = rows_written = 0
+
+    queryset = UserTestAttempt.objects.filter(
+        status=UserTestAttempt.Status.IN_PROGRESS, started_at__isnull=False
+    ).only('id', 'test_id').order_by('id')
+
+    batch = []
+    for attempt in queryset.iterator(chunk_size=batch_size):
+        batch.append(attempt)
+        if len(batch) >= batch_size:
+            a, r = _flush_batch(store, batch, include_clean, memo)
+            attempts_flushed += a
+            rows_written += r
+            batch = []
+    if batch:
+        a, r = _flush_batch(store, batch, include_clean, memo)
+        attempts_flushed += a
+        rows_written += r
+    return attempts_flushed, rows_written
+
+
+def _flush_batch(store, attempts, include_clean, memo):
+    if include_clean:
+        targets = attempts
+    else:
+        flags = store.get_many([_dirty_key(a.id) for a in attempts])
+        targets = [a for a in attempts if _dirty_key(a.id) in flags]
+
+    rows = 0
+    for attempt in targets:
+        rows += flush_attempt(attempt, question_ids=_question_ids(attempt.test_id, memo))
+    return len(targets), rows
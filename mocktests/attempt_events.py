@@ -0,0 +1,210 @@
+"""
+Per-question time and proctoring events.
+
+The exam page batches client events (question focus/blur, tab hidden/visible,
+review toggles) to api/attempt-events/. A batch is packed into fixed-size
+records (EVENT_DTYPE, 13 bytes per event) and appended to the shared 'answers'
+cache, never to the database:
+
+    attemptevents:<attempt_id>:seq      -> number of batches appended
+    attemptevents:<attempt_id>:b:<n>    -> packed batch n (1-based)
+    attemptevents:<attempt_id>:flushed  -> last batch copied to AttemptEventLog
+    attemptevents:<attempt_id>:gap:<n>  -> when a flush first found batch n missing
+
+`flush_attempt_events` (timer) and submit move pending batches into
+AttemptEventLog rows with one bulk INSERT per round. A slot still empty
+MISSING_GRACE seconds after a flush first found it (its writer crashed or hit
+CacheFull after taking the number) is given up, so it cannot hold back the
+batches behind it. Delivery is at least once
+(client retries, overlapping flushes), so aggregation drops repeated events.
+At grading, question_times() turns the log into seconds per question for the
+result page.
+"""
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import AttemptEventLog, UserTestAttempt
+
+FOCUS, BLUR, HIDDEN, VISIBLE, REVIEW_ON, REVIEW_OFF = range(1, 7)
+EVENT_TYPES = {
+    'focus': FOCUS, 'blur': BLUR, 'hidden': HIDDEN, 'visible': VISIBLE,
+    'review_on': REVIEW_ON, 'review_off': REVIEW_OFF,
+}
+# t: client clock in ms since epoch; q: question id (0 for page-level events)
+EVENT_DTYPE = np.dtype([('t', '<i8'), ('kind', 'u1'), ('q', '<u4')])
+
+MAX_EVENTS_PER_BATCH = 500
+# Batches outlive any exam; they are removed once flushed
+BATCH_TIMEOUT = 7 * 24 * 3600
+# add() follows incr() at once, so a slot empty for this long is not coming
+MISSING_GRACE = 60
+
+
+def _store():
+    return caches[getattr(settings, 'EVENT_BUFFER_CACHE', 'answers')]
+
+
+def _seq_key(attempt_id):
+    return f"attemptevents:{attempt_id}:seq"
+
+
+def _flushed_key(attempt_id):
+    return f"attemptevents:{attempt_id}:flushed"
+
+
+def _batch_key(attempt_id, n):
+    return f"attemptevents:{attempt_id}:b:{n}"
+
+
+def _gap_key(attempt_id, n):
+    return f"attemptevents:{attempt_id}:gap:{n}"
+
+
+def pack_events(events):
+    """
+    Packs client events ({'type', 'question_id', 't'}) into EVENT_DTYPE bytes.
+    Malformed events are dropped. Returns (bytes, accepted count).
+    """
+    records = []
+    for event in events:
+        if not isinstance(event, dict):
+            continue
+        kind = EVENT_TYPES.get(event.get('type'))
+        try:
+            t = int(event.get('t'))
+            q = int(event.get('question_id') or 0)
+        except (TypeError, ValueError):
+            continue
+        if kind is None or t <= 0 or not 0 <= q < 2 ** 32:
+            continue
+        records.append((t, kind, q))
+    return np.array(records, dtype=EVENT_DTYPE).tobytes(), len(records)
+
+
+def buffer_events(attempt_id, data):
+    """
+    Appends one packed batch to the attempt's buffer. The sequence number comes
+    from an atomic incr() (Redis, Memcached, DurableFileBasedCache), and the
+    batch is stored with add(), so a slot that is somehow taken already is
+    skipped rather than overwritten. Raises CacheFull when the store is full;
+    the number taken is then given up by a later flush.
+    """
+    store = _store()
+    store.add(_seq_key(attempt_id), 0, timeout=BATCH_TIMEOUT)
+    while not store.add(_batch_key(attempt_id, store.incr(_seq_key(attempt_id))), data, timeout=BATCH_TIMEOUT):
+        pass
+
+
+def _lost(store, attempt_id, n):
+    """Whether an empty slot has stayed empty past MISSING_GRACE since a flush first saw it."""
+    now = time.time()
+    store.add(_gap_key(attempt_id, n), now, timeout=BATCH_TIMEOUT)
+    return now - store.get(_gap_key(attempt_id, n), now) >= MISSING_GRACE
+
+
+def _pending(store, attempt_ids):
+    """
+    {attempt_id: (slots, [(n, data), ...])}: buffered batches not yet flushed,
+    in order, and the range of slots they and any lost slots among them cover.
+    """
+    counters = store.get_many([_seq_key(a) for a in attempt_ids] + [_flushed_key(a) for a in attempt_ids])
+    ranges = {}
+    for attempt_id in attempt_ids:
+        seq = counters.get(_seq_key(attempt_id), 0)
+        flushed = counters.get(_flushed_key(attempt_id), 0)
+        if seq > flushed:
+            ranges[attempt_id] = range(flushed + 1, seq + 1)
+
+    keys = [_batch_key(a, n) for a, span in ranges.items() for n in span]
+    found = store.get_many(keys) if keys else {}
+    pending = {}
+    for attempt_id, span in ranges.items():
+        last, batches = span.start - 1, []
+        for n in span:
+            data = found.get(_batch_key(attempt_id, n))
+            if data is None and not _lost(store, attempt_id, n):
+                # Counter bumped but batch not written yet: stop here, the next flush resumes
+                break
+            last = n
+            if data is not None:
+                batches.append((n, data))
+        if last >= span.start:
+            pending[attempt_id] = (range(span.start, last + 1), batches)
+    return pending
+
+
+def flush_events(attempt_ids):
+    """Moves buffered batches of these attempts into AttemptEventLog. Returns events written."""
+    store = _store()
+    pending = _pending(store, list(attempt_ids))
+    if not pending:
+        return 0
+
+    logs = [
+        AttemptEventLog(attempt_id=attempt_id, data=b''.join(data for _, data in batches))
+        for attempt_id, (_, batches) in pending.items() if batches
+    ]
+    AttemptEventLog.objects.bulk_create(logs)
+
+    store.set_many({_flushed_key(a): slots[-1] for a, (slots, _) in pending.items()}, timeout=BATCH_TIMEOUT)
+    store.delete_many([
+        key for a, (slots, _) in pending.items() for n in slots for key in (_batch_key(a, n), _gap_key(a, n))
+    ])
+    return sum(len(log.data) for log in logs) // EVENT_DTYPE.itemsize
+
+
+def flush_pending(batch_size=500):
+    """
+    Timer flush over every started IN_PROGRESS attempt (attempts pre-created by
+    prewarm_test have no started_at and no events until opened). Returns events written.
+    """
+    written = 0
+    attempt_ids = UserTestAttempt.objects.filter(
+        status=UserTestAttempt.Status.IN_PROGRESS, started_at__isnull=False
+    ).order_by('id').values_list('id', flat=True)
+
+    batch = []
+    for attempt_id in attempt_ids.iterator(chunk_size=batch_size):
+        batch.append(attempt_id)
+        if len(batch) >= batch_size:
+            written += flush_events(batch)
+            batch = []
+    if batch:
+        written += flush_events(batch)
+    return written
+
+
+def load_events(attempt_id):
+    """Every logged event of an attempt, de-duplicated and in time order."""
+    data = b''.join(bytes(d) for d in AttemptEventLog.objects.filter(attempt_id=attempt_id).values_list('data', flat=True))
+    # np.unique sorts structured records by (t, kind, q)
+    return np.unique(np.frombuffer(data, dtype=EVENT_DTYPE))
+
+
+def question_times(events):
+    """
+    Aggregates an event array into ({question_id: seconds}, tab_switches).
+    A question accrues time from its focus until it is blurred, another question
+    is focused or the tab is hidden; showing the tab again resumes it. Time after
+    the last event is not counted.
+    """
+    spent = {}
+    tab_switches = 0
+    current = paused = None
+    since = 0
+    for t, kind, q in events.tolist():
+        if current is not None and kind in (FOCUS, BLUR, HIDDEN):
+            if kind != BLUR or q == current:
+                spent[current] = spent.get(current, 0) + max(0, t - since)
+                paused = current if kind == HIDDEN else None
+                current = None
+        if kind == FOCUS:
+            current, since, paused = q, t, None
+        elif kind == HIDDEN:
+            tab_switches += 1
+        elif kind == VISIBLE and paused is not None:
+            current, since, paused = paused, t, None
+    return {qid: round(ms / 1000) for qid, ms in spent.items() if qid}, tab_switches
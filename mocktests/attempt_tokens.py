@@ -0,0 +1,79 @@
+"""
+Signed attempt tokens.
+
+take_test issues a token carrying the attempt id, user id, test id, paper
+version and the absolute deadline, so the autosave endpoints can authorize and
+validate a save without reading UserTestAttempt or MockTestAttributes. A token
+dies with its deadline; submitting revokes it early through a small denylist
+kept in the shared 'answers' cache (the same store the write-behind buffer
+relies on).
+
+The denylist is also how answer writes learn that an attempt was closed:
+submit revokes before grading reads the answers, and every answer write checks
+is_revoked() after it is committed. A write that still sees the attempt open
+therefore landed before grading started and is graded; one that sees it
+revoked is refused.
+"""
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+
+SALT = 'mocktests.attempt-token'
+# Same network-latency allowance as views._get_valid_attempt
+GRACE_SECONDS = 120
+# Lifetime for untimed tests; reloading take_test issues a fresh token
+UNTIMED_TTL = 6 * 3600
+# Denylist entries only need to outlive the tokens they revoke
+DENYLIST_TIMEOUT = 24 * 3600
+
+
+def _denylist():
+    return caches[getattr(settings, 'ATTEMPT_TOKEN_CACHE', 'answers')]
+
+
+def _revoked_key(attempt_id):
+    return f"attempttoken:revoked:{attempt_id}"
+
+
+def issue_token(attempt, test):
+    """Signs (attempt, user, test, deadline) for the exam page."""
+    if test.duration_minutes > 0 and attempt.started_at:
+        deadline = int(attempt.started_at.timestamp()) + test.duration_minutes * 60
+    else:
+        deadline = int(time.time()) + UNTIMED_TTL
+    return signing.dumps(
+        {'a': attempt.pk, 'u': attempt.user_id, 't': test.pk, 'v': test.paper_version, 'd': deadline}, salt=SALT
+    )
+
+
+def read_token(token, user_id):
+    """
+    Verifies a token without touching the database.
+    Returns (claims, None) or (None, error message).
+    """
+    try:
+        claims = signing.loads(token, salt=SALT)
+    except signing.BadSignature:
+        return None, 'Invalid attempt token'
+
+    if claims.get('u') != user_id:
+        return None, 'Invalid attempt token'
+    if time.time() > claims['d'] + GRACE_SECONDS:
+        return None, 'Time limit exceeded'
+    if is_revoked(claims['a']):
+        return None, 'Test already submitted'
+    return claims, None
+
+
+def is_revoked(attempt_id):
+    """Whether the attempt was closed for grading (its tokens revoked)."""
+    return bool(_denylist().get(_revoked_key(attempt_id)))
+
+
+def revoke_tokens(attempt_id):
+    store = _denylist()
+    # A revocation must land even when the file store is full (see cache_backends.py)
+    write = getattr(store, 'force_set', store.set)
+    write(_revoked_key(attempt_id), True, timeout=DENYLIST_TIMEOUT)
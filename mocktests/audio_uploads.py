@@ -0,0 +1,204 @@
+"""
+Chunked, resumable audio answer uploads (IELTS speaking).
+
+Protocol (all requests carry the usual CSRF and X-Attempt-Token headers):
+  1. POST api/audio-upload/ {attempt_id, question_id, total_size}
+     -> {upload_id, chunk_size, offset: 0}
+  2. POST api/audio-upload/<upload_id>/ with header X-Upload-Offset and the raw
+     chunk as body. Every chunk but the last is exactly chunk_size bytes. A chunk
+     whose offset is not the current one is refused with 409 and the current offset.
+  3. GET api/audio-upload/<upload_id>/ -> {offset} to resume after a failure.
+
+Chunks are streamed into <AUDIO_UPLOAD_TEMP_DIR>/<upload_id>.part, so memory
+stays flat regardless of the recording length. The part file's size *is* the
+acknowledged offset. When the last byte arrives the file is saved through
+UserAnswer.audio_answer (upload_to='answers/audio/') and the session is removed.
+The file extension follows the audio format: sniffed from the file's header,
+else the content_type declared when the session was opened (MediaRecorder
+produces WebM or Ogg in most browsers, MP4 in Safari).
+"""
+import json
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+
+from .models import UserAnswer
+from .attempt_tokens import is_revoked
+
+CHUNK_SIZE = 512 * 1024
+MAX_AUDIO_BYTES = 100 * 1024 * 1024
+# Unfinished sessions older than this are removed by `manage.py purge_audio_uploads`
+SESSION_TTL = 24 * 3600
+_READ_SIZE = 64 * 1024
+# Declared MIME type (without parameters such as ";codecs=opus") -> file extension
+AUDIO_FORMATS = {
+    'audio/webm': 'webm', 'video/webm': 'webm',
+    'audio/ogg': 'ogg', 'application/ogg': 'ogg',
+    'audio/wav': 'wav', 'audio/wave': 'wav', 'audio/x-wav': 'wav',
+    'audio/mp4': 'm4a', 'audio/x-m4a': 'm4a',
+    'audio/mpeg': 'mp3',
+}
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def _temp_dir():
+    path = getattr(settings, 'AUDIO_UPLOAD_TEMP_DIR', os.path.join(settings.BASE_DIR, 'var', 'audio_uploads'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _paths(upload_id):
+    # upload ids are uuid4 hex; anything else could escape the temp dir
+    try:
+        upload_id = uuid.UUID(hex=upload_id).hex
+    except (TypeError, ValueError):
+        raise UploadError('Unknown upload', status=404)
+    base = os.path.join(_temp_dir(), upload_id)
+    return base + '.json', base + '.part'
+
+
+def declared_format(content_type):
+    """Extension for a declared MIME type, '' if none was declared; raises UploadError if unsupported."""
+    mime = (content_type or '').split(';')[0].strip().lower()
+    if not mime:
+        return ''
+    if mime not in AUDIO_FORMATS:
+        raise UploadError('Unsupported audio format', status=415)
+    return AUDIO_FORMATS[mime]
+
+
+def sniff_format(head):
+    """Extension for the container signature at the start of a file, or None."""
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'wav'
+    if head[:4] == b'OggS':
+        return 'ogg'
+    if head[:4] == b'\x1a\x45\xdf\xa3':  # EBML (WebM/Matroska)
+        return 'webm'
+    if head[4:8] == b'ftyp':
+        return 'm4a'
+    if head[:3] == b'ID3' or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return 'mp3'
+    return None
+
+
+def start_session(attempt, question_id, total_size, content_type=''):
+    """Opens an upload session for one question of an attempt. Returns its metadata."""
+    if not 0 < total_size <= MAX_AUDIO_BYTES:
+        raise UploadError('Invalid audio size')
+    audio_format = declared_format(content_type)
+
+    upload_id = uuid.uuid4().hex
+    meta_path, part_path = _paths(upload_id)
+    meta = {
+        'upload_id': upload_id,
+        'attempt_id': attempt.id,
+        'user_id': attempt.user_id,
+        'question_id': question_id,
+        'total_size': total_size,
+        'format': audio_format,
+        'chunk_size': CHUNK_SIZE,
+        'created': time.time(),
+    }
+    open(part_path, 'wb').close()
+    with open(meta_path, 'w') as fh:
+        json.dump(meta, fh)
+    return dict(meta, offset=0)
+
+
+def get_session(upload_id):
+    """Session metadata plus the acknowledged offset."""
+    meta_path, part_path = _paths(upload_id)
+    try:
+        with open(meta_path) as fh:
+            meta = json.load(fh)
+        meta['offset'] = os.path.getsize(part_path)
+    except (OSError, ValueError):
+        raise UploadError('Unknown upload', status=404)
+    return meta
+
+
+def append_chunk(meta, offset, stream, length):
+    """
+    Streams one chunk from `stream` (the request) onto the part file.
+    Returns the new offset; raises UploadError on an out-of-order or malformed chunk.
+    """
+    _, part_path = _paths(meta['upload_id'])
+    current = meta['offset']
+    if offset != current:
+        raise UploadError('Unexpected offset', status=409, offset=current)
+
+    remaining = meta['total_size'] - current
+    expected = min(meta['chunk_size'], remaining)
+    if length != expected:
+        raise UploadError(f'Chunk must be {expected} bytes', offset=current)
+
+    written = 0
+    with open(part_path, 'r+b') as fh:
+        fh.seek(current)
+        while written < length:
+            block = stream.read(min(_READ_SIZE, length - written))
+            if not block:
+                break
+            fh.write(block)
+            written += len(block)
+        if written != length:
+            # Client dropped mid-chunk: roll back to the last acknowledged offset
+            fh.truncate(current)
+            raise UploadError('Incomplete chunk', offset=current)
+    return current + written
+
+
+def complete(meta):
+    """Saves the assembled file as the answer's audio and removes the session."""
+    _, part_path = _paths(meta['upload_id'])
+    with open(part_path, 'rb') as fh:
+        audio_format = sniff_format(fh.read(16)) or meta.get('format')
+    if not audio_format:
+        discard(meta['upload_id'])
+        raise UploadError('Unsupported audio format', status=415)
+
+    answer, _ = UserAnswer.objects.get_or_create(attempt_id=meta['attempt_id'], question_id=meta['question_id'])
+    with open(part_path, 'rb') as fh:
+        name = f"answer_{meta['attempt_id']}_{meta['question_id']}.{audio_format}"
+        answer.audio_answer.save(name, File(fh), save=False)
+    answer.save(update_fields=['audio_answer', 'modified'])
+    discard(meta['upload_id'])
+    # Checked after the write, as for every answer write (see attempt_tokens.py)
+    if is_revoked(meta['attempt_id']):
+        raise UploadError('Test already submitted', status=403)
+    return answer
+
+
+def discard(upload_id):
+    for path in _paths(upload_id):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def purge_stale(max_age=SESSION_TTL):
+    """Removes abandoned sessions. Returns how many were removed."""
+    cutoff = time.time() - max_age
+    removed = 0
+    directory = _temp_dir()
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        upload_id = name[:-len('.json')]
+        # The part file is touched by every chunk, so active uploads are kept
+        paths = [os.path.join(directory, upload_id + ext) for ext in ('.json', '.part')]
+        if max(os.path.getmtime(p) for p in paths if os.path.exists(p)) < cutoff:
+            discard(upload_id)
+            removed += 1
+    return removed
@@ -0,0 +1,151 @@
+"""
+IELTS band scores.
+
+Listening and Reading are marked out of 40 and converted to a band through a
+raw-score table; Academic and General Training Reading use different tables.
+Tables are versioned (the published conversions shift slightly between
+editions): a form picks one with score_tables {"band_version": ..., "reading":
+"ACADEMIC" | "GENERAL"}, else DEFAULT_VERSION / ACADEMIC. Each table is
+expanded once per process into a 41-entry lookup array.
+
+Writing and Speaking are marked by scorers/examiners in score_awarded; their
+band is the awarded share of the section's marks on the 0-9 scale (the essay
+scorer awards max_marks * band / 9, so this recovers its band, with Task 2
+weighted by its marks). Until any of a component's answered questions has
+marks awarded its band is None and the component is listed in
+details['pending']; a component left blank is band 0. The overall band is the
+mean of the components with a band, rounded to the nearest half band with
+quarters going up (6.25 -> 6.5, 6.75 -> 7.0).
+
+Sections map to components by TestSection.subject, or by title when the
+subject is blank ("Listening Part 1" is Listening). Per-section correct counts
+and marks of any number of attempts come from one aggregated query.
+"""
+import functools
+import math
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import Count, Q, Sum
+
+from .models import TestSection, UserAnswer
+from .paper import get_paper
+
+RAW_MAX = 40
+DEFAULT_VERSION = '2024'
+
+# version -> table -> ((lowest raw score, band), ...)
+BAND_TABLES = {
+    '2024': {
+        'LISTENING': (
+            (39, 9.0), (37, 8.5), (35, 8.0), (32, 7.5), (30, 7.0), (26, 6.5), (23, 6.0), (18, 5.5),
+            (16, 5.0), (13, 4.5), (10, 4.0), (8, 3.5), (6, 3.0), (4, 2.5), (3, 2.0), (2, 1.5), (1, 1.0),
+        ),
+        'READING_ACADEMIC': (
+            (39, 9.0), (37, 8.5), (35, 8.0), (33, 7.5), (30, 7.0), (27, 6.5), (23, 6.0), (19, 5.5),
+            (15, 5.0), (13, 4.5), (10, 4.0), (8, 3.5), (6, 3.0), (4, 2.5), (3, 2.0), (2, 1.5), (1, 1.0),
+        ),
+        'READING_GENERAL': (
+            (40, 9.0), (39, 8.5), (37, 8.0), (36, 7.5), (34, 7.0), (32, 6.5), (30, 6.0), (27, 5.5),
+            (23, 5.0), (19, 4.5), (15, 4.0), (12, 3.5), (9, 3.0), (6, 2.5), (4, 2.0), (2, 1.5), (1, 1.0),
+        ),
+    },
+}
+
+COMPONENTS = (
+    (TestSection.Subject.LISTENING, 'listening'),
+    (TestSection.Subject.READING, 'reading'),
+    (TestSection.Subject.WRITING, 'writing'),
+    (TestSection.Subject.SPEAKING, 'speaking'),
+)
+# Components marked against an answer key (the others from awarded marks)
+KEYED = {TestSection.Subject.LISTENING, TestSection.Subject.READING}
+
+
+@functools.lru_cache(maxsize=None)
+def conversion(version, table):
+    """Band for every raw score 0..RAW_MAX."""
+    lookup = np.zeros(RAW_MAX + 1)
+    for minimum, band in sorted(BAND_TABLES[version][table]):
+        lookup[minimum:] = band
+    return lookup
+
+
+def half_band(value):
+    """Nearest half band, halfway cases up (IELTS rounding)."""
+    return min(9.0, max(0.0, math.floor(value * 2 + 0.5) / 2))
+
+
+def overall_band(bands):
+    bands = [b for b in bands if b is not None]
+    return half_band(sum(bands) / len(bands)) if bands else 0.0
+
+
+def section_component(section):
+    """Component of a paper section: its subject, else the first word of its title."""
+    if section['subject'] in dict(COMPONENTS):
+        return section['subject']
+    words = section['title'].split()
+    first = words[0].upper() if words else ''
+    return first if first in dict(COMPONENTS) else None
+
+
+def band_scores(test, attempt_ids):
+    """
+    {attempt_id: details} for attempts of one IELTS test: a band per component
+    present on the paper (None while awaiting marks, see 'pending'), raw
+    Listening/Reading scores, the overall band and the table version used.
+    """
+    paper = get_paper(test)
+    options = test.score_tables or {}
+    version = options.get('band_version') or DEFAULT_VERSION
+    tables = {
+        TestSection.Subject.LISTENING: 'LISTENING',
+        TestSection.Subject.READING: 'READING_GENERAL' if options.get('reading') == 'GENERAL' else 'READING_ACADEMIC',
+    }
+
+    component_of, questions, max_marks = {}, {}, {}
+    for section in paper['sections']:
+        component = section_component(section)
+        if component is None:
+            continue
+        component_of[section['id']] = component
+        questions[component] = questions.get(component, 0) + len(section['questions'])
+        max_marks[component] = max_marks.get(component, 0) + sum(q['marks'] for q in section['questions'])
+
+    sums = {attempt_id: {} for attempt_id in attempt_ids}
+    rows = UserAnswer.objects.filter(
+        attempt_id__in=attempt_ids, question__section_id__in=list(component_of)
+    ).values('attempt_id', 'question__section_id').annotate(
+        correct=Count('id', filter=Q(is_correct=True)), awarded=Sum('score_awarded'),
+        answered=Count('id', filter=Q(text_answer__regex=r'\S') | Q(audio_answer__gt='')),
+    )
+    for row in rows:
+        component = component_of[row['question__section_id']]
+        correct, awarded, answered = sums[row['attempt_id']].get(component, (0, Decimal('0'), 0))
+        sums[row['attempt_id']][component] = (
+            correct + row['correct'], awarded + (row['awarded'] or 0), answered + row['answered']
+        )
+
+    results = {}
+    for attempt_id, by_component in sums.items():
+        details = {'version': version, 'raw': {}, 'pending': []}
+        for component, label in COMPONENTS:
+            if not questions.get(component):
+                continue
+            correct, awarded, answered = by_component.get(component, (0, Decimal('0'), 0))
+            if component in KEYED:
+                # Short mock papers are scaled to the 40-question paper the tables are for
+                raw = min(RAW_MAX, round(correct * RAW_MAX / questions[component]))
+                details['raw'][label] = raw
+                details[label] = float(conversion(version, tables[component])[raw])
+            elif answered and not awarded:
+                # Answered but not marked yet: left out of the overall band
+                details[label] = None
+                details['pending'].append(label)
+            else:
+                total = max_marks[component]
+                details[label] = half_band(9 * float(awarded) / total) if total else 0.0
+        details['overall'] = overall_band(details.get(label) for _, label in COMPONENTS)
+        results[attempt_id] = details
+    return results
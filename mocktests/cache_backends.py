@@ -0,0 +1,131 @@
+"""
+Cache backend for the 'answers' store.
+
+The write-behind answer buffer, the attempt-token denylist and the event
+buffer keep data in the cache that has already been acknowledged to a client.
+The stock FileBasedCache deletes a random third of its files once MAX_ENTRIES
+(300 by default) is reached, so under load it silently drops such entries.
+DurableFileBasedCache never evicts a live entry: reaching MAX_ENTRIES first
+removes expired files, and if the store is still full the write raises
+CacheFull so the caller can fall back to the database. The stock backend
+counts the directory on every write; here a process counts it at most every
+RECOUNT_INTERVAL seconds and adds its own writes in between, so a save costs
+O(1) and the limit is approximate (other processes' writes are seen at the
+next count).
+
+It keeps the store on local disk, so it is for single-node deployments (dev);
+production points 'answers' at Redis (see CACHES in settings.py).
+
+add() and incr() are atomic across processes, as on Redis or Memcached (the
+event buffer numbers its batches with them): add() links a fully written
+temporary file into place, which fails if the key exists, and incr() rewrites
+the file under an exclusive lock on it.
+"""
+import os
+import pickle
+import tempfile
+import time
+import zlib
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+
+
+class CacheFull(Exception):
+    pass
+
+
+class DurableFileBasedCache(FileBasedCache):
+    RECOUNT_INTERVAL = 10
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._counted_at = None
+        self._entries = 0
+        self._unlimited = False
+
+    def force_set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """set() past MAX_ENTRIES, for the few small entries that must never be refused (token revocations)."""
+        self._unlimited = True
+        try:
+            self.set(key, value, timeout, version)
+        finally:
+            self._unlimited = False
+
+    def _cull(self):
+        if self._unlimited:
+            return
+        now = time.monotonic()
+        if self._counted_at is not None and now - self._counted_at < self.RECOUNT_INTERVAL \
+                and self._entries < self._max_entries:
+            # Counted recently: assume every write adds a file until the next count
+            self._entries += 1
+            return
+        filelist = self._list_cache_files()
+        self._counted_at = now
+        self._entries = len(filelist) + 1
+        if len(filelist) < self._max_entries:
+            return
+        live = 0
+        for fname in filelist:
+            try:
+                with open(fname, 'rb') as f:
+                    # Deletes the file if it has expired
+                    if not self._is_expired(f):
+                        live += 1
+            except FileNotFoundError:
+                pass
+        self._entries = live + 1
+        if live >= self._max_entries:
+            raise CacheFull(f"{self._dir} holds {live} live entries (MAX_ENTRIES={self._max_entries})")
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._createdir()
+        fname = self._key_to_file(key, version)
+        # has_key() also removes an expired file
+        if self.has_key(key, version):
+            return False
+        self._cull()
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        try:
+            with open(fd, 'wb') as f:
+                self._write_content(f, timeout, value)
+            os.link(tmp_path, fname)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+
+    def incr(self, key, delta=1, version=None):
+        fname = self._key_to_file(key, version)
+        while True:
+            try:
+                f = open(fname, 'rb')
+            except FileNotFoundError:
+                raise ValueError(f"Key '{key}' not found")
+            with f:
+                locks.lock(f, locks.LOCK_EX)
+                try:
+                    try:
+                        replaced = os.stat(fname).st_ino != os.fstat(f.fileno()).st_ino
+                    except FileNotFoundError:
+                        replaced = True
+                    if replaced:
+                        # Another incr() swapped the file while we waited for the lock
+                        continue
+                    expiry = pickle.load(f)
+                    if expiry is not None and expiry < time.time():
+                        self._delete(fname)
+                        raise ValueError(f"Key '{key}' not found")
+                    value = pickle.loads(zlib.decompress(f.read())) + delta
+
+                    fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+                    with open(fd, 'wb') as out:
+                        out.write(pickle.dumps(expiry, self.pickle_protocol))
+                        out.write(zlib.compress(pickle.dumps(value, self.pickle_protocol)))
+                    os.replace(tmp_path, fname)
+                    return value
+                finally:
+                    locks.unlock(f)
@@ -0,0 +1,200 @@
+"""
+Near-duplicate question detection.
+
+Every question is reduced to a set of word trigrams over its text and option
+texts (HTML stripped, case and punctuation folded) and summarized by a 64-value
+MinHash signature. The share of equal positions between two signatures
+estimates the Jaccard similarity of their shingle sets.
+
+Signatures are split into LSH bands (16 bands x 4 rows); QuestionSignatureBand
+stores one indexed row per band, so a lookup only compares against questions
+that share at least one band. Pairs at DUPLICATE_THRESHOLD similarity collide
+on some band with probability > 0.999.
+
+The stored index follows question and option saves through signals and can be
+rebuilt with `manage.py rebuild_question_index`. Long-running writers
+(generators, the Excel import) load a DuplicateIndex once and check in memory.
+"""
+import hashlib
+import html
+import re
+import threading
+
+import numpy as np
+
+from .models import QuestionSignature, QuestionSignatureBand, TestQuestion
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+DUPLICATE_THRESHOLD = 0.8
+
+_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.default_rng(20240613)
+# Fixed permutations: stored signatures depend on them, so never change the seed
+_A = _rng.integers(1, int(_PRIME), size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, int(_PRIME), size=NUM_PERM, dtype=np.uint64)
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_WORD_RE = re.compile(r'\w+')
+
+
+def _tokens(text):
+    return _WORD_RE.findall(html.unescape(_TAG_RE.sub(' ', text or '')).lower())
+
+
+def shingles(text, options=()):
+    """Word trigrams of the question text plus those of each option."""
+    result = set()
+    for part in (text, *options):
+        words = _tokens(part)
+        if len(words) < SHINGLE_SIZE:
+            if words:
+                result.add(' '.join(words))
+            continue
+        for i in range(len(words) - SHINGLE_SIZE + 1):
+            result.add(' '.join(words[i:i + SHINGLE_SIZE]))
+    return result
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'little') % int(_PRIME)
+
+
+def signature(text, options=()):
+    """MinHash signature (uint32 array of NUM_PERM) or None when there is nothing to hash."""
+    grams = shingles(text, options)
+    if not grams:
+        return None
+    hashes = np.fromiter((_hash(g) for g in grams), dtype=np.uint64, count=len(grams))
+    # a, x < 2**31 so a*x + b never overflows uint64
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+def band_hashes(sig):
+    """One signed 64-bit hash per band (fits a BigIntegerField)."""
+    return [
+        int.from_bytes(hashlib.blake2b(bytes([band]) + sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest(), 'little', signed=True)
+        for band in range(BANDS)
+    ]
+
+
+def similarity(sig_a, sig_b):
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+
+def _from_bytes(raw):
+    return np.frombuffer(bytes(raw), dtype=np.uint32)
+
+
+def question_signature(question):
+    return signature(question.question_text, [o.option_text for o in question.options.all()])
+
+
+def index_question(question):
+    """Replaces the stored signature and bands of one question."""
+    sig = question_signature(question)
+    QuestionSignatureBand.objects.filter(question=question).delete()
+    if sig is None:
+        QuestionSignature.objects.filter(question=question).delete()
+        return
+    QuestionSignature.objects.update_or_create(question=question, defaults={'minhash': sig.tobytes()})
+    QuestionSignatureBand.objects.bulk_create(
+        [QuestionSignatureBand(question=question, band=band) for band in band_hashes(sig)]
+    )
+
+
+def rebuild_index(batch_size=500):
+    """Recomputes the whole index. Returns the number of questions indexed."""
+    QuestionSignatureBand.objects.all().delete()
+    QuestionSignature.objects.all().delete()
+    indexed = 0
+    questions = TestQuestion.objects.only('id', 'question_text').prefetch_related('options').order_by('pk')
+    last_pk = 0
+    while True:
+        chunk = list(questions.filter(pk__gt=last_pk)[:batch_size])
+        if not chunk:
+            return indexed
+        signatures, bands = [], []
+        for question in chunk:
+            sig = question_signature(question)
+            if sig is None:
+                continue
+            signatures.append(QuestionSignature(question=question, minhash=sig.tobytes()))
+            bands.extend(QuestionSignatureBand(question=question, band=band) for band in band_hashes(sig))
+        QuestionSignature.objects.bulk_create(signatures)
+        QuestionSignatureBand.objects.bulk_create(bands)
+        indexed += len(signatures)
+        last_pk = chunk[-1].pk
+
+
+def find_duplicates(text, options=(), exclude=None, threshold=DUPLICATE_THRESHOLD):
+    """
+    [(question_id, similarity)] of stored questions near `text`/`options`, best first.
+    Two indexed queries; use DuplicateIndex for repeated checks.
+    """
+    sig = signature(text, options)
+    if sig is None:
+        return []
+    candidates = QuestionSignatureBand.objects.filter(band__in=band_hashes(sig))
+    if exclude is not None:
+        candidates = candidates.exclude(question_id=exclude)
+    stored = QuestionSignature.objects.filter(
+        question_id__in=candidates.values('question_id')
+    ).values_list('question_id', 'minhash')
+    matches = [(qid, similarity(sig, _from_bytes(raw))) for qid, raw in stored]
+    return sorted([m for m in matches if m[1] >= threshold], key=lambda m: -m[1])
+
+
+class DuplicateIndex:
+    """
+    In-memory copy of the stored index for bulk writers. Loaded once, then
+    `find` and `add` are pure dictionary work. Safe to share between threads.
+    """
+
+    def __init__(self, threshold=DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._signatures = {}
+        self._bands = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, threshold=DUPLICATE_THRESHOLD):
+        index = cls(threshold)
+        for question_id, raw in QuestionSignature.objects.values_list('question_id', 'minhash').iterator():
+            index._insert(question_id, _from_bytes(raw))
+        return index
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _insert(self, key, sig):
+        self._signatures[key] = sig
+        for band in band_hashes(sig):
+            self._bands.setdefault(band, set()).add(key)
+
+    def _best(self, sig):
+        candidates = set()
+        for band in band_hashes(sig):
+            candidates |= self._bands.get(band, set())
+        best = None
+        for key in candidates:
+            score = similarity(sig, self._signatures[key])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (key, score)
+        return best
+
+    def find(self, text, options=()):
+        """(question_id, similarity) of the closest near-duplicate, or None."""
+        sig = signature(text, options)
+        if sig is None:
+            return None
+        with self._lock:
+            return self._best(sig)
+
+    def add(self, key, text, options=()):
+        sig = signature(text, options)
+        if sig is not None:
+            with self._lock:
+                self._insert(key, sig)
@@ -0,0 +1,174 @@
+"""
+Practice drills.
+
+A drill is N MCQs drawn from the question bank for one exam type, section
+topic (section title, case-insensitive) and difficulty, skipping questions the
+student already answered correctly in a test or an earlier drill. Only tests
+the student may see feed a drill: active items that are free or that the
+student is enrolled in (drill reviews show the answer key).
+
+Sampling never touches the question table with ORDER BY RANDOM(): each
+(exam_type, topic, difficulty) pool is a sorted int64 id array, with the test
+of each id alongside, built by one indexed query and cached. Pool keys carry a
+stamp of the exam type's tests (count, sum of paper_version, highest id): any
+question edit bumps a paper_version in the database, so every process sees the
+new stamp and rebuilds the pool on its next read. The sampler draws from the
+pool's accessible ids minus the student's mastered ids in NumPy and confirms
+the few picked ids against the bank.
+"""
+import hashlib
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, Exists, Max, OuterRef, Q, Sum
+from django.utils import timezone
+
+from enrollments.models import UserEnrollment
+
+from .models import MockTestAttributes, PracticeDrill, QuestionOption, TestQuestion, UserAnswer
+
+DEFAULT_SIZE = 10
+MAX_SIZE = 50
+POOL_TIMEOUT = 6 * 3600
+DIFFICULTIES = [code for code, _ in TestQuestion.DIFFICULTY_CHOICES]
+
+
+def normalize_topic(title):
+    return ' '.join((title or '').split()).lower()
+
+
+def accessible_tests(user):
+    """Tests whose questions the user may drill: active items that are free or enrolled in."""
+    enrolled = UserEnrollment.objects.filter(user=user, item_id=OuterRef('item_id'), is_active=True)
+    return MockTestAttributes.objects.filter(Q(item__price=0) | Exists(enrolled), item__is_active=True)
+
+
+def _stamp(**filters):
+    """Changes whenever a test matching the filters is added, removed or has its paper edited."""
+    row = MockTestAttributes.objects.filter(**filters).aggregate(
+        count=Count('pk'), versions=Sum('paper_version'), last=Max('pk')
+    )
+    return f"{row['count']}-{row['versions'] or 0}-{row['last'] or 0}"
+
+
+def _pool_key(exam_type, topic, difficulty, stamp):
+    digest = hashlib.md5(normalize_topic(topic).encode()).hexdigest()
+    return f"drillpool:{exam_type}:{difficulty}:{digest}:{stamp}"
+
+
+def _bank(exam_type, topic, difficulty):
+    questions = TestQuestion.objects.filter(
+        question_type=TestQuestion.QuestionType.MCQ,
+        section__test__exam_type=exam_type,
+        section__title__iexact=normalize_topic(topic),
+    )
+    return questions.filter(difficulty=difficulty) if difficulty else questions
+
+
+def get_pool(exam_type, topic, difficulty, stamp=None):
+    """
+    (ids, test_ids) of one pool, sorted by id; a blank difficulty merges all of
+    them. Covers every test of the exam type: callers filter by access.
+    """
+    stamp = stamp or _stamp(exam_type=exam_type)
+    if not difficulty:
+        pools = [get_pool(exam_type, topic, d, stamp) for d in DIFFICULTIES]
+        ids, test_ids = np.concatenate([p[0] for p in pools]), np.concatenate([p[1] for p in pools])
+        order = np.argsort(ids, kind='stable')
+        return ids[order], test_ids[order]
+    key = _pool_key(exam_type, topic, difficulty, stamp)
+    raw = cache.get(key)
+    if raw is not None:
+        ids, test_ids = np.frombuffer(raw, dtype=np.int64).reshape(2, -1)
+        return ids, test_ids
+    rows = sorted(_bank(exam_type, topic, difficulty).values_list('id', 'section__test_id'))
+    pool = np.array(rows, dtype=np.int64).reshape(-1, 2).T
+    cache.set(key, pool.tobytes(), POOL_TIMEOUT)
+    return pool[0], pool[1]
+
+
+def get_catalog(user):
+    """[{'exam_type', 'topic', 'difficulty', 'count'}] of every pool with questions the user may drill, for the drill form."""
+    key = f"drillpool:catalog:{_stamp()}"
+    rows = cache.get(key)
+    if rows is None:
+        rows = list(TestQuestion.objects.filter(question_type=TestQuestion.QuestionType.MCQ).values(
+            'section__test_id', 'section__test__exam_type', 'section__title', 'difficulty'
+        ).annotate(count=Count('id')).order_by('section__test__exam_type', 'section__title'))
+        cache.set(key, rows, POOL_TIMEOUT)
+
+    tests = set(accessible_tests(user).values_list('pk', flat=True))
+    pools = {}
+    for row in rows:
+        if row['section__test_id'] not in tests:
+            continue
+        key = (row['section__test__exam_type'], normalize_topic(row['section__title']), row['difficulty'])
+        entry = pools.setdefault(key, {
+            'exam_type': key[0], 'topic': ' '.join(row['section__title'].split()), 'difficulty': key[2], 'count': 0
+        })
+        entry['count'] += row['count']
+    return list(pools.values())
+
+
+def unpack(drill):
+    """(question_ids, selected option ids, correct flags) arrays of a drill."""
+    question_ids = np.frombuffer(bytes(drill.question_ids), dtype=np.int64)
+    selected = np.frombuffer(bytes(drill.selected), dtype=np.int64) if drill.selected else np.zeros(len(question_ids), dtype=np.int64)
+    correct = np.unpackbits(np.frombuffer(bytes(drill.correct), dtype=np.uint8), count=len(question_ids)).astype(bool) \
+        if drill.correct else np.zeros(len(question_ids), dtype=bool)
+    return question_ids, selected, correct
+
+
+def mastered_ids(user):
+    """Sorted ids of every question the user has answered correctly, in tests or drills."""
+    parts = [np.fromiter(
+        UserAnswer.objects.filter(attempt__user=user, is_correct=True).values_list('question_id', flat=True),
+        dtype=np.int64,
+    )]
+    for drill in PracticeDrill.objects.filter(user=user, completed_at__isnull=False).only('question_ids', 'correct'):
+        question_ids, _, correct = unpack(drill)
+        parts.append(question_ids[correct])
+    return np.unique(np.concatenate(parts))
+
+
+def build_drill(user, exam_type, topic, difficulty='', size=DEFAULT_SIZE, rng=None):
+    """Samples and stores a new drill, or returns None when the user has nothing left to practice."""
+    size = max(1, min(int(size), MAX_SIZE))
+    rng = rng or np.random.default_rng()
+    tests = accessible_tests(user)
+    ids, test_ids = get_pool(exam_type, topic, difficulty)
+    allowed = ids[np.isin(test_ids, np.fromiter(tests.values_list('pk', flat=True), dtype=np.int64))]
+    candidates = np.setdiff1d(allowed, mastered_ids(user))
+
+    picked = []
+    bank = _bank(exam_type, topic, difficulty).filter(section__test__in=tests)
+    while len(picked) < size and len(candidates):
+        draw = rng.choice(candidates, size=min(size - len(picked), len(candidates)), replace=False)
+        candidates = np.setdiff1d(candidates, draw)
+        # Confirm against the bank: a question may have been edited since the pool was built
+        valid = set(bank.filter(id__in=draw.tolist()).values_list('id', flat=True))
+        picked.extend(int(q) for q in draw if q in valid)
+
+    if not picked:
+        return None
+    return PracticeDrill.objects.create(
+        user=user, exam_type=exam_type, topic=topic, difficulty=difficulty,
+        question_ids=np.array(picked, dtype=np.int64).tobytes(),
+    )
+
+
+def grade_drill(drill, selections):
+    """Stores the chosen options ({question_id: option_id}) and correctness of an open drill."""
+    question_ids, _, _ = unpack(drill)
+    key = dict(
+        QuestionOption.objects.filter(question_id__in=question_ids.tolist(), is_correct=True).values_list('question_id', 'id')
+    )
+    selected = np.array([selections.get(int(q)) or 0 for q in question_ids], dtype=np.int64)
+    correct = (selected != 0) & (selected == np.array([key.get(int(q), -1) for q in question_ids], dtype=np.int64))
+
+    drill.selected = selected.tobytes()
+    drill.correct = np.packbits(correct).tobytes()
+    drill.score = int(np.count_nonzero(correct))
+    drill.completed_at = timezone.now()
+    drill.save(update_fields=['selected', 'correct', 'score', 'completed_at', 'modified'])
+    return drill
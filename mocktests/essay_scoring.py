@@ -0,0 +1,287 @@
+"""
+Essay scoring.
+
+Grading leaves ESSAY answers at zero and finalize_attempt enqueues one
+EssayScoringJob per non-empty essay. `manage.py score_essays` claims jobs in
+batches and hands each batch to the configured scorer (settings.ESSAY_SCORER)
+in a single call, so a cohort submitting at once costs one scorer round trip
+per batch, with at most `--concurrency` batches in flight. Results are written
+with one bulk UPDATE per batch; once all essays of an attempt are scored its
+score, result page, histogram bin and leaderboard metrics are recomputed.
+
+Scorers implement EssayScorer.score(essays) -> one {'marks', 'band',
+'criteria'} per essay, in order:
+
+  HeuristicEssayScorer  local rubric over length, paragraphing, linking words,
+                        vocabulary and sentence structure (the default)
+  RemoteEssayScorer     posts the batch to ESSAY_SCORER_URL (model service)
+"""
+import functools
+import re
+import traceback
+from decimal import Decimal
+
+import numpy as np
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import EssayScoringJob, TestQuestion, UserAnswer, UserTestAttempt
+from .paper import get_paper, iter_questions
+from .percentiles import replace_score
+from .results import build_result
+from .services import get_exam_strategy, resolve_passed
+from .signals import recalculate_user_rank
+
+MAX_TRIES = 3
+
+
+class EssayScorer:
+    """Scores a batch of essays ({'answer_id', 'prompt', 'text', 'max_marks'})."""
+    name = 'base'
+    # Essays per score() call and score() calls in flight (caps for score_essays)
+    batch_size = 32
+    max_concurrency = 4
+
+    def score(self, essays):
+        raise NotImplementedError
+
+
+def round_band(value):
+    return float(np.clip(np.round(value * 2) / 2, 0, 9))
+
+
+class HeuristicEssayScorer(EssayScorer):
+    """
+    IELTS-style rubric from surface features, each criterion on the 0-9 band
+    scale. A rough proxy meant for practice feedback, not a trained model.
+    """
+    name = 'heuristic'
+    MIN_WORDS = 250
+    LINKERS = frozenset((
+        'however', 'therefore', 'moreover', 'furthermore', 'although', 'whereas', 'because',
+        'consequently', 'firstly', 'secondly', 'finally', 'additionally', 'nevertheless',
+        'thus', 'hence', 'instead', 'similarly', 'overall', 'conclusion', 'example',
+    ))
+    WINDOW = 50
+
+    _WORD_RE = re.compile(r"[a-zA-Z']+")
+    _SENTENCE_RE = re.compile(r'[.!?]+')
+    _PARAGRAPH_RE = re.compile(r'\n\s*\n')
+    _TARGET_RE = re.compile(r'at least (\d+) words', re.IGNORECASE)
+
+    def target_words(self, prompt):
+        match = self._TARGET_RE.search(prompt or '')
+        return int(match.group(1)) if match else self.MIN_WORDS
+
+    def criteria(self, text, min_words):
+        words = self._WORD_RE.findall(text.lower())
+        if not words:
+            return {'task': 0.0, 'coherence': 0.0, 'lexical': 0.0, 'grammar': 0.0}
+        n = len(words)
+        sentences = [s for s in self._SENTENCE_RE.split(text) if self._WORD_RE.search(s)]
+        lengths = np.array([len(self._WORD_RE.findall(s)) for s in sentences], dtype=np.float64)
+        paragraphs = [p for p in self._PARAGRAPH_RE.split(text.strip()) if p.strip()]
+        linkers = sum(1 for w in words if w in self.LINKERS)
+
+        # Task response: length against the target
+        task = 9 * min(1.0, n / min_words)
+        # Coherence: paragraphing and linking words per sentence
+        coherence = 4 + 2.5 * min(1.0, (len(paragraphs) - 1) / 3) + 2.5 * min(1.0, linkers / len(sentences) / 0.3)
+        # Lexical resource: moving type-token ratio, fair to long essays
+        if n <= self.WINDOW:
+            ttr = len(set(words)) / n
+        else:
+            ttr = np.mean([len(set(words[i:i + self.WINDOW])) / self.WINDOW for i in range(0, n - self.WINDOW + 1, 10)])
+        lexical = 3 + 15 * (ttr - 0.4)
+        # Grammatical range: sentence length near 20 words, with variety
+        mean = lengths.mean()
+        variety = lengths.std() / mean if len(lengths) > 1 else 0.0
+        grammar = 0.7 * (9 - abs(mean - 20) / 2.5) + 0.3 * 9 * min(1.0, variety / 0.4)
+
+        # Short answers cannot show range, whatever their ratios say
+        cap = 9 * min(1.0, 2 * n / min_words)
+        return {
+            name: round_band(min(value, cap))
+            for name, value in (('task', task), ('coherence', coherence), ('lexical', lexical), ('grammar', grammar))
+        }
+
+    def score(self, essays):
+        results = []
+        for essay in essays:
+            criteria = self.criteria(essay['text'], self.target_words(essay['prompt']))
+            band = round_band(sum(criteria.values()) / len(criteria))
+            results.append({
+                'marks': round(float(essay['max_marks']) * band / 9, 2),
+                'band': band,
+                'criteria': criteria,
+            })
+        return results
+
+
+class RemoteEssayScorer(EssayScorer):
+    """
+    Model service behind ESSAY_SCORER_URL. Request: {'essays': [{'id',
+    'prompt', 'text', 'max_marks'}]}; response: {'scores': [{'id', 'marks',
+    'band', 'criteria'}]}.
+    """
+    name = 'remote'
+    batch_size = 16
+    max_concurrency = 2
+
+    def score(self, essays):
+        url = getattr(settings, 'ESSAY_SCORER_URL', '')
+        if not url:
+            raise ImproperlyConfigured("RemoteEssayScorer needs ESSAY_SCORER_URL")
+        response = requests.post(
+            url,
+            json={'essays': [
+                {'id': e['answer_id'], 'prompt': e['prompt'], 'text': e['text'], 'max_marks': float(e['max_marks'])}
+                for e in essays
+            ]},
+            timeout=getattr(settings, 'ESSAY_SCORER_TIMEOUT', 30),
+        )
+        response.raise_for_status()
+        scores = {s['id']: s for s in response.json()['scores']}
+        missing = [e['answer_id'] for e in essays if e['answer_id'] not in scores]
+        if missing:
+            raise ValueError(f"Scorer returned no score for answers {missing}")
+        return [
+            {
+                'marks': min(float(scores[e['answer_id']]['marks']), float(e['max_marks'])),
+                'band': scores[e['answer_id']].get('band'),
+                'criteria': scores[e['answer_id']].get('criteria', {}),
+            }
+            for e in essays
+        ]
+
+
+@functools.lru_cache(maxsize=None)
+def _load_scorer(path):
+    return import_string(path)()
+
+
+def get_scorer():
+    return _load_scorer(getattr(settings, 'ESSAY_SCORER', 'mocktests.essay_scoring.HeuristicEssayScorer'))
+
+
+def enqueue_essays(attempt):
+    """Queues the non-empty ESSAY answers of a graded attempt. Returns the number queued."""
+    essay_ids = [
+        q['id'] for q in iter_questions(get_paper(attempt.test))
+        if q['question_type'] == TestQuestion.QuestionType.ESSAY
+    ]
+    if not essay_ids:
+        return 0
+    answer_ids = UserAnswer.objects.filter(
+        attempt=attempt, question_id__in=essay_ids, text_answer__regex=r'\S'
+    ).values_list('id', flat=True)
+    jobs = [EssayScoringJob(answer_id=answer_id, attempt=attempt) for answer_id in answer_ids]
+    EssayScoringJob.objects.bulk_create(jobs, ignore_conflicts=True)
+    return len(jobs)
+
+
+def score_batch(job_ids, scorer=None):
+    """
+    Scores a batch of claimed jobs with one scorer call and writes the marks
+    back in bulk. A scorer error sends the whole batch back to the queue
+    (FAILED after MAX_TRIES). Returns DONE or FAILED.
+    """
+    scorer = scorer or get_scorer()
+    jobs = list(EssayScoringJob.objects.filter(id__in=job_ids).select_related('answer__question'))
+    if not jobs:
+        return EssayScoringJob.Status.DONE
+    now = timezone.now()
+    for job in jobs:
+        job.tries += 1
+        job.locked_at = None
+        job.modified = now
+
+    essays = [
+        {
+            'answer_id': job.answer_id,
+            'prompt': job.answer.question.question_text,
+            'text': job.answer.text_answer or '',
+            'max_marks': job.answer.question.marks,
+        }
+        for job in jobs
+    ]
+    try:
+        scores = scorer.score(essays)
+    except Exception:
+        error = traceback.format_exc()[-4000:]
+        for job in jobs:
+            job.status = EssayScoringJob.Status.FAILED if job.tries >= MAX_TRIES else EssayScoringJob.Status.PENDING
+            job.last_error = error
+        EssayScoringJob.objects.bulk_update(jobs, ['status', 'tries', 'last_error', 'locked_at', 'modified'])
+        return EssayScoringJob.Status.FAILED
+
+    answers = []
+    for job, result in zip(jobs, scores):
+        job.answer.score_awarded = Decimal(str(round(float(result['marks']), 2)))
+        answers.append(job.answer)
+        job.status = EssayScoringJob.Status.DONE
+        job.last_error = ''
+        job.scorer = scorer.name
+        job.details = {'band': result.get('band'), 'criteria': result.get('criteria', {})}
+
+    with transaction.atomic():
+        UserAnswer.objects.bulk_update(answers, ['score_awarded'], batch_size=500)
+        EssayScoringJob.objects.bulk_update(
+            jobs, ['status', 'tries', 'last_error', 'locked_at', 'modified', 'scorer', 'details'], batch_size=500
+        )
+        attempt_ids = {job.attempt_id for job in jobs}
+        waiting = set(
+            EssayScoringJob.objects.filter(attempt_id__in=attempt_ids)
+            .exclude(status=EssayScoringJob.Status.DONE).values_list('attempt_id', flat=True)
+        )
+        rescore_attempts(attempt_ids - waiting)
+    return EssayScoringJob.Status.DONE
+
+
+def rescore_attempts(attempt_ids):
+    """
+    Re-totals SUBMITTED attempts through their exam strategy (one aggregate
+    query per test, one bulk UPDATE of score and is_passed), then refreshes
+    what derives from the score. Called when essays are scored and when an
+    examiner saves marks in the admin.
+    """
+    attempts = list(
+        UserTestAttempt.objects.select_for_update().select_related('test', 'user', 'result')
+        .filter(id__in=attempt_ids, status=UserTestAttempt.Status.SUBMITTED)
+    )
+    by_test = {}
+    for attempt in attempts:
+        by_test.setdefault(attempt.test_id, []).append(attempt)
+    scores = {}
+    for group in by_test.values():
+        test = group[0].test
+        for attempt_id, (total, details, passed) in get_exam_strategy(test.exam_type).rescore(test, group).items():
+            # Same pass rule as finalize_attempt
+            scores[attempt_id] = (total, details, resolve_passed(test, total, passed))
+
+    changed = []
+    for attempt in attempts:
+        total, details, passed = scores[attempt.id]
+        result = getattr(attempt, 'result', None)
+        # Bands can move (a component marked) without moving the overall score
+        stale = details is not None and result is not None and details != result.score_details
+        if attempt.score is None or total != attempt.score or passed != attempt.is_passed or stale:
+            changed.append((attempt, attempt.score, details))
+            attempt.score = total
+            attempt.is_passed = passed
+    if not changed:
+        return 0
+
+    UserTestAttempt.objects.bulk_update([a for a, _, _ in changed], ['score', 'is_passed'])
+    for attempt, old_score, details in changed:
+        replace_score(attempt, old_score)
+        if details is None and hasattr(attempt, 'result'):
+            details = attempt.result.score_details
+        build_result(attempt, score_details=details)
+    for user in {a.user_id: a.user for a, _, _ in changed}.values():
+        recalculate_user_rank(user)
+    return len(changed)
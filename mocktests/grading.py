@@ -0,0 +1,218 @@
+"""
+Set-based grading.
+
+The answer key of a test is compiled once per paper_version into parallel NumPy
+arrays sorted by question id, and a whole attempt is graded in one vectorized
+pass followed by a single bulk_update.
+
+MULTI (multiple-correct) questions follow JEE Advanced partial marking: full
+marks when the selection equals the key, a quarter of the marks per correct
+option picked when it is a strict subset, and, when the test has negative
+marking, minus half the marks as soon as one wrong option is picked (+4/+1/-2
+on a 4-mark question). Selections and keys are bitmasks of the options'
+mask_bit, which stays fixed when other options are added or deleted.
+"""
+from decimal import Decimal
+
+import numpy as np
+
+from .models import UserAnswer
+from .paper import get_paper, iter_questions
+
+QTYPE_MCQ = 1
+QTYPE_NUMERIC = 2
+QTYPE_MULTI = 3
+QTYPE_OTHER = 0
+
+_QTYPE_CODES = {'MCQ': QTYPE_MCQ, 'NUMERIC': QTYPE_NUMERIC, 'INPUT': QTYPE_NUMERIC, 'MULTI': QTYPE_MULTI}
+
+# MULTI partial marking, as shares of the question's marks
+MULTI_OPTION_SHARE = 0.25
+MULTI_WRONG_SHARE = 0.5
+
+# Per-process memo of compiled keys, keyed by (test_id, paper_version)
+_KEY_CACHE = {}
+_KEY_CACHE_SIZE = 256
+
+
+def parse_number(value):
+    """Numeric answers are compared as floats when both sides parse ('2.50' == '2.5')."""
+    try:
+        return float(str(value).strip())
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def option_mask(options, selected_ids):
+    """Bitmask of the selected option ids over a paper question's options (QuestionOption.mask_bit)."""
+    selected_ids = set(selected_ids)
+    return sum(1 << option['bit'] for option in options if option['id'] in selected_ids)
+
+
+def normalize_text(value):
+    return str(value).strip().lower() if value not in (None, '') else ''
+
+
+class AnswerKey:
+    """Compact answer key for one test version."""
+
+    def __init__(self, questions):
+        questions = sorted(questions, key=lambda q: q['id'])
+        n = len(questions)
+        self.question_ids = np.fromiter((q['id'] for q in questions), dtype=np.int64, count=n)
+        self.section_ids = np.fromiter((q['section_id'] for q in questions), dtype=np.int64, count=n)
+        self.qtype = np.fromiter((_QTYPE_CODES.get(q['question_type'], QTYPE_OTHER) for q in questions), dtype=np.int8, count=n)
+        self.marks = np.fromiter((q['marks'] for q in questions), dtype=np.float64, count=n)
+        # 0 = no single correct option
+        self.correct_option = np.fromiter(
+            (next((o['id'] for o in q['options'] if o['is_correct']), 0) for q in questions),
+            dtype=np.int64, count=n
+        )
+        # Bitmask of every correct option (MULTI)
+        self.correct_mask = np.fromiter(
+            (option_mask(q['options'], [o['id'] for o in q['options'] if o['is_correct']]) for q in questions),
+            dtype=np.int64, count=n
+        )
+        # Mask bits of every option (MULTI selections may only set these), and the question of each option id
+        self.option_bits = np.fromiter((option_mask(q['options'], [o['id'] for o in q['options']]) for q in questions), dtype=np.int64, count=n)
+        self.option_question = {o['id']: q['id'] for q in questions for o in q['options']}
+        self.numeric_value = np.fromiter((parse_number(q['correct_answer_value']) for q in questions), dtype=np.float64, count=n)
+        # Fallback for non-numeric input keys (e.g. 'A', 'x+1')
+        self.text_value = [normalize_text(q['correct_answer_value']) for q in questions]
+
+    def index_of(self, question_ids):
+        """Positions of question_ids in the key; -1 for ids that are not on the paper."""
+        question_ids = np.asarray(question_ids, dtype=np.int64)
+        if len(self.question_ids) == 0:
+            return np.full(len(question_ids), -1, dtype=np.int64)
+        idx = np.searchsorted(self.question_ids, question_ids)
+        idx = np.clip(idx, 0, len(self.question_ids) - 1)
+        return np.where(self.question_ids[idx] == question_ids, idx, -1)
+
+
+def get_answer_key(test):
+    cache_key = (test.pk, test.paper_version)
+    key = _KEY_CACHE.get(cache_key)
+    if key is None:
+        if len(_KEY_CACHE) >= _KEY_CACHE_SIZE:
+            _KEY_CACHE.clear()
+        key = AnswerKey(list(iter_questions(get_paper(test))))
+        _KEY_CACHE[cache_key] = key
+    return key
+
+
+def clear_answer_keys():
+    _KEY_CACHE.clear()
+
+
+def negative_marking_fraction(test):
+    """Share of a question's marks deducted for a wrong answer (0 when disabled)."""
+    if not test.has_negative_marking:
+        return 0.0
+    pct = float(test.negative_marking_percentage or 0)
+    # The field is documented as a fraction (0.25); tolerate admins typing 25
+    return pct / 100 if pct > 1 else pct
+
+
+def grade_arrays(key, question_ids, option_ids, texts, negative_fraction=0.0, masks=None):
+    """
+    Pure vectorized grading.
+    Returns (gradable, attempted, is_correct, score) arrays aligned with the inputs;
+    rows that are not MCQ/NUMERIC/MULTI or not on the paper have gradable=False.
+    """
+    idx = key.index_of(question_ids)
+    on_paper = idx >= 0
+    safe_idx = np.where(on_paper, idx, 0)
+
+    qtype = np.where(on_paper, key.qtype[safe_idx], QTYPE_OTHER)
+    marks = key.marks[safe_idx]
+    option_ids = np.asarray(option_ids, dtype=np.int64)
+
+    # MCQ: compare selected option ids against the key
+    is_mcq = qtype == QTYPE_MCQ
+    mcq_attempted = is_mcq & (option_ids != 0)
+    mcq_correct = mcq_attempted & (option_ids == key.correct_option[safe_idx])
+
+    # NUMERIC: float comparison, exact (case-insensitive) text as fallback
+    is_numeric = qtype == QTYPE_NUMERIC
+    normalized = [normalize_text(t) for t in texts]
+    numeric_attempted = is_numeric & np.fromiter((t != '' for t in normalized), dtype=bool, count=len(normalized))
+    user_values = np.fromiter((parse_number(t) for t in normalized), dtype=np.float64, count=len(normalized))
+    key_values = key.numeric_value[safe_idx]
+    numeric_correct = numeric_attempted & np.isclose(user_values, key_values, rtol=0, atol=1e-9)
+    needs_text = numeric_attempted & ~numeric_correct & (np.isnan(key_values) | np.isnan(user_values))
+    for i in np.flatnonzero(needs_text):
+        numeric_correct[i] = normalized[i] == key.text_value[safe_idx[i]]
+
+    # MULTI: selection bitmask against the key bitmask
+    is_multi = qtype == QTYPE_MULTI
+    masks = np.zeros(len(option_ids), dtype=np.int64) if masks is None else np.asarray(masks, dtype=np.int64)
+    key_masks = key.correct_mask[safe_idx]
+    multi_attempted = is_multi & (masks != 0)
+    multi_wrong = multi_attempted & ((masks & ~key_masks) != 0)
+    multi_correct = multi_attempted & (masks == key_masks)
+    multi_partial = multi_attempted & ~multi_wrong & ~multi_correct
+
+    gradable = is_mcq | is_numeric | is_multi
+    attempted = mcq_attempted | numeric_attempted | multi_attempted
+    is_correct = mcq_correct | numeric_correct | multi_correct
+
+    score = np.where(is_correct, marks, 0.0)
+    score = np.where(multi_partial, marks * MULTI_OPTION_SHARE * np.bitwise_count(masks & key_masks), score)
+    if negative_fraction:
+        single = ~is_multi & attempted & ~is_correct
+        score = np.where(single, -marks * negative_fraction, score)
+        score = np.where(multi_wrong, -marks * MULTI_WRONG_SHARE, score)
+    return gradable, attempted, is_correct, score
+
+
+def grade_attempt(attempt, test=None):
+    """
+    Grades every MCQ/NUMERIC/MULTI answer of the attempt in one pass and persists
+    is_correct/score_awarded with a single bulk_update.
+    Returns {'score', 'correct_count', 'attempted_count'} over all answers,
+    plus aligned 'question_ids'/'is_correct' arrays.
+    """
+    test = test or attempt.test
+    key = get_answer_key(test)
+
+    answers = list(
+        UserAnswer.objects.filter(attempt=attempt).only(
+            'id', 'question_id', 'selected_option_id', 'selected_mask', 'text_answer', 'numeric_answer',
+            'score_awarded', 'is_correct'
+        )
+    )
+    if not answers:
+        return {
+            'score': Decimal('0'), 'correct_count': 0, 'attempted_count': 0,
+            'question_ids': np.empty(0, dtype=np.int64), 'is_correct': np.empty(0, dtype=bool),
+        }
+
+    gradable, attempted, is_correct, score = grade_arrays(
+        key,
+        [a.question_id for a in answers],
+        [a.selected_option_id or 0 for a in answers],
+        [a.text_answer or a.numeric_answer for a in answers],
+        negative_marking_fraction(test),
+        [a.selected_mask for a in answers],
+    )
+
+    to_update = []
+    for i in np.flatnonzero(gradable):
+        answer = answers[i]
+        answer.is_correct = bool(is_correct[i])
+        answer.score_awarded = Decimal(str(round(float(score[i]), 2)))
+        to_update.append(answer)
+    if to_update:
+        UserAnswer.objects.bulk_update(to_update, ['is_correct', 'score_awarded'], batch_size=500)
+
+    # Ungraded rows (e.g. essays) keep whatever score they already carry
+    total = sum((a.score_awarded for a in answers), Decimal('0'))
+    return {
+        'score': total,
+        'correct_count': sum(1 for a in answers if a.is_correct),
+        'attempted_count': int(np.count_nonzero(attempted)),
+        # Per-answer arrays for strategies that break the score down further
+        'question_ids': np.fromiter((a.question_id for a in answers), dtype=np.int64, count=len(answers)),
+        'is_correct': np.fromiter((a.is_correct for a in answers), dtype=bool, count=len(answers)),
+    }
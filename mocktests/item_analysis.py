@@ -0,0 +1,162 @@
+"""
+Item analysis (`manage.py compute_item_stats`, run nightly).
+
+For each test, the UserAnswer rows of SUBMITTED attempts are streamed in
+chunks of attempts. Each chunk becomes a boolean attempt x question matrix of
+correct answers, and only running sums are carried between chunks, so memory is
+bounded by the chunk size however many answers the test has.
+
+Per question:
+  p_value         share of attempts answering correctly
+  discrimination  corrected point-biserial: correctness against the number of
+                  *other* questions answered correctly
+  options         per QuestionOption pick count, pick rate and point-biserial of
+                  picking it against the total (a good distractor is negative);
+                  a MULTI answer picks every option whose mask_bit is set in
+                  its selected_mask
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.utils import timezone
+
+from .models import QuestionOption, QuestionStats, TestQuestion, UserAnswer, UserTestAttempt
+
+CHUNK_SIZE = 2000
+
+
+def _columns(ids, values):
+    """Column of each value in the sorted id array, -1 where absent."""
+    cols = np.searchsorted(ids, values)
+    cols[cols >= len(ids)] = 0
+    return np.where(ids[cols] == values, cols, -1) if len(ids) else np.full(len(values), -1)
+
+
+def _point_biserial(n, sum_x, sum_x2, sum_y, sum_xy):
+    """Pearson r of a score x with a 0/1 indicator y, from sums (arrays allowed)."""
+    den = (n * sum_x2 - sum_x ** 2) * (n * sum_y - sum_y ** 2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = (n * sum_xy - sum_x * sum_y) / np.sqrt(den)
+    return np.where(den > 0, r, np.nan)
+
+
+def _float(value):
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def analyze_test(test, chunk_size=CHUNK_SIZE):
+    """Recomputes QuestionStats for every question of `test`. Returns the number of attempts analyzed."""
+    q_ids = np.array(
+        TestQuestion.objects.filter(section__test=test).order_by('pk').values_list('pk', flat=True), dtype=np.int64
+    )
+    options = list(
+        QuestionOption.objects.filter(question__section__test=test).order_by('pk').values_list('pk', 'question_id', 'mask_bit')
+    )
+    o_ids = np.array([o[0] for o in options], dtype=np.int64)
+    num_q, num_o = len(q_ids), len(o_ids)
+    if not num_q:
+        return 0
+
+    # Per question column: its option indices (-1 padded) and their mask bits, to expand MULTI masks
+    o_cols = _columns(q_ids, np.array([o[1] for o in options], dtype=np.int64))
+    slots = np.bincount(o_cols[o_cols >= 0], minlength=num_q)
+    width = int(slots.max())
+    option_at = np.full((num_q, width), -1, dtype=np.int64)
+    bit_at = np.zeros((num_q, width), dtype=np.int64)
+    filled = np.zeros(num_q, dtype=np.int64)
+    for i, (col, (_, _, bit)) in enumerate(zip(o_cols, options)):
+        if col >= 0:
+            option_at[col, filled[col]] = i
+            bit_at[col, filled[col]] = bit
+            filled[col] += 1
+
+    n = 0
+    sum_t = sum_t2 = 0.0
+    correct = np.zeros(num_q)
+    answered = np.zeros(num_q)
+    sum_ty = np.zeros(num_q)
+    picks = np.zeros(num_o)
+    picks_t = np.zeros(num_o)
+
+    attempts = UserTestAttempt.objects.filter(test=test, status=UserTestAttempt.Status.SUBMITTED).order_by('pk')
+    last_pk = 0
+    while True:
+        a_ids = np.array(attempts.filter(pk__gt=last_pk).values_list('pk', flat=True)[:chunk_size], dtype=np.int64)
+        if not len(a_ids):
+            break
+        last_pk = int(a_ids[-1])
+
+        rows = UserAnswer.objects.filter(
+            attempt__test=test, attempt__status=UserTestAttempt.Status.SUBMITTED,
+            attempt_id__gte=int(a_ids[0]), attempt_id__lte=last_pk,
+        ).annotate(
+            has_text=ExpressionWrapper(Q(text_answer__gt='') | Q(numeric_answer__gt=''), output_field=BooleanField())
+        ).values_list('attempt_id', 'question_id', 'selected_option_id', 'selected_mask', 'is_correct', 'has_text')
+        attempt_col, question_col, option_col, mask_col, correct_col, text_col = list(zip(*rows.iterator())) or [()] * 6
+
+        r = np.searchsorted(a_ids, np.array(attempt_col, dtype=np.int64))
+        c = _columns(q_ids, np.array(question_col, dtype=np.int64))
+        selected = np.array([o or 0 for o in option_col], dtype=np.int64)
+        mask = np.array(mask_col, dtype=np.int64)
+        is_correct = np.array(correct_col, dtype=bool)
+        has_text = np.array([bool(t) for t in text_col], dtype=bool)
+        # Answers to questions removed from the paper since
+        known = c >= 0
+        r, c, selected, mask = r[known], c[known], selected[known], mask[known]
+        is_correct, has_text = is_correct[known], has_text[known]
+
+        matrix = np.zeros((len(a_ids), num_q), dtype=bool)
+        matrix[r, c] = is_correct
+        totals = matrix.sum(axis=1, dtype=np.float64)
+
+        n += len(a_ids)
+        sum_t += totals.sum()
+        sum_t2 += (totals ** 2).sum()
+        correct += matrix.sum(axis=0)
+        sum_ty += totals @ matrix
+        answered += np.bincount(c[(selected > 0) | (mask > 0) | has_text | is_correct], minlength=num_q)
+
+        o = _columns(o_ids, selected)
+        picked = o >= 0
+        # MULTI answers: one pick per option of the question whose bit is set
+        multi = mask > 0
+        multi_o = option_at[c[multi]]
+        multi_picked = (multi_o >= 0) & ((mask[multi, None] >> bit_at[c[multi]]) & 1).astype(bool)
+        o = np.concatenate([o[picked], multi_o[multi_picked]])
+        t = np.concatenate([
+            totals[r[picked]], np.broadcast_to(totals[r[multi], None], multi_o.shape)[multi_picked],
+        ])
+        picks += np.bincount(o, minlength=num_o)
+        picks_t += np.bincount(o, weights=t, minlength=num_o)
+
+    # Rest score x = total - y; y is 0/1 so y**2 == y
+    discrimination = _point_biserial(
+        n, sum_t - correct, sum_t2 - 2 * sum_ty + correct, correct, sum_ty - correct
+    )
+    option_discrimination = _point_biserial(n, sum_t, sum_t2, picks, picks_t)
+
+    option_stats = {}
+    for i, (option_id, question_id, _) in enumerate(options):
+        option_stats.setdefault(question_id, {})[str(option_id)] = {
+            'count': int(picks[i]),
+            'rate': round(float(picks[i]) / n, 4) if n else None,
+            'discrimination': _float(option_discrimination[i]),
+        }
+
+    now = timezone.now()
+    stats = [
+        QuestionStats(
+            question_id=int(question_id),
+            attempts=n,
+            answered=int(answered[j]),
+            p_value=round(float(correct[j]) / n, 4) if n else None,
+            discrimination=_float(discrimination[j]),
+            options=option_stats.get(int(question_id), {}),
+            computed_at=now,
+        )
+        for j, question_id in enumerate(q_ids)
+    ]
+    with transaction.atomic():
+        QuestionStats.objects.filter(question__section__test=test).delete()
+        QuestionStats.objects.bulk_create(stats)
+    return n
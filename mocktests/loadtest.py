@@ -0,0 +1,207 @@
+"""
+Exam-day load harness (`manage.py loadtest_exam`).
+
+Simulates concurrent candidates walking the real attempt lifecycle through
+django.test.Client, in threads against the configured database:
+
+    start_test -> take_test -> save_answers_batch (or save_answer) x N -> submit_test -> test_result
+
+Every request is timed and its DB queries counted, and the run is summarized
+per endpoint (throughput, p50/p95/p99 latency, queries per request, errors) so
+changes to mocktests.views can be compared run to run.
+
+Concurrent runs need PostgreSQL: SQLite allows one writer at a time, so
+parallel candidates fail with "database is locked". With concurrency=1 the
+candidates run one after another in the calling thread, which works on any
+database (and inside a test transaction).
+"""
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from enrollments.models import UserEnrollment
+from marketplace.models import MarketplaceItem
+from .models import MockTestAttributes, TestSection, TestQuestion, QuestionOption
+
+LOADTEST_SLUG = 'loadtest-exam'
+LOADTEST_EMAIL = 'loadtest-{}@example.com'
+# Report order
+ENDPOINTS = ('start_test', 'take_test', 'save_answer', 'save_answers_batch', 'submit_test', 'test_result')
+
+_TOKEN_RE = re.compile(r'const attemptToken = "([^"]*)"')
+_ATTEMPT_RE = re.compile(r'/attempt/(\d+)/')
+
+
+def seed(candidates, sections=3, questions_per_section=30, slug=LOADTEST_SLUG):
+    """Creates (or tops up) a synthetic MCQ test and enrolled candidates. Returns the test."""
+    item, _ = MarketplaceItem.objects.get_or_create(
+        slug=slug,
+        defaults={'title': 'Load Test Exam', 'item_type': MarketplaceItem.ItemType.MOCK_TEST, 'is_active': True},
+    )
+    test, created = MockTestAttributes.objects.get_or_create(item=item, defaults={'duration_minutes': 180})
+    if created:
+        for s in range(sections):
+            section = TestSection.objects.create(test=test, title=f"Section {s + 1}", sort_order=s)
+            questions = TestQuestion.objects.bulk_create([
+                TestQuestion(section=section, question_text=f"Load question {s + 1}.{q + 1}", marks=4, sort_order=q)
+                for q in range(questions_per_section)
+            ])
+            QuestionOption.objects.bulk_create([
+                QuestionOption(question=question, option_text=f"Option {o + 1}", is_correct=(o == 0), mask_bit=o)
+                for question in questions for o in range(4)
+            ])
+
+    User = get_user_model()
+    users = []
+    for i in range(candidates):
+        email = LOADTEST_EMAIL.format(i)
+        user, _ = User.objects.get_or_create(username=f"loadtest-{i}", defaults={'email': email})
+        users.append(user)
+    existing = set(UserEnrollment.objects.filter(item=item).values_list('user_id', flat=True))
+    UserEnrollment.objects.bulk_create(
+        [UserEnrollment(user=user, item=item) for user in users if user.pk not in existing]
+    )
+    return test
+
+
+def _answer_pool(test):
+    """[(question_id, [option ids])] of the MCQ questions of the test."""
+    options = {}
+    for option_id, question_id in QuestionOption.objects.filter(
+        question__section__test=test, question__question_type='MCQ'
+    ).values_list('id', 'question_id'):
+        options.setdefault(question_id, []).append(option_id)
+    return sorted(options.items())
+
+
+class Recorder:
+    """Thread-safe collector of (endpoint, seconds, queries, error) samples; error is None on success."""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, seconds, queries, error=None):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((seconds, queries, error))
+
+    def summary(self, wall_seconds):
+        rows = []
+        for endpoint, samples in sorted(self.samples.items(), key=lambda kv: ENDPOINTS.index(kv[0])):
+            latencies = sorted(s[0] for s in samples)
+            rows.append({
+                'endpoint': endpoint,
+                'requests': len(samples),
+                'errors': sum(1 for s in samples if s[2]),
+                'error_kinds': dict(Counter(s[2] for s in samples if s[2])),
+                'throughput': len(samples) / wall_seconds if wall_seconds else 0.0,
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'queries_avg': sum(s[1] for s in samples) / len(samples),
+                'queries_max': max(s[1] for s in samples),
+            })
+        return rows
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _host():
+    hosts = [h for h in settings.ALLOWED_HOSTS if h and not h.startswith('.') and h != '*']
+    return hosts[0] if hosts else 'localhost'
+
+
+def _timed(recorder, endpoint, call, ok_status=(200, 302)):
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        error = None
+        try:
+            response = call()
+        except Exception as exc:
+            response, error = None, type(exc).__name__
+        elapsed = time.perf_counter() - started
+    if error is None and response.status_code not in ok_status:
+        error = f"HTTP {response.status_code}"
+    recorder.add(endpoint, elapsed, len(queries), error)
+    return response
+
+
+def run_candidate(user, slug, pool, saves, batch, recorder, save_mode='batch', think_time=0.0):
+    """One candidate's full attempt. Returns True when every step succeeded."""
+    client = Client(HTTP_HOST=_host(), secure=getattr(settings, 'SECURE_SSL_REDIRECT', False))
+    client.force_login(user)
+    rng = random.Random(user.pk)
+    response = _timed(recorder, 'start_test', lambda: client.get(reverse('start_test', args=[slug])))
+    match = _ATTEMPT_RE.search(response['Location']) if response is not None and response.status_code == 302 else None
+    if not match:
+        return False
+    attempt_id = int(match.group(1))
+
+    response = _timed(recorder, 'take_test', lambda: client.get(reverse('take_test', args=[attempt_id])))
+    if response is None or response.status_code != 200:
+        return False
+    token = _TOKEN_RE.search(response.content.decode())
+    headers = {'HTTP_X_ATTEMPT_TOKEN': token.group(1)} if token else {}
+
+    for _ in range(saves if pool else 0):
+        picks = rng.sample(pool, min(batch, len(pool)))
+        deltas = [{'question_id': qid, 'option_id': rng.choice(options)} for qid, options in picks]
+        if save_mode == 'single':
+            body = dict(deltas[0], attempt_id=attempt_id)
+            url, endpoint = reverse('save_answer'), 'save_answer'
+        else:
+            body = {'attempt_id': attempt_id, 'answers': deltas}
+            url, endpoint = reverse('save_answers_batch'), 'save_answers_batch'
+        _timed(recorder, endpoint, lambda: client.post(url, json.dumps(body), content_type='application/json', **headers))
+        if think_time:
+            time.sleep(rng.uniform(0, think_time))
+
+    _timed(recorder, 'submit_test', lambda: client.post(reverse('submit_test', args=[attempt_id])))
+    response = _timed(recorder, 'test_result', lambda: client.get(reverse('test_result', args=[attempt_id])))
+    return response is not None and response.status_code == 200
+
+
+def run(test, candidates, concurrency, saves=20, batch=1, save_mode='batch', think_time=0.0):
+    """Runs the scenario. Returns (summary rows, wall seconds, completed candidates)."""
+    users = list(
+        get_user_model().objects.filter(enrollments__item=test.item).order_by('pk')[:candidates]
+    )
+    pool = _answer_pool(test)
+    recorder = Recorder()
+
+    def candidate(user):
+        return run_candidate(user, test.item.slug, pool, saves, batch, recorder, save_mode, think_time)
+
+    def threaded(user):
+        # Each pool thread has its own DB connection; release it when done
+        try:
+            return candidate(user)
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(threaded, users))
+    else:
+        results = [candidate(user) for user in users]
+    wall = time.perf_counter() - started
+    return recorder.summary(wall), wall, sum(1 for ok in results if ok)
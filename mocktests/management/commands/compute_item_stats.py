@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from mocktests.item_analysis import CHUNK_SIZE, analyze_test
+from mocktests.models import MockTestAttributes
+
+
+class Command(BaseCommand):
+    help = 'Recomputes item-analysis statistics (p-value, discrimination, distractors) from submitted answers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slug', help='Only this test (marketplace item slug)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Attempts loaded per chunk')
+
+    def handle(self, *args, **options):
+        tests = MockTestAttributes.objects.select_related('item').order_by('pk')
+        if options['slug']:
+            tests = tests.filter(item__slug=options['slug'])
+            if not tests.exists():
+                raise CommandError(f"No mock test with slug '{options['slug']}'")
+
+        for test in tests:
+            attempts = analyze_test(test, options['chunk_size'])
+            self.stdout.write(f"{test.item.slug}: {attempts} attempts analyzed")
+        self.stdout.write(self.style.SUCCESS('Item statistics updated.'))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from mocktests import answer_buffer
+
+
+class Command(BaseCommand):
+    help = 'Flushes write-behind answer buffer entries to UserAnswer in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Flush every in-progress attempt, not only dirty ones (crash recovery)')
+        parser.add_argument('--loop', type=int, default=0, help='Keep running, flushing every N seconds')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not answer_buffer.is_enabled():
+            self.stdout.write(self.style.WARNING('ANSWER_WRITE_BEHIND is off; nothing to flush.'))
+            return
+
+        while True:
+            attempts, rows = answer_buffer.flush_pending(
+                include_clean=options['all'],
+                batch_size=options['batch_size'],
+            )
+            self.stdout.write(f"Flushed {rows} answers across {attempts} attempts.")
+
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
+
+        self.stdout.write(self.style.SUCCESS('Answer buffer flushed.'))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from mocktests import attempt_events
+
+
+class Command(BaseCommand):
+    help = 'Moves buffered exam events (question focus, tab switches) into AttemptEventLog in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', type=int, default=0, help='Keep running, flushing every N seconds')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        while True:
+            written = attempt_events.flush_pending(batch_size=options['batch_size'])
+            self.stdout.write(f"Flushed {written} events.")
+
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
+
+        self.stdout.write(self.style.SUCCESS('Event buffer flushed.'))
@@ -46,6 +46,7 @@ from marketplace.models import MarketplaceItem
 from mocktests.models import (
     MockTestAttributes, TestSection, TestQuestion, QuestionOption, QuestionMedia
 )
+from mocktests.dedup import DuplicateIndex
 
 # =============================================================================
 # CONFIGURATION
@@ -194,6 +195,8 @@ class Command(BaseCommand):
 
         # 1. Setup Exam Structure
         item, test_attr = self.setup_exam_structure(options['force'])
+        # Loaded after --force so the deleted test's questions are gone
+        self.dedup = DuplicateIndex.load()
         
         # 2. Generate All Sections
         sections_config = [
@@ -371,6 +374,10 @@ Perfect preparation for JEE Mains 2026!''',
                 valid_questions = []
                 for q in questions_data:
                     is_valid, reason = self.validate_question(q, q_type, image_type)
+                    if is_valid:
+                        duplicate = self.find_duplicate(q)
+                        if duplicate:
+                            is_valid, reason = False, f"Near-duplicate of Q{duplicate[0]} ({duplicate[1]:.0%})"
                     if is_valid:
                         valid_questions.append(q)
                     else:
@@ -646,8 +653,8 @@ Generate {count} high-quality questions now:"""
         )
 
         # Create options for MCQ
+        options_raw = [self.clean_text(str(o)) for o in data.get('options', [])]
         if q_type == 'MCQ':
-            options_raw = [self.clean_text(str(o)) for o in data.get('options', [])]
             for opt in options_raw:
                 is_correct = (opt.lower().strip() == correct_raw.lower().strip())
                 QuestionOption.objects.create(
@@ -656,12 +663,19 @@ Generate {count} high-quality questions now:"""
                     is_correct=is_correct
                 )
 
+        self.dedup.add(question.id, q_text, options_raw if q_type == 'MCQ' else [])
+
         # Generate images if needed
         if image_type == "rdkit" and RDKIT_AVAILABLE and data.get('smiles'):
             self.generate_rdkit_image(question, data['smiles'])
         elif data.get('python_code'):
             self.generate_matplotlib_image(question, data['python_code'])
 
+    def find_duplicate(self, data):
+        """(question_id, similarity) of a near-duplicate already in the bank, or None"""
+        options = [self.clean_text(str(o)) for o in data.get('options', [])] if str(data.get('type', 'MCQ')).upper() == 'MCQ' else []
+        return self.dedup.find(self.clean_text(data.get('question_text', '')), options)
+
     def clean_text(self, text):
         """Clean text from formatting artifacts"""
         if not text:
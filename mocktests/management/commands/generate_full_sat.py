@@ -22,6 +22,7 @@ from marketplace.models import MarketplaceItem
 from mocktests.models import (
     MockTestAttributes, TestSection, TestQuestion, QuestionOption, QuestionMedia
 )
+from mocktests.dedup import DuplicateIndex
 
 # --- CONFIGURATION ---
 GEMINI_API_KEY = getattr(settings, "GEMINI_API_KEY", "") 
@@ -113,6 +114,8 @@ class Command(BaseCommand):
 
         # 1. Setup Exam
         item, test_attr = self.setup_exam_structure(options['force'])
+        # Loaded after --force so the deleted test's questions are gone
+        self.dedup = DuplicateIndex.load()
         
         # 2. Execute Plan
         modules_config = [
@@ -160,7 +163,12 @@ class Command(BaseCommand):
         section, _ = TestSection.objects.get_or_create(
             test=test_attr,
             title=section_title,
-            defaults={'sort_order': module_num + sort_offset, 'section_duration': 32 if subject[0]=='R' else 35}
+            defaults={
+                'sort_order': module_num + sort_offset,
+                'section_duration': 32 if subject[0]=='R' else 35,
+                'subject': 'RW' if subject[0]=='R' else 'MATH',
+                'module': f'M{module_num}',
+            }
         )
 
         total_needed = sum(item[2] for item in blueprint)
@@ -201,6 +209,10 @@ class Command(BaseCommand):
                 valid_questions = []
                 for q in questions_data:
                     is_valid, reason = self.validate_question_data(q)
+                    if is_valid:
+                        duplicate = self.find_duplicate(q)
+                        if duplicate:
+                            is_valid, reason = False, f"Near-duplicate of Q{duplicate[0]} ({duplicate[1]:.0%})"
                     if is_valid:
                         valid_questions.append(q)
                     else:
@@ -295,6 +307,11 @@ class Command(BaseCommand):
         
         return json.loads(response.text)
 
+    def find_duplicate(self, data):
+        """(question_id, similarity) of a near-duplicate already in the bank, or None"""
+        options = [self.clean_text(o) for o in data.get('options', [])] if str(data.get('type', 'MCQ')).upper() == 'MCQ' else []
+        return self.dedup.find(self.clean_text(data.get('question_text')), options)
+
     def clean_text(self, text):
         if not text: return ""
         text = str(text).strip()
@@ -325,6 +342,8 @@ class Command(BaseCommand):
                 is_correct = (opt.lower() == correct_raw.lower())
                 QuestionOption.objects.create(question=question, option_text=opt, is_correct=is_correct)
 
+        self.dedup.add(question.id, q_text, options_raw if q_type == 'MCQ' else [])
+
         if data.get('python_code'):
             self.generate_and_save_image(question, data['python_code'])
 
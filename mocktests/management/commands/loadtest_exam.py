@@ -0,0 +1,63 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from mocktests import loadtest
+from mocktests.models import MockTestAttributes
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulates concurrent candidates (start_test -> take_test -> autosaves -> submit_test -> test_result) '
+        'and reports throughput, latency percentiles and DB queries per endpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slug', default=loadtest.LOADTEST_SLUG, help='Marketplace slug of the test to run')
+        parser.add_argument('--seed', action='store_true', help='Create the synthetic test and enrolled candidates first')
+        parser.add_argument('--sections', type=int, default=3, help='With --seed: sections in the synthetic test')
+        parser.add_argument('--questions', type=int, default=30, help='With --seed: MCQs per section')
+        parser.add_argument('--candidates', type=int, default=50, help='Candidates to simulate')
+        parser.add_argument(
+            '--concurrency', type=int, default=10,
+            help='Candidates running at the same time (above 1 needs PostgreSQL; SQLite fails with "database is locked")'
+        )
+        parser.add_argument('--saves', type=int, default=20, help='Autosave requests per candidate')
+        parser.add_argument('--batch', type=int, default=1, help='Answer deltas per autosave request')
+        parser.add_argument('--save-mode', choices=['batch', 'single'], default='batch',
+                            help='Autosave through save_answers_batch or the legacy save_answer')
+        parser.add_argument('--think-time', type=float, default=0.0, help='Max random pause between autosaves (s)')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON (for diffing runs)')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            test = loadtest.seed(options['candidates'], options['sections'], options['questions'], slug=options['slug'])
+        else:
+            try:
+                test = MockTestAttributes.objects.select_related('item').get(item__slug=options['slug'])
+            except MockTestAttributes.DoesNotExist:
+                raise CommandError(f"No mock test with slug '{options['slug']}' (use --seed to create one)")
+
+        rows, wall, completed = loadtest.run(
+            test, options['candidates'], options['concurrency'],
+            saves=options['saves'], batch=options['batch'],
+            save_mode=options['save_mode'], think_time=options['think_time'],
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps({'wall_seconds': wall, 'completed': completed, 'endpoints': rows}, indent=2))
+            return
+
+        self.stdout.write(f"{completed} candidates completed in {wall:.2f}s (concurrency={options['concurrency']})")
+        header = f"{'endpoint':<20}{'reqs':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'q avg':>8}{'q max':>7}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in rows:
+            self.stdout.write(
+                f"{row['endpoint']:<20}{row['requests']:>7}{row['errors']:>8}{row['throughput']:>9.1f}"
+                f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+                f"{row['queries_avg']:>8.1f}{row['queries_max']:>7}"
+            )
+            if row['error_kinds']:
+                kinds = ', '.join(f"{kind} x{count}" for kind, count in row['error_kinds'].items())
+                self.stdout.write(f"{'':<20}errors: {kinds}")
+        self.stdout.write(self.style.SUCCESS('Load test finished.'))
@@ -3,6 +3,7 @@ from marketplace.models import MarketplaceItem
 from mocktests.models import (
     MockTestAttributes, TestSection, TestQuestion, QuestionOption, ComprehensionPassage
 )
+from mocktests.dedup import find_duplicates
 
 class Command(BaseCommand):
     help = 'Generates a high-quality Digital SAT Mock Test'
@@ -42,7 +43,7 @@ class Command(BaseCommand):
         # ==========================================
         # SECTION 1: READING & WRITING - MODULE 1
         # ==========================================
-        rw_mod1 = TestSection.objects.create(test=test_attr, title="Reading & Writing: Module 1", sort_order=1)
+        rw_mod1 = TestSection.objects.create(test=test_attr, title="Reading & Writing: Module 1", sort_order=1, subject="RW", module="M1")
 
         # Q1: Words in Context (Vocabulary)
         q1 = TestQuestion.objects.create(
@@ -96,7 +97,7 @@ class Command(BaseCommand):
         # ==========================================
         # SECTION 2: READING & WRITING - MODULE 2
         # ==========================================
-        rw_mod2 = TestSection.objects.create(test=test_attr, title="Reading & Writing: Module 2", sort_order=2)
+        rw_mod2 = TestSection.objects.create(test=test_attr, title="Reading & Writing: Module 2", sort_order=2, subject="RW", module="M2")
 
         # Q4: Transitions
         q4 = TestQuestion.objects.create(
@@ -116,7 +117,7 @@ class Command(BaseCommand):
         # ==========================================
         # SECTION 3: MATH - MODULE 1 (No Calculator Restriction)
         # ==========================================
-        math_mod1 = TestSection.objects.create(test=test_attr, title="Math: Module 1", sort_order=3)
+        math_mod1 = TestSection.objects.create(test=test_attr, title="Math: Module 1", sort_order=3, subject="MATH", module="M1")
 
         # Q5: Algebra (Linear Equations)
         q5 = TestQuestion.objects.create(
@@ -147,7 +148,7 @@ class Command(BaseCommand):
         # ==========================================
         # SECTION 4: MATH - MODULE 2 (Harder)
         # ==========================================
-        math_mod2 = TestSection.objects.create(test=test_attr, title="Math: Module 2", sort_order=4)
+        math_mod2 = TestSection.objects.create(test=test_attr, title="Math: Module 2", sort_order=4, subject="MATH", module="M2")
 
         # Q7: Advanced Math (Non-linear functions)
         q7 = TestQuestion.objects.create(
@@ -174,4 +175,10 @@ class Command(BaseCommand):
         QuestionOption.objects.create(question=q8, option_text="$$1000 + 0.2t$$", is_correct=False)
         QuestionOption.objects.create(question=q8, option_text="$$1200^t$$", is_correct=False)
 
+        # Flag questions that already exist in another test (the index follows saves via signals)
+        for q in TestQuestion.objects.filter(section__test=test_attr).prefetch_related('options'):
+            options = [o.option_text for o in q.options.all()]
+            for match_id, score in find_duplicates(q.question_text, options, exclude=q.id):
+                self.stdout.write(self.style.WARNING(f"Q{q.id} is a near-duplicate of Q{match_id} ({score:.0%})"))
+
         self.stdout.write(self.style.SUCCESS("SAT Mock Test Created Successfully!"))
\ No newline at end of file
@@ -0,0 +1,46 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from mocktests.models import MockTestAttributes
+from mocktests.prewarm import check_shared_cache, prewarm_test, purge_unopened_attempts, tests_starting_within
+
+
+class Command(BaseCommand):
+    help = 'Pre-warms paper, enrollment cache and IN_PROGRESS attempts for scheduled tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slug', help='Pre-warm one test by its marketplace slug')
+        parser.add_argument(
+            '--minutes', type=int, default=15,
+            help='Without --slug: pre-warm every test starting within N minutes (run from cron)'
+        )
+
+    def handle(self, *args, **options):
+        purged = purge_unopened_attempts()
+        if purged:
+            self.stdout.write(f"Deleted {purged} pre-created attempts that were never opened.")
+
+        try:
+            check_shared_cache()
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+
+        if options['slug']:
+            try:
+                tests = [MockTestAttributes.objects.select_related('item').get(item__slug=options['slug'])]
+            except MockTestAttributes.DoesNotExist:
+                raise CommandError(f"No mock test with slug '{options['slug']}'")
+        else:
+            tests = list(tests_starting_within(options['minutes']))
+
+        if not tests:
+            self.stdout.write("No scheduled tests to pre-warm.")
+            return
+
+        for test in tests:
+            stats = prewarm_test(test)
+            self.stdout.write(
+                f"{test.item.title}: paper x{stats['languages']} languages, "
+                f"{stats['enrolled']} enrolled, {stats['attempts_created']} attempts pre-created"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Pre-warmed {len(tests)} tests.'))
@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from mocktests.submissions import claim_jobs, process_job, worker_name
+
+
+def _run_job(job_id):
+    # Each pool thread has its own DB connection; release it when done
+    try:
+        return process_job(job_id)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Drains the SubmissionJob queue: grades submitted attempts and updates the leaderboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Jobs graded in parallel')
+        parser.add_argument('--batch-size', type=int, default=50, help='Jobs claimed per round')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new jobs')
+        parser.add_argument('--idle-sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        concurrency = max(1, options['concurrency'])
+        self.stdout.write(f"Submission worker {worker} started (concurrency={concurrency})")
+
+        # concurrency=1 grades in this thread (no pool, same DB connection)
+        pool = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+        run = (lambda ids: pool.map(_run_job, ids)) if pool else (lambda ids: map(process_job, ids))
+
+        done = failed = 0
+        try:
+            while True:
+                close_old_connections()
+                job_ids = claim_jobs(options['batch_size'], worker=worker)
+
+                if not job_ids:
+                    if not options['loop']:
+                        break
+                    time.sleep(options['idle_sleep'])
+                    continue
+
+                for status in run(job_ids):
+                    if status == 'DONE':
+                        done += 1
+                    else:
+                        failed += 1
+                self.stdout.write(f"Processed {len(job_ids)} jobs (done={done}, not done={failed})")
+        finally:
+            if pool:
+                pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f'Submission queue drained: {done} graded, {failed} retried/failed.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from mocktests import audio_uploads
+
+
+class Command(BaseCommand):
+    help = 'Removes chunked audio upload sessions that were abandoned before completion'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age', type=int, default=audio_uploads.SESSION_TTL,
+            help='Seconds since the last chunk after which a session is abandoned'
+        )
+
+    def handle(self, *args, **options):
+        removed = audio_uploads.purge_stale(options['max_age'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} abandoned audio uploads.'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from mocktests import dedup
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the near-duplicate signature index of every question'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Questions per chunk')
+
+    def handle(self, *args, **options):
+        indexed = dedup.rebuild_index(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} questions.'))
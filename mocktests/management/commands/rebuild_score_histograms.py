@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from mocktests import percentiles
+from mocktests.models import MockTestAttributes
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the per-test score histograms used for result percentiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slug', help='Only this test (marketplace item slug)')
+
+    def handle(self, *args, **options):
+        tests = MockTestAttributes.objects.select_related('item').order_by('pk')
+        if options['slug']:
+            tests = tests.filter(item__slug=options['slug'])
+            if not tests.exists():
+                raise CommandError(f"No mock test with slug '{options['slug']}'")
+
+        for test in tests:
+            hist = percentiles.rebuild(test)
+            self.stdout.write(f"{test.item.slug}: {hist.total} candidates in {len(hist.counts)} bins")
+        self.stdout.write(self.style.SUCCESS('Score histograms rebuilt.'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from mocktests.models import QuestionReport, TestQuestion
+from mocktests.regrade import regrade_questions
+
+
+class Command(BaseCommand):
+    help = 'Re-grades submitted answers to questions whose answer key was corrected'
+
+    def add_arguments(self, parser):
+        parser.add_argument('question_ids', nargs='*', type=int, help='Questions to re-grade')
+        parser.add_argument('--reported', action='store_true', help='Every question with an unresolved QuestionReport')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the answers that would change')
+
+    def handle(self, *args, **options):
+        question_ids = set(options['question_ids'])
+        if options['reported']:
+            question_ids |= set(QuestionReport.objects.filter(is_resolved=False).values_list('question_id', flat=True))
+        if not question_ids:
+            raise CommandError('Give question ids or --reported')
+        missing = question_ids - set(TestQuestion.objects.filter(id__in=question_ids).values_list('id', flat=True))
+        if missing:
+            raise CommandError(f"No question with id {', '.join(map(str, sorted(missing)))}")
+
+        summary = regrade_questions(question_ids, dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(f"{summary['answers']} answers would change.")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-graded {len(question_ids)} questions: {summary['answers']} answers, "
+            f"{summary['attempts']} attempt scores, {summary['users']} leaderboard entries changed."
+        ))
@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from mocktests.essay_scoring import get_scorer, score_batch
+from mocktests.models import EssayScoringJob
+from mocktests.submissions import claim_jobs, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Drains the EssayScoringJob queue: scores essays in batches and re-totals their attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, help="Batches scored in parallel (default: the scorer's limit)")
+        parser.add_argument('--batch-size', type=int, help="Essays per scorer call (default: the scorer's limit)")
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new jobs')
+        parser.add_argument('--idle-sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        scorer = get_scorer()
+        worker = worker_name()
+        # Never exceed what the scorer allows, so a cohort submitting at once queues instead of piling on
+        concurrency = max(1, min(options['concurrency'] or scorer.max_concurrency, scorer.max_concurrency))
+        batch_size = max(1, min(options['batch_size'] or scorer.batch_size, scorer.batch_size))
+        self.stdout.write(
+            f"Essay worker {worker} started (scorer={scorer.name}, concurrency={concurrency}, batch={batch_size})"
+        )
+
+        def run_batch(job_ids):
+            # Each pool thread has its own DB connection; release it when done
+            try:
+                return score_batch(job_ids, scorer)
+            finally:
+                connections.close_all()
+
+        pool = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+        run = (lambda batches: pool.map(run_batch, batches)) if pool else (lambda batches: (score_batch(b, scorer) for b in batches))
+
+        scored = failed = 0
+        try:
+            while True:
+                close_old_connections()
+                job_ids = claim_jobs(batch_size * concurrency, worker=worker, model=EssayScoringJob)
+
+                if not job_ids:
+                    if not options['loop']:
+                        break
+                    time.sleep(options['idle_sleep'])
+                    continue
+
+                batches = [job_ids[i:i + batch_size] for i in range(0, len(job_ids), batch_size)]
+                for batch, status in zip(batches, run(batches)):
+                    if status == EssayScoringJob.Status.DONE:
+                        scored += len(batch)
+                    else:
+                        failed += len(batch)
+                self.stdout.write(f"Processed {len(job_ids)} essays (scored={scored}, not scored={failed})")
+        finally:
+            if pool:
+                pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f'Essay queue drained: {scored} scored, {failed} retried/failed.'))
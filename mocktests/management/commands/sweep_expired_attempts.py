@@ -0,0 +1,33 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from mocktests.submissions import SWEEP_GRACE, retry_stalled, sweep_expired
+
+
+class Command(BaseCommand):
+    help = (
+        'Auto-submits and grades IN_PROGRESS attempts whose timer expired, and retries attempts '
+        'stuck in GRADING (safe to run on several nodes)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=int(SWEEP_GRACE.total_seconds()),
+            help='Seconds after the deadline before an attempt is swept'
+        )
+        parser.add_argument('--batch-size', type=int, default=100, help='Attempts closed per transaction')
+        parser.add_argument('--loop', type=int, default=0, help='Keep running, sweeping every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            swept = sweep_expired(timedelta(seconds=options['grace']), options['batch_size'])
+            self.stdout.write(f"Auto-submitted {swept} expired attempts.")
+            retried = retry_stalled(options['batch_size'])
+            self.stdout.write(f"Retried grading of {retried} stalled attempts.")
+
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
+
+        self.stdout.write(self.style.SUCCESS('Sweep complete.'))
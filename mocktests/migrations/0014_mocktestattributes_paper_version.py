@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mocktests', '0013_testsyllabus_testeligibility'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mocktestattributes',
+            name='paper_version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:15
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mocktests', '0015_submissionjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usertestattempt',
+            name='started_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, null=True),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:16
+
+from django.db import migrations, models
+
+
+def backfill_sat_roles(apps, schema_editor):
+    """One-time classification of existing SAT sections ("Math: Module 2" etc.)."""
+    TestSection = apps.get_model('mocktests', 'TestSection')
+    sat_sections = TestSection.objects.filter(test__exam_type__in=['SAT_ADAPTIVE', 'SAT_NON_ADAPTIVE'])
+    for section in sat_sections:
+        title = section.title.lower()
+        if 'math' in title:
+            section.subject = 'MATH'
+        elif 'reading' in title or 'writing' in title:
+            section.subject = 'RW'
+        if 'module 1' in title:
+            section.module = 'M1'
+        elif 'module 2' in title:
+            section.module = 'M2'
+        section.save(update_fields=['subject', 'module'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mocktests', '0016_usertestattempt_started_at_nullable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mocktestattributes',
+            name='score_tables',
+            field=models.JSONField(blank=True, default=dict, help_text='Raw-to-scaled score tables per subject and module-2 path'),
+        ),
+        migrations.AddField(
+            model_name='testsection',
+            name='module',
+            field=models.CharField(blank=True, choices=[('', 'Standard'), ('M1', 'Module 1'), ('M2', 'Module 2'), ('M2_EASY', 'Module 2 (Easy)'), ('M2_HARD', 'Module 2 (Hard)')], default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='testsection',
+            name='subject',
+            field=models.CharField(blank=True, choices=[('', 'None'), ('RW', 'Reading & Writing'), ('MATH', 'Math')], default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='usertestattempt',
+            name='module_routing',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(backfill_sat_roles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mocktests', '0017_sat_section_roles'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userrankmetric',
+            name='avg_score',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=7),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mocktests', '0018_userrankmetric_avg_score_digits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttemptResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('paper_version', models.PositiveIntegerField()),
+                ('total_questions', models.PositiveIntegerField(default=0)),
+                ('total_marks', models.PositiveIntegerField(default=0)),
+                ('correct_count', models.PositiveIntegerField(default=0)),
+                ('incorrect_count', models.PositiveIntegerField(default=0)),
+                ('skipped_count', models.PositiveIntegerField(default=0)),
+                ('accuracy', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('time_taken_seconds', models.PositiveIntegerField(blank=True, null=True)),
+                ('sections', models.JSONField(blank=True, default=list)),
+                ('score_details', models.JSONField(blank=True, default=dict)),
+                ('question_ids', models.JSONField(blank=True, default=list)),
+                ('question_status', models.TextField(blank=True)),
+                ('responses', models.JSONField(blank=True, default=dict)),
+                ('attempt', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='result', to='mocktests.usertestattempt')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
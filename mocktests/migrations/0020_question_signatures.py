@@ -0,0 +1,30 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mocktests', '0019_attemptresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionSignatureBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.BigIntegerField(db_index=True)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signature_bands', to='mocktests.testquestion')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuestionSignature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minhash', models.BinaryField()),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='signature', to='mocktests.testquestion')),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mocktests', '0021_questionstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attemptresult',
+            name='question_times',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='attemptresult',
+            name='tab_switches',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='AttemptEventLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('attempt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_logs', to='mocktests.usertestattempt')),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mocktests', '0022_attempt_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreHistogram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin', models.FloatField(default=0)),
+                ('bin_width', models.FloatField(default=1)),
+                ('counts', models.JSONField(blank=True, default=list)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('test', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='score_histogram', to='mocktests.mocktestattributes')),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mocktests', '0023_scorehistogram'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usertestattempt',
+            index=models.Index(fields=['status', 'test', 'started_at'], name='mocktests_u_status_8c51c7_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mocktests', '0024_attempt_sweep_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usertestattempt',
+            index=models.Index(fields=['user', 'test', 'status'], name='mocktests_u_user_id_9fc3b9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usertestattempt',
+            index=models.Index(fields=['test', 'status', 'score'], name='mocktests_u_test_id_873cce_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mocktests', '0025_attempt_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EssayScoringJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=10)),
+                ('tries', models.PositiveSmallIntegerField(default=0)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('last_error', models.TextField(blank=True)),
+                ('scorer', models.CharField(blank=True, max_length=50)),
+                ('details', models.JSONField(blank=True, default=dict)),
+                ('answer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='essay_job', to='mocktests.useranswer')),
+                ('attempt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='essay_jobs', to='mocktests.usertestattempt')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created'], name='mocktests_e_status_6331a0_idx')],
+            },
+        ),
+    ]
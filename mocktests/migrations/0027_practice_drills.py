@@ -0,0 +1,38 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('mocktests', '0026_essay_scoring_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PracticeDrill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('exam_type', models.CharField(choices=[('GENERAL', 'General Mock Test'), ('SAT_ADAPTIVE', 'Digital SAT (Adaptive)'), ('SAT_NON_ADAPTIVE', 'Digital SAT (Non-Adaptive)'), ('IELTS', 'IELTS Academic/General'), ('JEE_MAINS', 'JEE Mains'), ('JEE_ADVANCED', 'JEE Advanced')], max_length=20)),
+                ('topic', models.CharField(max_length=255)),
+                ('difficulty', models.CharField(blank=True, choices=[('EASY', 'Easy'), ('MEDIUM', 'Medium'), ('HARD', 'Hard')], max_length=10)),
+                ('question_ids', models.BinaryField()),
+                ('selected', models.BinaryField(default=b'')),
+                ('correct', models.BinaryField(default=b'')),
+                ('score', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='practice_drills', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
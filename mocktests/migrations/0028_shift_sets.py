@@ -0,0 +1,27 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mocktests', '0027_practice_drills'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShiftSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('slug', models.SlugField(max_length=255, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='mocktestattributes',
+            name='shift_set',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shifts', to='mocktests.shiftset'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mocktests', '0028_shift_sets'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='testsection',
+            name='subject',
+            field=models.CharField(blank=True, choices=[('', 'None'), ('RW', 'Reading & Writing'), ('MATH', 'Math'), ('LISTENING', 'Listening'), ('READING', 'Reading'), ('WRITING', 'Writing'), ('SPEAKING', 'Speaking')], default='', max_length=10),
+        ),
+    ]
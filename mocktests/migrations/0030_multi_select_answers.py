@@ -0,0 +1,23 @@
+# Generated by Django 4.2.26 on 2026-10-17 03:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mocktests', '0029_ielts_section_subjects'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useranswer',
+            name='selected_mask',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='testquestion',
+            name='question_type',
+            field=models.CharField(choices=[('MCQ', 'Multiple Choice'), ('MULTI', 'Multiple Correct'), ('NUMERIC', 'Numeric Input'), ('ESSAY', 'Essay / Long Answer')], default='MCQ', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-17 04:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mocktests', '0030_multi_select_answers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='testquestion',
+            name='question_type',
+            field=models.CharField(choices=[('MCQ', 'Multiple Choice'), ('MULTI', 'Multiple Correct'), ('NUMERIC', 'Numeric Input'), ('ESSAY', 'Essay / Long Answer'), ('SPEAKING', 'Speaking (Audio Answer)')], default='MCQ', max_length=20),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.26 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+def backfill_mask_bits(apps, schema_editor):
+    """Existing masks count options in id order; freeze that order as each option's bit."""
+    QuestionOption = apps.get_model('mocktests', 'QuestionOption')
+    bits = {}
+    options = []
+    for option in QuestionOption.objects.order_by('question_id', 'id').only('id', 'question_id'):
+        option.mask_bit = bits.get(option.question_id, 0)
+        bits[option.question_id] = option.mask_bit + 1
+        options.append(option)
+    QuestionOption.objects.bulk_update(options, ['mask_bit'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mocktests', '0031_speaking_question_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionoption',
+            name='mask_bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_mask_bits, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='questionoption',
+            name='mask_bit',
+            field=models.PositiveSmallIntegerField(editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='questionoption',
+            constraint=models.UniqueConstraint(fields=('question', 'mask_bit'), name='unique_option_mask_bit'),
+        ),
+    ]
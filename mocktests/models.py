@@ -2,6 +2,7 @@
 
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from model_utils.models import TimeStampedModel
 from marketplace.models import MarketplaceItem
@@ -10,6 +11,18 @@ from marketplace.models import MarketplaceItem
 # 1. Content Structure
 # ==========================================
 
+class ShiftSet(models.Model):
+    """
+    Shifts of one exam session (e.g. JEE Main January): same syllabus, one
+    MockTestAttributes per shift. Percentiles are normalized across the set
+    (see normalization.py).
+    """
+    name = models.CharField(max_length=255)
+    slug = models.SlugField(unique=True, max_length=255)
+
+    def __str__(self):
+        return self.name
+
 class MockTestAttributes(TimeStampedModel):
     """
     Specific details for a Mock Test product.
@@ -53,6 +66,17 @@ class MockTestAttributes(TimeStampedModel):
     start_datetime = models.DateTimeField(null=True, blank=True, help_text=_("When this test opens"))
     end_datetime = models.DateTimeField(null=True, blank=True, help_text=_("When this test closes"))
 
+    # Bumped whenever sections/questions/options change; keys the cached paper (see paper.py)
+    paper_version = models.PositiveIntegerField(default=1, editable=False)
+
+    # Per-form raw -> scaled conversion (SAT). e.g.
+    # {"RW": {"threshold": 15, "M2_EASY": [200, 210, ...], "M2_HARD": [...], "STANDARD": [...]}}
+    # IELTS forms pick a band table instead: {"band_version": "2024", "reading": "GENERAL"}
+    score_tables = models.JSONField(default=dict, blank=True, help_text=_("Raw-to-scaled score tables per subject and module-2 path"))
+
+    # Multi-shift exams (JEE Main): percentiles are normalized across the shifts of the set
+    shift_set = models.ForeignKey(ShiftSet, on_delete=models.SET_NULL, null=True, blank=True, related_name='shifts')
+
     def __str__(self):
         return f"Details for: {self.item.title}"
 
@@ -66,6 +90,27 @@ class TestSection(models.Model):
     section_duration = models.IntegerField(null=True, help_text="Time limit for this section in minutes")
     is_mandatory = models.BooleanField(default=True)
 
+    # Structured role of the section in multi-module exams (Digital SAT, IELTS)
+    class Subject(models.TextChoices):
+        NONE = '', _('None')
+        READING_WRITING = 'RW', _('Reading & Writing')
+        MATH = 'MATH', _('Math')
+        # IELTS components (see bands.py)
+        LISTENING = 'LISTENING', _('Listening')
+        READING = 'READING', _('Reading')
+        WRITING = 'WRITING', _('Writing')
+        SPEAKING = 'SPEAKING', _('Speaking')
+
+    class Module(models.TextChoices):
+        STANDARD = '', _('Standard')
+        MODULE_1 = 'M1', _('Module 1')
+        MODULE_2 = 'M2', _('Module 2')
+        MODULE_2_EASY = 'M2_EASY', _('Module 2 (Easy)')
+        MODULE_2_HARD = 'M2_HARD', _('Module 2 (Hard)')
+
+    subject = models.CharField(max_length=10, choices=Subject.choices, default=Subject.NONE, blank=True)
+    module = models.CharField(max_length=10, choices=Module.choices, default=Module.STANDARD, blank=True)
+
     class Meta:
         ordering = ['sort_order']
 
@@ -112,8 +157,10 @@ class ComprehensionPassage(models.Model):
 class TestQuestion(models.Model):
     class QuestionType(models.TextChoices):
         MCQ = 'MCQ', _('Multiple Choice')
+        MULTI = 'MULTI', _('Multiple Correct')  # JEE Advanced partial marking (see grading.py)
         NUMERIC = 'NUMERIC', _('Numeric Input')
         ESSAY = 'ESSAY', _('Essay / Long Answer') # Added for IELTS/TOEFL/CBSE
+        SPEAKING = 'SPEAKING', _('Speaking (Audio Answer)')  # Recorded in the exam UI, marked by an examiner
 
     section = models.ForeignKey(TestSection, on_delete=models.CASCADE, related_name='questions')
     DIFFICULTY_CHOICES = [('EASY', 'Easy'), ('MEDIUM', 'Medium'), ('HARD', 'Hard')]
@@ -173,10 +220,78 @@ class QuestionOption(models.Model):
     option_text = models.CharField(_("Option Text"), max_length=500)
     is_correct = models.BooleanField(default=False)
     option_image = models.ImageField(upload_to='options/images/', null=True, blank=True)
+    # Bit of this option in UserAnswer.selected_mask, fixed at creation so that
+    # deleting another option never changes what a stored mask means
+    mask_bit = models.PositiveSmallIntegerField(editable=False)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['question', 'mask_bit'], name='unique_option_mask_bit')]
+
+    def save(self, *args, **kwargs):
+        if self.mask_bit is None:
+            self.mask_bit = self.free_mask_bit(self.question_id)
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def free_mask_bit(question_id):
+        """Lowest bit neither held by an option of the question nor set in a stored answer to it."""
+        used = 0
+        for bit in QuestionOption.objects.filter(question_id=question_id).values_list('mask_bit', flat=True):
+            used |= 1 << bit
+        for mask in UserAnswer.objects.filter(question_id=question_id, selected_mask__gt=0).values_list('selected_mask', flat=True).distinct():
+            used |= mask
+        return (~used & (used + 1)).bit_length() - 1
 
     def __str__(self):
         return self.option_text
 
+class QuestionStats(models.Model):
+    """
+    Classical item analysis of a question over the submitted attempts of its test.
+    Rebuilt nightly by `manage.py compute_item_stats` (see item_analysis.py).
+    """
+    question = models.OneToOneField(TestQuestion, on_delete=models.CASCADE, related_name='stats')
+    attempts = models.PositiveIntegerField(default=0)
+    answered = models.PositiveIntegerField(default=0)
+    # Share of attempts answering correctly (higher = easier)
+    p_value = models.FloatField(null=True, blank=True)
+    # Point-biserial of correctness against the rest of the test score
+    discrimination = models.FloatField(null=True, blank=True)
+    # option_id -> {'count', 'rate', 'discrimination'}
+    options = models.JSONField(default=dict, blank=True)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Stats Q{self.question_id}"
+
+    @property
+    def omit_rate(self):
+        return 1 - self.answered / self.attempts if self.attempts else None
+
+    @property
+    def suggested_difficulty(self):
+        if self.p_value is None:
+            return None
+        if self.p_value >= 0.7:
+            return 'EASY'
+        return 'HARD' if self.p_value < 0.3 else 'MEDIUM'
+
+class QuestionSignature(models.Model):
+    """
+    MinHash signature of a question's text and options (see dedup.py),
+    kept in step with the question by signals.
+    """
+    question = models.OneToOneField(TestQuestion, on_delete=models.CASCADE, related_name='signature')
+    minhash = models.BinaryField()
+
+    def __str__(self):
+        return f"Signature Q{self.question_id}"
+
+class QuestionSignatureBand(models.Model):
+    """One LSH band hash of a signature; questions sharing a band are duplicate candidates."""
+    question = models.ForeignKey(TestQuestion, on_delete=models.CASCADE, related_name='signature_bands')
+    band = models.BigIntegerField(db_index=True)
+
 # ==========================================
 # 2. User Progress & Results
 # ==========================================
@@ -187,6 +302,7 @@ class UserTestAttempt(TimeStampedModel):
     """
     class Status(models.TextChoices):
         IN_PROGRESS = 'IN_PROGRESS', _('In Progress')
+        GRADING = 'GRADING', _('Grading')  # Submitted, waiting for the submission worker
         SUBMITTED = 'SUBMITTED', _('Submitted')
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='test_attempts')
@@ -198,9 +314,23 @@ class UserTestAttempt(TimeStampedModel):
     score = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
     is_passed = models.BooleanField(default=False)
     
-    started_at = models.DateTimeField(auto_now_add=True)
+    # Null for attempts pre-created by `prewarm_test`; set when the candidate opens the exam
+    started_at = models.DateTimeField(default=timezone.now, null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    # Adaptive exams: subject -> id of the module-2 section chosen after module 1
+    module_routing = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [
+            # Expired-attempt sweep (submissions.sweep_expired)
+            models.Index(fields=['status', 'test', 'started_at']),
+            # A candidate's attempts at a test (take_test, dashboard, leaderboard)
+            models.Index(fields=['user', 'test', 'status']),
+            # Per-test leaderboard and quick stats
+            models.Index(fields=['test', 'status', 'score']),
+        ]
+
     def __str__(self):
         return f"{self.user} - {self.test.item.title}"
 
@@ -210,6 +340,8 @@ class UserAnswer(TimeStampedModel):
     
     # 1. MCQ Answer
     selected_option = models.ForeignKey(QuestionOption, on_delete=models.SET_NULL, null=True, blank=True)
+    # MULTI answers: the QuestionOption.mask_bit of every selected option
+    selected_mask = models.PositiveIntegerField(default=0)
     audio_answer = models.FileField(upload_to='answers/audio/', null=True, blank=True)
     # 2. Numeric Answer (JEE)
     numeric_answer = models.CharField(max_length=255, null=True, blank=True)
@@ -226,6 +358,114 @@ class UserAnswer(TimeStampedModel):
     class Meta:
         unique_together = ('attempt', 'question')
 
+class SubmissionJob(TimeStampedModel):
+    """
+    Durable queue entry for grading a submitted attempt.
+    submit_test only enqueues; `manage.py process_submissions` drains the queue.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', _('Pending')
+        RUNNING = 'RUNNING', _('Running')
+        DONE = 'DONE', _('Done')
+        FAILED = 'FAILED', _('Failed')
+
+    attempt = models.OneToOneField(UserTestAttempt, on_delete=models.CASCADE, related_name='submission_job')
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    tries = models.PositiveSmallIntegerField(default=0)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created'])]
+
+    def __str__(self):
+        return f"Job {self.attempt_id} ({self.status})"
+
+class EssayScoringJob(TimeStampedModel):
+    """
+    Queue entry for scoring one ESSAY answer of a graded attempt.
+    Enqueued by finalize_attempt, drained in batches by `manage.py score_essays`.
+    """
+    Status = SubmissionJob.Status
+
+    answer = models.OneToOneField(UserAnswer, on_delete=models.CASCADE, related_name='essay_job')
+    attempt = models.ForeignKey(UserTestAttempt, on_delete=models.CASCADE, related_name='essay_jobs')
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    tries = models.PositiveSmallIntegerField(default=0)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    # Scorer name and its breakdown, e.g. {'band': 6.5, 'criteria': {...}}
+    scorer = models.CharField(max_length=50, blank=True)
+    details = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created'])]
+
+    def __str__(self):
+        return f"Essay job {self.answer_id} ({self.status})"
+
+class AttemptEventLog(models.Model):
+    """
+    Append-only chunk of an attempt's client events (focus/blur, tab visibility,
+    review toggles), packed as attempt_events.EVENT_DTYPE records.
+    """
+    attempt = models.ForeignKey(UserTestAttempt, on_delete=models.CASCADE, related_name='event_logs')
+    data = models.BinaryField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Events {self.attempt_id} @ {self.created}"
+
+class AttemptResult(TimeStampedModel):
+    """
+    Result summary materialized once when an attempt is graded.
+    test_result renders from this plus the cached paper instead of re-deriving it.
+    """
+    # One character per question, aligned with question_ids
+    STATUS_CORRECT = 'C'
+    STATUS_WRONG = 'W'
+    STATUS_SKIPPED = 'S'
+
+    attempt = models.OneToOneField(UserTestAttempt, on_delete=models.CASCADE, related_name='result')
+    paper_version = models.PositiveIntegerField()
+
+    total_questions = models.PositiveIntegerField(default=0)
+    total_marks = models.PositiveIntegerField(default=0)
+    correct_count = models.PositiveIntegerField(default=0)
+    incorrect_count = models.PositiveIntegerField(default=0)
+    skipped_count = models.PositiveIntegerField(default=0)
+    accuracy = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    time_taken_seconds = models.PositiveIntegerField(null=True, blank=True)
+
+    # [{'section_id', 'title', 'total', 'correct', 'incorrect', 'skipped', 'score'}]
+    sections = models.JSONField(default=list, blank=True)
+    # Strategy-specific breakdown (e.g. SAT {'rw': 650, 'math': 700})
+    score_details = models.JSONField(default=dict, blank=True)
+
+    question_ids = models.JSONField(default=list, blank=True)
+    question_status = models.TextField(blank=True)
+    # question_id -> [selected_option_id, text_answer(, selected_mask)] for answered questions
+    responses = models.JSONField(default=dict, blank=True)
+    # question_id -> seconds spent, from the attempt's event log (attempt_events.py)
+    question_times = models.JSONField(default=dict, blank=True)
+    tab_switches = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Result {self.attempt_id}"
+
+    @property
+    def time_taken(self):
+        if self.time_taken_seconds is None:
+            return "N/A"
+        hours, remainder = divmod(self.time_taken_seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        return f"{hours:02}:{minutes:02}:{seconds:02}"
+
+    def status_map(self):
+        return dict(zip(self.question_ids, self.question_status))
+
 # ==========================================
 # 3. Global Ranking Engine
 # ==========================================
@@ -239,11 +479,50 @@ class UserRankMetric(TimeStampedModel):
     
     total_xp = models.IntegerField(default=0, db_index=True) # Indexed for fast sorting
     tests_taken_count = models.PositiveIntegerField(default=0)
-    avg_score = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
+    avg_score = models.DecimalField(max_digits=7, decimal_places=2, default=0.00)  # SAT scores reach 1600
     
     def __str__(self):
         return f"{self.user} - XP: {self.total_xp}"
     
+class ScoreHistogram(models.Model):
+    """
+    Fixed-width histogram of the latest submitted score of every candidate of a
+    test, for O(bins) percentiles (see percentiles.py). Bin i counts scores in
+    [origin + i * bin_width, origin + (i + 1) * bin_width).
+    """
+    test = models.OneToOneField(MockTestAttributes, on_delete=models.CASCADE, related_name='score_histogram')
+    origin = models.FloatField(default=0)
+    bin_width = models.FloatField(default=1)
+    counts = models.JSONField(default=list, blank=True)
+    total = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Histogram {self.test_id} ({self.total} scores)"
+
+class PracticeDrill(TimeStampedModel):
+    """
+    A short practice drill of MCQs drawn from the question bank (see drills.py).
+    One row per drill: question ids, chosen options and correctness are packed
+    arrays instead of UserTestAttempt/UserAnswer rows.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='practice_drills')
+    exam_type = models.CharField(max_length=20, choices=MockTestAttributes.EXAM_TYPES)
+    topic = models.CharField(max_length=255)
+    # Blank: any difficulty
+    difficulty = models.CharField(max_length=10, choices=TestQuestion.DIFFICULTY_CHOICES, blank=True)
+
+    # int64 question ids in drill order; int64 selected option id per question (0 = skipped)
+    question_ids = models.BinaryField()
+    selected = models.BinaryField(default=b'')
+    # np.packbits of the per-question correct flags
+    correct = models.BinaryField(default=b'')
+    score = models.PositiveSmallIntegerField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Drill {self.user} - {self.topic} ({self.exam_type})"
+
 class QuestionReport(TimeStampedModel):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     question = models.ForeignKey(TestQuestion, on_delete=models.CASCADE)
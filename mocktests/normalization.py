@@ -0,0 +1,119 @@
+"""
+NTA-style normalization across the shifts of a ShiftSet (JEE Main).
+
+Each shift is its own test, and a candidate's NTA percentile is computed within
+their shift only:
+
+    P = 100 * (candidates of the shift scoring <= the candidate) / (candidates of the shift)
+
+rounded to 7 decimals. Percentiles are then comparable across shifts, and the
+predicted rank is 1 + the number of candidates of the whole set with a higher
+percentile.
+
+The populations are the per-test ScoreHistograms (latest submitted score per
+candidate, kept current by grading; exact for whole-mark scores at the JEE bin
+width of 1). A NormalizationTable holds, per shift, the cumulative share at
+each bin and, for the set, all (percentile, count) pairs sorted, so a lookup
+is a bin index plus one binary search. Tables are memoized per process and
+refreshed shift by shift when a histogram changes.
+"""
+import threading
+
+import numpy as np
+
+from .models import ScoreHistogram
+from .percentiles import _bin
+
+PRECISION = 7
+
+# shift_set_id -> (stamps {test_id: updated_at}, NormalizationTable)
+_TABLES = {}
+_lock = threading.Lock()
+
+
+class ShiftTable:
+    """NTA percentile at every bin of one shift's histogram."""
+
+    def __init__(self, hist):
+        counts = np.asarray(hist.counts, dtype=np.int64)
+        self.hist = hist
+        self.total = int(counts.sum())
+        self.counts = counts
+        self.percentiles = np.round(100.0 * np.cumsum(counts) / self.total, PRECISION) if self.total else np.zeros(0)
+
+    def percentile(self, score):
+        if not self.total:
+            return None
+        idx = _bin(self.hist, score)
+        if idx < 0:
+            return 0.0
+        return float(self.percentiles[min(idx, len(self.percentiles) - 1)])
+
+
+class NormalizationTable:
+    def __init__(self, shifts):
+        self.shifts = shifts
+        occupied = [(t.percentiles[t.counts > 0], t.counts[t.counts > 0]) for t in shifts.values() if t.total]
+        if occupied:
+            percentiles = np.concatenate([p for p, _ in occupied])
+            counts = np.concatenate([c for _, c in occupied])
+        else:
+            percentiles, counts = np.zeros(0), np.zeros(0, dtype=np.int64)
+        order = np.argsort(percentiles, kind='stable')
+        self.sorted_percentiles = percentiles[order]
+        # Candidates at or below each sorted percentile
+        self.at_or_below = np.cumsum(counts[order])
+        self.candidates = int(self.at_or_below[-1]) if len(self.at_or_below) else 0
+
+    def percentile(self, test_id, score):
+        shift = self.shifts.get(test_id)
+        return shift.percentile(score) if shift else None
+
+    def predicted_rank(self, percentile):
+        """1 + candidates of the whole set with a strictly higher percentile."""
+        idx = np.searchsorted(self.sorted_percentiles, percentile, side='right')
+        at_or_below = int(self.at_or_below[idx - 1]) if idx else 0
+        return self.candidates - at_or_below + 1
+
+
+def get_table(shift_set_id):
+    """The set's NormalizationTable, rebuilding only the shifts whose histogram changed."""
+    stamps = dict(ScoreHistogram.objects.filter(test__shift_set_id=shift_set_id).values_list('test_id', 'updated_at'))
+    with _lock:
+        cached = _TABLES.get(shift_set_id)
+    if cached and cached[0] == stamps:
+        return cached[1]
+
+    shifts = {}
+    if cached:
+        shifts = {test_id: table for test_id, table in cached[1].shifts.items() if cached[0].get(test_id) == stamps.get(test_id)}
+    stale = [test_id for test_id in stamps if test_id not in shifts]
+    for hist in ScoreHistogram.objects.filter(test_id__in=stale):
+        shifts[hist.test_id] = ShiftTable(hist)
+
+    table = NormalizationTable(shifts)
+    with _lock:
+        _TABLES[shift_set_id] = (stamps, table)
+    return table
+
+
+def clear_tables():
+    with _lock:
+        _TABLES.clear()
+
+
+def normalized_standing(attempt):
+    """{'percentile', 'rank', 'candidates', 'shifts'} of a graded attempt in its shift set, or None."""
+    test = attempt.test
+    if not test.shift_set_id or attempt.score is None:
+        return None
+    table = get_table(test.shift_set_id)
+    percentile = table.percentile(test.pk, attempt.score)
+    if percentile is None:
+        return None
+    return {
+        'percentile': percentile,
+        'rank': table.predicted_rank(percentile),
+        'candidates': table.candidates,
+        'shifts': len(table.shifts),
+    }
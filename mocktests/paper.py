@@ -0,0 +1,169 @@
+"""
+Precompiled exam papers.
+
+A paper is a plain-dict snapshot of one MockTestAttributes in one language:
+sections -> questions -> options/images/audios/passage, with media resolved to
+URLs. It is built once per (test, paper_version, language) and cached, so
+take_test and test_result never walk the ORM graph per request.
+
+MockTestAttributes.paper_version is bumped by signals (see signals.py) whenever
+admins edit any part of the paper, which retires every cached copy at once.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import F, Prefetch
+from django.utils import translation
+
+from .models import MockTestAttributes, QuestionOption, TestSection, TestQuestion
+
+PAPER_CACHE_TIMEOUT = 24 * 3600
+# Bump when the snapshot layout changes so old cached papers are ignored
+PAPER_FORMAT = 4
+
+
+def _file_url(field):
+    return field.url if field else None
+
+
+def paper_cache_key(test_id, version, language):
+    return f"paper:f{PAPER_FORMAT}:{test_id}:v{version}:{language}"
+
+
+def build_paper(test):
+    """Walks the ORM graph once and returns the serialized paper (current language)."""
+    sections = TestSection.objects.filter(test=test).prefetch_related(
+        'passages',
+        Prefetch(
+            'questions',
+            queryset=TestQuestion.objects.order_by('sort_order').select_related('passage').prefetch_related(
+                Prefetch('options', queryset=QuestionOption.objects.order_by('id')), 'images', 'audios'
+            )
+        ),
+    ).order_by('sort_order')
+
+    paper_sections = []
+    question_count = 0
+    total_marks = 0
+    for section in sections:
+        questions = []
+        for q in section.questions.all():
+            passage = None
+            if q.passage_id:
+                passage = {
+                    'id': q.passage_id,
+                    'content': q.passage.content,
+                    'image_url': _file_url(q.passage.image),
+                }
+            questions.append({
+                'id': q.id,
+                'section_id': section.id,
+                'question_text': q.question_text,
+                'explanation': q.explanation,
+                'question_type': q.question_type,
+                'correct_answer_value': q.correct_answer_value,
+                'difficulty': q.difficulty,
+                'marks': q.marks,
+                'sort_order': q.sort_order,
+                'passage': passage,
+                'images': [{'url': _file_url(m.image), 'caption': m.caption} for m in q.images.all()],
+                'audios': [{'url': _file_url(a.audio_file), 'label': a.label} for a in q.audios.all()],
+                'options': [
+                    {
+                        'id': o.id,
+                        'bit': o.mask_bit,
+                        'option_text': o.option_text,
+                        'is_correct': o.is_correct,
+                        'image_url': _file_url(o.option_image),
+                    }
+                    for o in q.options.all()
+                ],
+            })
+            total_marks += q.marks
+
+        question_count += len(questions)
+        paper_sections.append({
+            'id': section.id,
+            'title': section.title,
+            'sort_order': section.sort_order,
+            'section_duration': section.section_duration,
+            'is_mandatory': section.is_mandatory,
+            'subject': section.subject,
+            'module': section.module,
+            'passages': [
+                {'id': p.id, 'content': p.content, 'image_url': _file_url(p.image)}
+                for p in section.passages.all()
+            ],
+            'questions': questions,
+        })
+
+    return {
+        'test_id': test.pk,
+        'version': test.paper_version,
+        'language': translation.get_language(),
+        'sections': paper_sections,
+        'question_count': question_count,
+        'total_marks': total_marks,
+    }
+
+
+def chunk_etag(paper, section_id, page, template_name):
+    """
+    Strong ETag of one rendered section chunk. Everything the chunk depends on is
+    in the key, so it only changes together with paper_version.
+    """
+    raw = f"{PAPER_FORMAT}:{paper['test_id']}:{paper['version']}:{paper['language']}:{section_id}:{page}:{template_name}"
+    return '"%s"' % hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_paper(test, language=None):
+    """Returns the cached paper for this test version, building it on a miss."""
+    language = language or translation.get_language()
+    key = paper_cache_key(test.pk, test.paper_version, language)
+    paper = cache.get(key)
+    if paper is None:
+        with translation.override(language):
+            paper = build_paper(test)
+        cache.set(key, paper, PAPER_CACHE_TIMEOUT)
+    return paper
+
+
+def build_media_manifest(paper):
+    """
+    [{'section_id', 'media': [{'url', 'as'}]}] in paper order. Within a section
+    media come in the order the candidate meets them (passage image, question
+    images, option images, audio clips), each URL once.
+    """
+    manifest = []
+    for section in paper['sections']:
+        kinds = {}
+        for q in section['questions']:
+            urls = [q['passage']['image_url']] if q['passage'] else []
+            urls += [m['url'] for m in q['images']] + [o['image_url'] for o in q['options']]
+            for url in urls:
+                kinds.setdefault(url, 'image')
+            for a in q['audios']:
+                kinds.setdefault(a['url'], 'audio')
+        media = [{'url': url, 'as': kind} for url, kind in kinds.items() if url]
+        manifest.append({'section_id': section['id'], 'media': media})
+    return manifest
+
+
+def get_media_manifest(test):
+    """The paper's media manifest, cached per test version (URLs do not depend on the language)."""
+    key = f"paper:f{PAPER_FORMAT}:{test.pk}:v{test.paper_version}:media"
+    manifest = cache.get(key)
+    if manifest is None:
+        manifest = build_media_manifest(get_paper(test))
+        cache.set(key, manifest, PAPER_CACHE_TIMEOUT)
+    return manifest
+
+
+def iter_questions(paper):
+    for section in paper['sections']:
+        yield from section['questions']
+
+
+def bump_paper_version(**filters):
+    """Retires cached papers for every test matching `filters` with one UPDATE."""
+    MockTestAttributes.objects.filter(**filters).update(paper_version=F('paper_version') + 1)
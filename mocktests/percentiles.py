@@ -0,0 +1,150 @@
+"""
+Score percentiles from per-test histograms.
+
+Each test keeps a ScoreHistogram of the latest submitted score of every
+candidate (the same population as the test leaderboard), in fixed-width bins
+sized by the exam strategy (score_bin_width). Grading moves the candidate's
+previous score out of its bin and the new one in, under a row lock, so a
+percentile is O(bins) however many attempts exist. `manage.py
+rebuild_score_histograms` recomputes the histograms from scratch.
+"""
+import math
+
+import numpy as np
+from django.db import transaction
+
+from .models import ScoreHistogram, UserTestAttempt
+from .services import get_exam_strategy
+
+# Absorbs float error when a score sits exactly on a bin edge
+_EPSILON = 1e-9
+
+
+def _bin(hist, score):
+    return math.floor((float(score) - hist.origin) / hist.bin_width + _EPSILON)
+
+
+def _add(hist, score, delta):
+    if not hist.counts:
+        hist.origin = math.floor(float(score) / hist.bin_width + _EPSILON) * hist.bin_width
+    idx = _bin(hist, score)
+    if idx < 0:
+        # Below the lowest bin so far (negative marking): grow downwards
+        hist.counts = [0] * -idx + hist.counts
+        hist.origin += idx * hist.bin_width
+        idx = 0
+    if idx >= len(hist.counts):
+        hist.counts.extend([0] * (idx + 1 - len(hist.counts)))
+    hist.counts[idx] = max(0, hist.counts[idx] + delta)
+    hist.total = sum(hist.counts)
+
+
+def record_attempt(attempt):
+    """
+    Adds a freshly graded attempt to its test's histogram, replacing the
+    candidate's previous latest score. Call after the attempt is saved SUBMITTED.
+    """
+    if attempt.score is None:
+        return
+    previous = UserTestAttempt.objects.filter(
+        user_id=attempt.user_id, test_id=attempt.test_id,
+        status=UserTestAttempt.Status.SUBMITTED, score__isnull=False,
+    ).exclude(pk=attempt.pk).order_by('-created').values_list('score', 'created').first()
+    if previous and previous[1] > attempt.created:
+        # A newer attempt already represents this candidate
+        return
+
+    width = get_exam_strategy(attempt.test.exam_type).score_bin_width
+    with transaction.atomic():
+        hist, _ = ScoreHistogram.objects.select_for_update().get_or_create(
+            test_id=attempt.test_id, defaults={'bin_width': width}
+        )
+        if previous:
+            _add(hist, previous[0], -1)
+        _add(hist, attempt.score, 1)
+        hist.save()
+
+
+def replace_score(attempt, old_score):
+    """
+    Moves a re-scored attempt (essays scored, key corrected) from the bin of
+    old_score to that of its current score. Only the candidate's latest
+    attempt is in the histogram, so older ones are left alone.
+    """
+    if attempt.score is None or old_score is None or float(old_score) == float(attempt.score):
+        return
+    if UserTestAttempt.objects.filter(
+        user_id=attempt.user_id, test_id=attempt.test_id,
+        status=UserTestAttempt.Status.SUBMITTED, score__isnull=False, created__gt=attempt.created,
+    ).exists():
+        return
+
+    move_scores(attempt.test_id, [(old_score, attempt.score)])
+
+
+def move_scores(test_id, moves):
+    """
+    Applies (old_score, new_score) moves of candidates' latest attempts to a
+    test's histogram under one row lock (bulk re-grading).
+    """
+    moves = [(old, new) for old, new in moves if old is not None and new is not None and float(old) != float(new)]
+    if not moves:
+        return
+    with transaction.atomic():
+        hist = ScoreHistogram.objects.select_for_update().filter(test_id=test_id).first()
+        if hist is None:
+            return
+        for old, new in moves:
+            _add(hist, old, -1)
+            _add(hist, new, 1)
+        hist.save()
+
+
+def rebuild(test):
+    """Recomputes a test's histogram from the latest submitted attempt of each candidate."""
+    scores = []
+    last_user = None
+    for user_id, score in UserTestAttempt.objects.filter(
+        test=test, status=UserTestAttempt.Status.SUBMITTED, score__isnull=False
+    ).order_by('user_id', '-created').values_list('user_id', 'score').iterator():
+        if user_id != last_user:
+            scores.append(float(score))
+            last_user = user_id
+
+    width = get_exam_strategy(test.exam_type).score_bin_width
+    counts, origin = [], 0.0
+    if scores:
+        scores = np.array(scores)
+        origin = math.floor(scores.min() / width + _EPSILON) * width
+        counts = np.bincount(np.floor((scores - origin) / width + _EPSILON).astype(np.int64)).tolist()
+
+    hist, _ = ScoreHistogram.objects.update_or_create(
+        test=test, defaults={'origin': origin, 'bin_width': width, 'counts': counts, 'total': len(scores)}
+    )
+    return hist
+
+
+def get_histogram(test):
+    """The test's histogram (free when selected with select_related('score_histogram')), or None."""
+    try:
+        return test.score_histogram
+    except ScoreHistogram.DoesNotExist:
+        return None
+
+
+def standing(hist, score):
+    """
+    {'percentile', 'beat', 'total'} of a score: percentile rank (ties count
+    half) and the share of candidates scoring in lower bins. None without data.
+    """
+    if hist is None or score is None or not hist.total:
+        return None
+    idx = _bin(hist, score)
+    counts = hist.counts
+    below = sum(counts[:max(0, min(idx, len(counts)))])
+    same = counts[idx] if 0 <= idx < len(counts) else 0
+    return {
+        'percentile': round(100.0 * (below + same / 2) / hist.total, 1),
+        'beat': round(100.0 * below / hist.total, 1),
+        'total': hist.total,
+    }
@@ -0,0 +1,129 @@
+"""
+Pre-warming for scheduled tests.
+
+Run shortly before MockTestAttributes.start_datetime (`manage.py prewarm_test`)
+so the opening minute of an exam is served from cache instead of a write storm:
+  - the paper is built for every configured language,
+  - the slug -> (item, test) mapping and the enrolled-user set are cached,
+  - IN_PROGRESS attempts are bulk-created (started_at=None) for all enrollees.
+
+The cached entries are only useful in a cache the web workers share, so the
+default cache must not be process-local (check_shared_cache). Pre-created
+attempts that were never opened are deleted once their test has closed
+(purge_unopened_attempts).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from enrollments.models import UserEnrollment
+from .models import MockTestAttributes, UserTestAttempt
+from .paper import get_paper
+
+# Cached entries outlive the exam window by this much
+CACHE_GRACE = timedelta(hours=2)
+# Backends private to one process: a warm-up run from a management command never reaches the web workers
+LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _test_key(slug):
+    return f"prewarm:test:{slug}"
+
+
+def _enrolled_key(item_id):
+    return f"prewarm:enrolled:{item_id}"
+
+
+def _closes(test, now):
+    return test.end_datetime or ((test.start_datetime or now) + timedelta(minutes=test.duration_minutes))
+
+
+def _cache_timeout(test):
+    now = timezone.now()
+    return max(60, int((_closes(test, now) + CACHE_GRACE - now).total_seconds()))
+
+
+def check_shared_cache():
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in LOCAL_BACKENDS:
+        raise ImproperlyConfigured(
+            f"Pre-warming needs a default cache shared by the web workers (Redis, Memcached, ...), not {backend}"
+        )
+
+
+def get_cached_test_ids(slug):
+    """Returns (item_id, test_id) for a pre-warmed slug, or None."""
+    return cache.get(_test_key(slug))
+
+
+def is_enrolled(user_id, item_id):
+    """
+    Enrollment check that hits the pre-warmed set first and falls back to the DB
+    (covers users who enrolled after the test was pre-warmed).
+    """
+    enrolled = cache.get(_enrolled_key(item_id))
+    if enrolled is not None and user_id in enrolled:
+        return True
+    return UserEnrollment.objects.filter(user_id=user_id, item_id=item_id).exists()
+
+
+def prewarm_test(test, batch_size=1000):
+    """
+    Warms caches and pre-creates attempts for one test. Idempotent.
+    Returns {'languages', 'enrolled', 'attempts_created'}.
+    Raises ImproperlyConfigured (before touching anything) if the cache is process-local.
+    """
+    check_shared_cache()
+    timeout = _cache_timeout(test)
+    item = test.item
+
+    # 1. Paper artifact for every language
+    languages = [code for code, _ in settings.LANGUAGES]
+    for language in languages:
+        get_paper(test, language=language)
+
+    # 2. Slug lookup and enrolled-user set
+    cache.set(_test_key(item.slug), (item.pk, test.pk), timeout)
+    enrolled = set(UserEnrollment.objects.filter(item=item).values_list('user_id', flat=True))
+    cache.set(_enrolled_key(item.pk), frozenset(enrolled), timeout)
+
+    # 3. IN_PROGRESS attempts for enrollees who do not have one yet
+    has_open_attempt = set(
+        UserTestAttempt.objects.filter(test=test, status=UserTestAttempt.Status.IN_PROGRESS)
+        .values_list('user_id', flat=True)
+    )
+    missing = sorted(enrolled - has_open_attempt)
+    UserTestAttempt.objects.bulk_create(
+        [UserTestAttempt(user_id=user_id, test=test, started_at=None) for user_id in missing],
+        batch_size=batch_size,
+    )
+
+    return {'languages': len(languages), 'enrolled': len(enrolled), 'attempts_created': len(missing)}
+
+
+def tests_starting_within(minutes):
+    """Scheduled tests whose start_datetime falls in the next `minutes` minutes."""
+    now = timezone.now()
+    return MockTestAttributes.objects.filter(
+        start_datetime__gte=now, start_datetime__lte=now + timedelta(minutes=minutes)
+    ).select_related('item')
+
+
+def purge_unopened_attempts():
+    """Deletes pre-created attempts nobody opened once their test has closed. Returns the number deleted."""
+    now = timezone.now()
+    unopened = UserTestAttempt.objects.filter(status=UserTestAttempt.Status.IN_PROGRESS, started_at__isnull=True)
+    tests = MockTestAttributes.objects.filter(
+        start_datetime__lt=now, attempts__in=unopened
+    ).distinct().only('pk', 'start_datetime', 'end_datetime', 'duration_minutes')
+    closed = [test.pk for test in tests if _closes(test, now) + CACHE_GRACE < now]
+    if not closed:
+        return 0
+    _, deleted = unopened.filter(test_id__in=closed).delete()
+    return deleted.get(UserTestAttempt._meta.label, 0)
@@ -0,0 +1,200 @@
+"""
+Bulk re-grading after an answer-key correction.
+
+Fixing a QuestionOption.is_correct flag (or a NUMERIC key) bumps the paper
+version, so the compiled answer key is already the corrected one. Re-grading
+then touches only the affected rows, per test:
+
+  1. every submitted answer to the questions is selected once, graded in one
+     vectorized pass (grade_arrays) and written back with one bulk UPDATE;
+  2. the attempts holding a changed answer are re-totalled through their exam
+     strategy (one aggregate query) and their scores and pass flags set with a
+     single UPDATE;
+  3. what derives from the scores is adjusted by the deltas: result pages are
+     patched in place, the score histogram moves the candidates' bins under
+     one lock, and the UserRankMetric of every user whose latest score moved
+     is re-summed from those users' latest scores in one query, instead of
+     recalculating each leaderboard row on its own. XP is int() of the exact
+     sum, so it cannot be shifted by a rounded delta.
+
+Entry points: QuestionReportAdmin's "Regrade" action and `manage.py regrade_questions`.
+"""
+from collections import Counter
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import BooleanField, Case, DecimalField, Exists, OuterRef, Value, When
+from django.utils import timezone
+
+from .grading import get_answer_key, grade_arrays, negative_marking_fraction
+from .models import AttemptResult, MockTestAttributes, TestQuestion, UserAnswer, UserRankMetric, UserTestAttempt
+from .paper import get_paper, iter_questions
+from .percentiles import move_scores
+from .services import get_exam_strategy, resolve_passed
+
+
+def regrade_questions(question_ids, dry_run=False):
+    """
+    Re-grades every submitted answer to the questions against the current key.
+    Returns {'answers', 'attempts', 'users'}: rows whose grading, score or
+    leaderboard entry changed. With dry_run nothing is written.
+    """
+    by_test = {}
+    for question_id, test_id in TestQuestion.objects.filter(id__in=question_ids).values_list('id', 'section__test_id'):
+        by_test.setdefault(test_id, []).append(question_id)
+
+    summary = Counter(answers=0, attempts=0, users=0)
+    for test in MockTestAttributes.objects.filter(pk__in=list(by_test)):
+        summary.update(_regrade_test(test, by_test[test.pk], dry_run))
+    return dict(summary)
+
+
+def _regrade_test(test, question_ids, dry_run):
+    answers = list(
+        UserAnswer.objects.filter(
+            question_id__in=question_ids, attempt__test=test, attempt__status=UserTestAttempt.Status.SUBMITTED
+        ).only(
+            'id', 'attempt_id', 'question_id', 'selected_option_id', 'selected_mask', 'text_answer', 'numeric_answer',
+            'score_awarded', 'is_correct'
+        )
+    )
+    if not answers:
+        return {}
+
+    gradable, _, is_correct, score = grade_arrays(
+        get_answer_key(test),
+        [a.question_id for a in answers],
+        [a.selected_option_id or 0 for a in answers],
+        [a.text_answer or a.numeric_answer for a in answers],
+        negative_marking_fraction(test),
+        [a.selected_mask for a in answers],
+    )
+    changed = []
+    for i in np.flatnonzero(gradable):
+        answer = answers[i]
+        awarded = Decimal(str(round(float(score[i]), 2)))
+        if answer.is_correct != bool(is_correct[i]) or answer.score_awarded != awarded:
+            changed.append((answer, answer.score_awarded, awarded, bool(is_correct[i])))
+    if not changed or dry_run:
+        return {'answers': len(changed)}
+
+    with transaction.atomic():
+        for answer, _, awarded, correct in changed:
+            answer.score_awarded = awarded
+            answer.is_correct = correct
+        UserAnswer.objects.bulk_update([a for a, _, _, _ in changed], ['is_correct', 'score_awarded'], batch_size=500)
+
+        newer = UserTestAttempt.objects.filter(
+            user_id=OuterRef('user_id'), test_id=OuterRef('test_id'), status=UserTestAttempt.Status.SUBMITTED,
+            score__isnull=False, created__gt=OuterRef('created'),
+        )
+        attempts = list(
+            UserTestAttempt.objects.select_for_update().select_related('test')
+            .filter(id__in={a.attempt_id for a, _, _, _ in changed})
+            .annotate(superseded=Exists(newer))
+        )
+        scores = get_exam_strategy(test.exam_type).rescore(test, attempts)
+        # Same pass rule as finalize_attempt
+        passed = {a.id: resolve_passed(test, scores[a.id][0], scores[a.id][2]) for a in attempts}
+
+        rescored = [
+            (a, a.score, scores[a.id][0]) for a in attempts
+            if scores[a.id][0] != a.score or passed[a.id] != a.is_passed
+        ]
+        if rescored:
+            UserTestAttempt.objects.filter(id__in=[a.id for a, _, _ in rescored]).update(
+                score=Case(
+                    *[When(id=a.id, then=Value(new)) for a, _, new in rescored],
+                    output_field=DecimalField(max_digits=6, decimal_places=2),
+                ),
+                is_passed=Case(
+                    *[When(id=a.id, then=Value(passed[a.id])) for a, _, _ in rescored],
+                    output_field=BooleanField(),
+                ),
+            )
+
+        section_of = {q['id']: q['section_id'] for q in iter_questions(get_paper(test))}
+        _patch_results(changed, section_of, {a.id: scores[a.id][1] for a in attempts})
+
+        latest = [(a, old, new) for a, old, new in rescored if not a.superseded and new != old]
+        move_scores(test.pk, [(old, new) for _, old, new in latest])
+        moved = {attempt.user_id for attempt, _, _ in latest}
+        _refresh_rank_metrics(moved)
+
+    return {'answers': len(changed), 'attempts': len(rescored), 'users': len(moved)}
+
+
+def _patch_results(changed, section_of, details):
+    """Flips the re-graded questions' statuses and counts in the stored AttemptResults."""
+    by_attempt = {}
+    for answer, old, new, correct in changed:
+        by_attempt.setdefault(answer.attempt_id, []).append((answer, new - old, correct))
+
+    results = list(AttemptResult.objects.filter(attempt_id__in=list(by_attempt)))
+    for result in results:
+        statuses = list(result.question_status)
+        positions = {qid: i for i, qid in enumerate(result.question_ids)}
+        sections = {s['section_id']: s for s in result.sections}
+
+        for answer, delta, correct in by_attempt[result.attempt_id]:
+            pos = positions.get(answer.question_id)
+            if pos is None:
+                continue
+            section = sections.get(section_of.get(answer.question_id))
+            old_status = statuses[pos]
+            new_status = AttemptResult.STATUS_CORRECT if correct else (
+                AttemptResult.STATUS_WRONG if old_status != AttemptResult.STATUS_SKIPPED else old_status
+            )
+            if new_status != old_status:
+                statuses[pos] = new_status
+                _count(result, old_status, -1)
+                _count(result, new_status, 1)
+            if section is not None:
+                section['score'] = round(section['score'] + float(delta), 2)
+
+        result.question_status = ''.join(statuses)
+        result.accuracy = round(Decimal(result.correct_count * 100) / result.total_questions, 2) if result.total_questions else Decimal('0')
+        if details.get(result.attempt_id) is not None:
+            result.score_details = details[result.attempt_id]
+
+    AttemptResult.objects.bulk_update(
+        results, ['question_status', 'correct_count', 'incorrect_count', 'skipped_count', 'accuracy', 'sections', 'score_details']
+    )
+
+
+def _count(result, status, delta):
+    field = {
+        AttemptResult.STATUS_CORRECT: 'correct_count',
+        AttemptResult.STATUS_WRONG: 'incorrect_count',
+        AttemptResult.STATUS_SKIPPED: 'skipped_count',
+    }[status]
+    setattr(result, field, getattr(result, field) + delta)
+
+
+def _refresh_rank_metrics(user_ids):
+    """
+    Re-sums the users' leaderboard totals from the latest submitted attempt of
+    each of their tests (one query for all of them), as recalculate_user_rank does.
+    """
+    if not user_ids:
+        return
+    totals, seen = Counter(), set()
+    rows = UserTestAttempt.objects.filter(
+        user_id__in=user_ids, status=UserTestAttempt.Status.SUBMITTED
+    ).order_by('-created').values_list('user_id', 'test_id', 'score')
+    for user_id, test_id, score in rows:
+        if (user_id, test_id) not in seen:
+            seen.add((user_id, test_id))
+            totals[user_id] += score or 0
+
+    now = timezone.now()
+    metrics = list(UserRankMetric.objects.select_for_update().filter(user_id__in=user_ids))
+    for metric in metrics:
+        total = totals[metric.user_id]
+        # XP is whole marks of the exact sum (10.5 + 3.5 -> 14, minus 0.5 -> 13)
+        metric.total_xp = int(total)
+        if metric.tests_taken_count:
+            metric.avg_score = round(Decimal(total) / metric.tests_taken_count, 2)
+        metric.modified = now
+    UserRankMetric.objects.bulk_update(metrics, ['total_xp', 'avg_score', 'modified'])
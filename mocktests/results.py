@@ -0,0 +1,133 @@
+"""
+Materialized attempt results.
+
+A SUBMITTED attempt never changes, so its counts, per-section breakdown and
+per-question statuses are computed once at grading time (finalize_attempt) and
+stored in AttemptResult. test_result then only joins that row with the cached
+paper. Attempts graded before AttemptResult existed are materialized lazily on
+their first view.
+"""
+from decimal import Decimal
+
+from .attempt_events import load_events, question_times
+from .models import AttemptResult, UserAnswer
+from .paper import get_paper, iter_questions
+
+STATUS_LABELS = {
+    AttemptResult.STATUS_CORRECT: 'CORRECT',
+    AttemptResult.STATUS_WRONG: 'WRONG',
+    AttemptResult.STATUS_SKIPPED: 'SKIPPED',
+}
+
+
+def _answer_status(answer):
+    if answer is None:
+        return AttemptResult.STATUS_SKIPPED
+    if answer['is_correct']:
+        return AttemptResult.STATUS_CORRECT
+    if answer['selected_option_id'] or answer['selected_mask'] or (answer['text_answer'] and answer['text_answer'].strip()):
+        return AttemptResult.STATUS_WRONG
+    return AttemptResult.STATUS_SKIPPED
+
+
+def build_result(attempt, score_details=None):
+    """Computes and stores the AttemptResult of a graded attempt (idempotent)."""
+    test = attempt.test
+    paper = get_paper(test)
+    answers = {
+        a['question_id']: a for a in UserAnswer.objects.filter(attempt=attempt).values(
+            'question_id', 'selected_option_id', 'selected_mask', 'text_answer', 'numeric_answer', 'is_correct',
+            'score_awarded'
+        )
+    }
+
+    question_ids = []
+    statuses = []
+    responses = {}
+    sections = []
+    for section in paper['sections']:
+        counts = {AttemptResult.STATUS_CORRECT: 0, AttemptResult.STATUS_WRONG: 0, AttemptResult.STATUS_SKIPPED: 0}
+        section_score = Decimal('0')
+        for question in section['questions']:
+            answer = answers.get(question['id'])
+            status = _answer_status(answer)
+            counts[status] += 1
+            question_ids.append(question['id'])
+            statuses.append(status)
+            if answer is not None:
+                section_score += answer['score_awarded'] or 0
+                text = answer['text_answer'] or answer['numeric_answer']
+                if answer['selected_mask']:
+                    responses[str(question['id'])] = [answer['selected_option_id'], text, answer['selected_mask']]
+                elif answer['selected_option_id'] or text:
+                    responses[str(question['id'])] = [answer['selected_option_id'], text]
+        sections.append({
+            'section_id': section['id'],
+            'title': section['title'],
+            'total': len(section['questions']),
+            'correct': counts[AttemptResult.STATUS_CORRECT],
+            'incorrect': counts[AttemptResult.STATUS_WRONG],
+            'skipped': counts[AttemptResult.STATUS_SKIPPED],
+            'score': float(section_score),
+        })
+
+    total = paper['question_count']
+    correct = statuses.count(AttemptResult.STATUS_CORRECT)
+    incorrect = statuses.count(AttemptResult.STATUS_WRONG)
+
+    times, tab_switches = question_times(load_events(attempt.id))
+    paper_ids = set(question_ids)
+
+    time_taken = None
+    if attempt.completed_at and attempt.started_at:
+        time_taken = max(0, int((attempt.completed_at - attempt.started_at).total_seconds()))
+
+    result, _ = AttemptResult.objects.update_or_create(
+        attempt=attempt,
+        defaults={
+            'paper_version': paper['version'],
+            'total_questions': total,
+            'total_marks': paper['total_marks'],
+            'correct_count': correct,
+            'incorrect_count': incorrect,
+            'skipped_count': total - correct - incorrect,
+            'accuracy': round(Decimal(correct * 100) / total, 2) if total else Decimal('0'),
+            'time_taken_seconds': time_taken,
+            'sections': sections,
+            'score_details': score_details or {},
+            'question_ids': question_ids,
+            'question_status': ''.join(statuses),
+            'responses': responses,
+            'question_times': {str(qid): seconds for qid, seconds in times.items() if qid in paper_ids},
+            'tab_switches': tab_switches,
+        },
+    )
+    return result
+
+
+def get_result(attempt):
+    """The stored result of a SUBMITTED attempt, materializing it on first access if missing."""
+    try:
+        return attempt.result
+    except AttemptResult.DoesNotExist:
+        return build_result(attempt)
+
+
+def analysis_items(result, paper):
+    """Per-question rows for the result templates, in paper order."""
+    statuses = result.status_map()
+    items = []
+    for question in iter_questions(paper):
+        response = result.responses.get(str(question['id']))
+        selected_option_id, text_answer, *mask = response if response else (None, None)
+        mask = mask[0] if mask else 0
+        items.append({
+            'question': question,
+            'user_answer': {'selected_option_id': selected_option_id, 'text_answer': text_answer} if response else None,
+            'selected_option_id': selected_option_id,
+            # Options picked on a MULTI question
+            'selected_options': [o['id'] for o in question['options'] if mask >> o['bit'] & 1],
+            'status': STATUS_LABELS[statuses.get(question['id'], AttemptResult.STATUS_SKIPPED)],
+            'time_spent': result.question_times.get(str(question['id'])),
+        })
+    return items
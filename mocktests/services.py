@@ -1,7 +1,22 @@
-from .models import UserAnswer
+import math
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from . import answer_buffer
+from .bands import COMPONENTS as BAND_COMPONENTS, band_scores
+from .models import EssayScoringJob, UserAnswer, UserTestAttempt
+from .grading import grade_attempt, grade_arrays, get_answer_key
+from .paper import get_paper
+from .results import get_result
 
 class BaseExamStrategy:
     """Base class with default logic for GENERAL exams"""
+
+    # Width of a score-histogram bin (percentiles.py); one mark
+    score_bin_width = 1
     
     def get_take_test_template(self):
         return 'mocktests/take_test_general.html'
@@ -9,56 +24,68 @@ class BaseExamStrategy:
     def get_result_template(self):
         return 'mocktests/result_general.html'
 
+    def get_question_blocks_template(self):
+        """Question markup of the exam UI, shared by take_test and the section API"""
+        return 'mocktests/question_blocks_general.html'
+
     def grade_answers(self, attempt):
         """
-        Grades both MCQ and NUMERIC/INPUT answers.
+        Grades both MCQ and NUMERIC/INPUT answers in one vectorized pass
+        (see grading.py), applying the test's negative marking.
         """
-        answers = UserAnswer.objects.filter(attempt=attempt).select_related('question', 'selected_option')
-        
-        for answer in answers:
-            # 1. Logic for MCQ
-            if answer.question.question_type == 'MCQ':
-                if answer.selected_option and answer.selected_option.is_correct:
-                    answer.is_correct = True
-                else:
-                    answer.is_correct = False
-            
-            # 2. Logic for NUMERIC / INPUT (The Fix)
-            elif answer.question.question_type == 'NUMERIC':
-                # Get the user's text input and the stored correct value
-                user_val = str(answer.text_answer).strip() if answer.text_answer else ""
-                correct_val = str(answer.question.correct_answer_value).strip() if answer.question.correct_answer_value else ""
-                
-                # Compare them (Case-insensitive)
-                if user_val and correct_val and user_val.lower() == correct_val.lower():
-                    answer.is_correct = True
-                else:
-                    answer.is_correct = False
-
-            # 3. Save the result
-            answer.save()
+        return grade_attempt(attempt)
+
+    def visible_sections(self, paper, attempt):
+        """Sections rendered in the exam UI for this attempt"""
+        return paper['sections']
+
+    def pending_routes(self, paper, attempt):
+        """Adaptive modules the client must request once a module is finished"""
+        return []
+
+    def result_context(self, attempt):
+        """Extra context of the result page for a graded attempt"""
+        return {}
+
+    def passed(self, test, score, details):
+        """Pass/fail verdict for a score, or None to compare it with test.pass_percentage"""
+        return True
 
     def calculate_score(self, attempt):
-        """Standard simple scoring"""
-        self.grade_answers(attempt)
-        
-        total_score = 0
-        correct_count = 0
-        
-        # Re-fetch to ensure we have the latest is_correct status
-        for answer in attempt.answers.all():
-            if answer.is_correct:
-                total_score += answer.question.marks
-                correct_count += 1
+        """Standard simple scoring: sum of score_awarded (negative marks included)"""
+        result = self.grade_answers(attempt)
         
         return {
-            'score': total_score,
-            'correct_count': correct_count,
-            'passed': True 
+            'score': result['score'],
+            'correct_count': result['correct_count'],
+            'passed': self.passed(attempt.test, result['score'], None)
         }
 
+    def rescore(self, test, attempts):
+        """
+        {attempt_id: (score, details or None, passed)} of graded attempts of
+        `test` re-totalled from their answers' stored grading (one aggregate
+        query); passed is the verdict of passed(), see resolve_passed.
+        """
+        totals = dict(
+            UserAnswer.objects.filter(attempt__in=attempts)
+            .values('attempt_id').annotate(total=Sum('score_awarded')).values_list('attempt_id', 'total')
+        )
+        scores = {}
+        for attempt in attempts:
+            score = totals.get(attempt.id) or Decimal('0')
+            scores[attempt.id] = (score, None, self.passed(test, score, None))
+        return scores
+
 class SATExamStrategy(BaseExamStrategy):
-    """Specific logic for Digital SAT"""
+    """Specific logic for Digital SAT (non-adaptive: every module is shown)"""
+
+    # (TestSection.subject, key in the score details)
+    SUBJECTS = (('RW', 'rw'), ('MATH', 'math'))
+    # Default curve when the form has no score_tables: 200 + 10 per correct answer
+    DEFAULT_CAPS = {'STANDARD': 800, 'M2_HARD': 800, 'M2_EASY': 650}
+    # Scaled scores move in steps of 10
+    score_bin_width = 10
     
     def get_take_test_template(self):
         return 'mocktests/exams/sat/take_test.html'
@@ -66,44 +93,235 @@ class SATExamStrategy(BaseExamStrategy):
     def get_result_template(self):
         return 'mocktests/exams/sat/result.html'
 
+    def get_question_blocks_template(self):
+        return 'mocktests/exams/sat/question_blocks.html'
+
+    def passed(self, test, score, details):
+        return None
+
+    def get_path(self, attempt, subject, paper):
+        """Which conversion table applies to this subject ('STANDARD' unless routed)."""
+        return 'STANDARD'
+
+    def scale_score(self, test, subject, path, raw):
+        """Raw correct count -> scaled section score through the form's lookup table."""
+        tables = (test.score_tables or {}).get(subject, {})
+        table = tables.get(path) or tables.get('STANDARD')
+        if table:
+            return table[min(raw, len(table) - 1)]
+        return min(self.DEFAULT_CAPS.get(path, 800), 200 + raw * 10)
+
     def calculate_score(self, attempt):
-        # 1. Grade the answers
-        self.grade_answers(attempt)
-        
-        # 2. Get Raw Counts
-        math_correct = attempt.answers.filter(is_correct=True, question__section__title__icontains="Math").count()
-        rw_correct = attempt.answers.filter(is_correct=True, question__section__title__icontains="Reading").count()
-        
-        # 3. Simple Mock SAT Algorithm (Curve)
-        math_score = 200 + (math_correct * 10)
-        if math_score > 800: math_score = 800
-        
-        rw_score = 200 + (rw_correct * 10)
-        if rw_score > 800: rw_score = 800
-        
-        total_sat_score = math_score + rw_score
+        # 1. Grade the answers (one vectorized pass)
+        result = self.grade_answers(attempt)
+        test = attempt.test
+        paper = get_paper(test)
+        key = get_answer_key(test)
+
+        # 2. Raw correct counts per subject, from structured section roles
+        idx = key.index_of(result['question_ids'])
+        on_paper = idx >= 0
+        answer_sections = key.section_ids[idx[on_paper]]
+        correct = result['is_correct'][on_paper]
 
+        raw = {}
+        for subject, _ in self.SUBJECTS:
+            subject_sections = [s['id'] for s in paper['sections'] if s['subject'] == subject]
+            raw[subject] = int(np.count_nonzero(correct & np.isin(answer_sections, subject_sections)))
+
+        # 3. Convert through the per-form lookup table
+        total_sat_score, details = self.scaled_total(attempt, paper, raw)
         return {
             'score': total_sat_score,
-            'details': {
-                'math': math_score,
-                'rw': rw_score
-            }
+            'correct_count': result['correct_count'],
+            'details': details
         }
 
+    def scaled_total(self, attempt, paper, raw):
+        """(total, details) from raw correct counts per subject"""
+        details = {}
+        total = 0
+        for subject, label in self.SUBJECTS:
+            details[label] = self.scale_score(attempt.test, subject, self.get_path(attempt, subject, paper), raw.get(subject, 0))
+            total += details[label]
+        return total, details
+
+    def rescore(self, test, attempts):
+        """Scaled scores from the stored is_correct flags (one aggregate query)"""
+        paper = get_paper(test)
+        subject_of = {s['id']: s['subject'] for s in paper['sections']}
+        raw = {a.id: {} for a in attempts}
+        rows = UserAnswer.objects.filter(attempt__in=attempts, is_correct=True).values(
+            'attempt_id', 'question__section_id'
+        ).annotate(correct=Count('id'))
+        for row in rows:
+            subject = subject_of.get(row['question__section_id'])
+            if subject:
+                raw[row['attempt_id']][subject] = raw[row['attempt_id']].get(subject, 0) + row['correct']
+        scores = {}
+        for attempt in attempts:
+            total, details = self.scaled_total(attempt, paper, raw[attempt.id])
+            scores[attempt.id] = (Decimal(total), details, self.passed(test, total, details))
+        return scores
+
+
+class SATAdaptiveExamStrategy(SATExamStrategy):
+    """
+    Digital SAT with multistage routing: module 1 is scored as soon as the
+    candidate finishes it, which picks the easy or hard module 2 section.
+    """
+    DEFAULT_THRESHOLD = 0.6  # share of module-1 questions correct to reach the hard module
+
+    def _modules(self, paper, subject):
+        return {s['module']: s for s in paper['sections'] if s['subject'] == subject}
+
+    def passed(self, test, score, details):
+        return None
+
+    def get_path(self, attempt, subject, paper):
+        routed = (attempt.module_routing or {}).get(subject)
+        for section in paper['sections']:
+            if section['id'] == routed:
+                return section['module']
+        return 'STANDARD'
+
+    def visible_sections(self, paper, attempt):
+        """Hides module-2 variants that the candidate was not routed to (or not yet)."""
+        routed = set((attempt.module_routing or {}).values())
+        return [
+            s for s in paper['sections']
+            if s['module'] not in ('M2_EASY', 'M2_HARD') or s['id'] in routed
+        ]
+
+    def pending_routes(self, paper, attempt):
+        routing = attempt.module_routing or {}
+        pending = []
+        for subject, _ in self.SUBJECTS:
+            modules = self._modules(paper, subject)
+            m1 = modules.get('M1')
+            if subject in routing or not m1 or not m1['questions']:
+                continue
+            if 'M2_EASY' in modules and 'M2_HARD' in modules:
+                pending.append({'subject': subject, 'last_question_id': m1['questions'][-1]['id']})
+        return pending
+
+    def route_module(self, attempt, subject):
+        """
+        Scores module 1 from the already-saved answers against the precompiled
+        key and stores the chosen module-2 section. Idempotent per subject.
+        Returns the module-2 section id, or None if the form is not adaptive.
+        """
+        test = attempt.test
+        paper = get_paper(test)
+        modules = self._modules(paper, subject)
+        m1, easy, hard = modules.get('M1'), modules.get('M2_EASY'), modules.get('M2_HARD')
+        if not (m1 and easy and hard):
+            return None
+
+        with transaction.atomic():
+            locked = UserTestAttempt.objects.select_for_update().only('id', 'module_routing').get(pk=attempt.pk)
+            routing = dict(locked.module_routing or {})
+            if subject in routing:
+                return routing[subject]
+
+            m1_ids = [q['id'] for q in m1['questions']]
+            rows = {
+                a['question_id']: a for a in UserAnswer.objects.filter(attempt_id=attempt.pk, question_id__in=m1_ids)
+                .values('question_id', 'selected_option_id', 'text_answer')
+            }
+            if answer_buffer.is_enabled():
+                rows.update(answer_buffer.get_buffered_rows(attempt, m1_ids))
+
+            _, _, is_correct, _ = grade_arrays(
+                get_answer_key(test),
+                list(rows.keys()),
+                [r['selected_option_id'] or 0 for r in rows.values()],
+                [r['text_answer'] for r in rows.values()],
+            )
+            raw = int(np.count_nonzero(is_correct))
+            threshold = (test.score_tables or {}).get(subject, {}).get('threshold')
+            if threshold is None:
+                threshold = math.ceil(len(m1_ids) * self.DEFAULT_THRESHOLD)
+
+            routing[subject] = hard['id'] if raw >= threshold else easy['id']
+            locked.module_routing = routing
+            locked.save(update_fields=['module_routing'])
+
+        attempt.module_routing = routing
+        return routing[subject]
+
 class IELTSExamStrategy(BaseExamStrategy):
-    pass
+    """IELTS: the score is the overall band (see bands.py)"""
+
+    # Half bands
+    score_bin_width = 0.5
+
+    def get_result_template(self):
+        return 'mocktests/exams/ielts/result.html'
+
+    def calculate_score(self, attempt):
+        result = self.grade_answers(attempt)
+        details = band_scores(attempt.test, [attempt.id])[attempt.id]
+        score = Decimal(str(details['overall']))
+        return {
+            'score': score,
+            'correct_count': result['correct_count'],
+            'passed': self.passed(attempt.test, score, details),
+            'details': details,
+        }
+
+    def passed(self, test, score, details):
+        # pass_percentage reads as a share of band 9
+        return score * 100 >= 9 * test.pass_percentage
+
+    def result_context(self, attempt):
+        """Component bands for the report, and whether any are still being scored or marked"""
+        details = get_result(attempt).score_details or {}
+        return {
+            'bands': [
+                (label.title(), details[label], details.get('raw', {}).get(label))
+                for _, label in BAND_COMPONENTS if label in details
+            ],
+            'pending_essays': attempt.essay_jobs.exclude(status=EssayScoringJob.Status.DONE).exists(),
+            'pending_bands': details.get('pending', []),
+        }
+
+    def rescore(self, test, attempts):
+        scores = {}
+        for attempt_id, details in band_scores(test, [a.id for a in attempts]).items():
+            score = Decimal(str(details['overall']))
+            # Writing marked after submission moves the overall band, and with it the verdict
+            scores[attempt_id] = (score, details, self.passed(test, score, details))
+        return scores
 
 class JEEMainExamStrategy(BaseExamStrategy):
-    pass
+    def result_context(self, attempt):
+        """NTA percentile and predicted rank when the test is one shift of a ShiftSet"""
+        if not attempt.test.shift_set_id:
+            return {}
+        from .normalization import normalized_standing
+        return {'normalized': normalized_standing(attempt)}
+
+class JEEAdvancedExamStrategy(BaseExamStrategy):
+    """
+    JEE Advanced: marks-sum scoring where MULTI questions earn partial marks
+    (graded in the same vectorized pass, see grading.py)
+    """
+
+def resolve_passed(test, score, passed):
+    """A strategy's pass/fail verdict, else whether the score reaches test.pass_percentage"""
+    if isinstance(passed, bool):
+        return passed
+    return score >= test.pass_percentage
 
 def get_exam_strategy(exam_type):
     strategies = {
-        'SAT_ADAPTIVE': SATExamStrategy(),
+        'SAT_ADAPTIVE': SATAdaptiveExamStrategy(),
         'SAT_NON_ADAPTIVE': SATExamStrategy(),
         'SAT': SATExamStrategy(),
         'IELTS': IELTSExamStrategy(),
         'JEE_MAINS': JEEMainExamStrategy(), 
+        'JEE_ADVANCED': JEEAdvancedExamStrategy(),
         'GENERAL': BaseExamStrategy(),
     }
     return strategies.get(exam_type, BaseExamStrategy())
\ No newline at end of file
@@ -1,8 +1,16 @@
-from django.db.models.signals import post_save
+import threading
+import weakref
+
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.db import transaction
 from django.db.models import Sum, Max
-from .models import UserTestAttempt, UserRankMetric
+from .models import (
+    UserTestAttempt, UserRankMetric, TestSection, TestQuestion, QuestionOption,
+    QuestionMedia, QuestionAudio, ComprehensionPassage
+)
+from .paper import bump_paper_version
+from .dedup import index_question
 
 def recalculate_user_rank(user):
     """
@@ -44,3 +52,74 @@ def update_rank_on_submission(sender, instance, **kwargs):
     """
     if instance.status == 'SUBMITTED':
         recalculate_user_rank(instance.user)
+
+
+# ==========================================
+# Paper cache invalidation
+# ==========================================
+
+@receiver([post_save, post_delete], sender=TestSection)
+def invalidate_paper_on_section_change(sender, instance, **kwargs):
+    bump_paper_version(pk=instance.test_id)
+
+@receiver([post_save, post_delete], sender=ComprehensionPassage)
+def invalidate_paper_on_passage_change(sender, instance, **kwargs):
+    bump_paper_version(sections__id=instance.section_id)
+
+@receiver([post_save, post_delete], sender=TestQuestion)
+def invalidate_paper_on_question_change(sender, instance, **kwargs):
+    bump_paper_version(sections__id=instance.section_id)
+
+@receiver([post_save, post_delete], sender=QuestionOption)
+@receiver([post_save, post_delete], sender=QuestionMedia)
+@receiver([post_save, post_delete], sender=QuestionAudio)
+def invalidate_paper_on_question_child_change(sender, instance, **kwargs):
+    bump_paper_version(sections__questions__id=instance.question_id)
+
+
+# ==========================================
+# Near-duplicate index
+# ==========================================
+
+_pending_reindex = threading.local()
+
+class _ReindexBatch:
+    """The one on-commit callback per transaction; reindexes every question touched in it."""
+
+    def __init__(self):
+        self.question_ids = set()
+        self.ran = False
+
+    def __call__(self):
+        self.ran = True
+        for question_id in self.question_ids:
+            _reindex(question_id)
+
+def _schedule_reindex(question_id):
+    """Reindexes once per question per transaction (a question and its options are saved together)."""
+    if not transaction.get_connection().in_atomic_block:
+        _reindex(question_id)
+        return
+    # Only the on-commit queue holds the batch: once it runs or is rolled back the weakref dies
+    ref = getattr(_pending_reindex, 'batch', None)
+    batch = ref() if ref is not None else None
+    if batch is None or batch.ran:
+        batch = _ReindexBatch()
+        _pending_reindex.batch = weakref.ref(batch)
+        transaction.on_commit(batch)
+    batch.question_ids.add(question_id)
+
+def _reindex(question_id):
+    question = TestQuestion.objects.filter(pk=question_id).prefetch_related('options').first()
+    if question is not None:
+        index_question(question)
+
+@receiver(post_save, sender=TestQuestion)
+def reindex_on_question_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _schedule_reindex(instance.pk)
+
+@receiver([post_save, post_delete], sender=QuestionOption)
+def reindex_on_option_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _schedule_reindex(instance.question_id)
@@ -0,0 +1,240 @@
+"""
+Submission pipeline.
+
+submit_test moves the attempt to GRADING and enqueues a SubmissionJob in the
+same transaction. Grading, finalizing the attempt and the leaderboard update
+(post_save signal on SUBMITTED) then happen in `manage.py process_submissions`,
+or inline when ASYNC_SUBMISSIONS is off. Essay answers then go through the
+same kind of queue (EssayScoringJob, see essay_scoring.py).
+"""
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import answer_buffer, attempt_events
+from .essay_scoring import enqueue_essays, score_batch
+from .attempt_tokens import GRACE_SECONDS, revoke_tokens
+from .models import EssayScoringJob, MockTestAttributes, SubmissionJob, UserTestAttempt
+from .percentiles import record_attempt
+from .results import build_result
+from .services import get_exam_strategy, resolve_passed
+
+MAX_TRIES = 3
+# Expired attempts are swept this long after their deadline (autosaves are accepted until then)
+SWEEP_GRACE = timedelta(seconds=GRACE_SECONDS)
+# A RUNNING job older than this is assumed to belong to a dead worker
+STALE_AFTER = timedelta(minutes=10)
+
+
+def is_async():
+    return getattr(settings, 'ASYNC_SUBMISSIONS', False)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_submission(attempt, completed_at=None):
+    """
+    Closes an IN_PROGRESS attempt for grading. Must be called with the attempt
+    row locked (select_for_update). Returns the job, or None if already closed.
+    completed_at defaults to now (the sweeper passes the timer deadline).
+    """
+    if attempt.status != UserTestAttempt.Status.IN_PROGRESS:
+        return None
+
+    # Persist any answers still staged in the write-behind buffer
+    answer_buffer.flush_attempt(attempt, clear=True)
+    attempt_events.flush_events([attempt.id])
+
+    attempt.status = UserTestAttempt.Status.GRADING
+    attempt.completed_at = completed_at or timezone.now()
+    attempt.save(update_fields=['status', 'completed_at', 'modified'])
+    # Autosaves holding a signed token for this attempt are refused from now on
+    revoke_tokens(attempt.id)
+
+    job, _ = SubmissionJob.objects.get_or_create(attempt=attempt)
+    return job
+
+
+def finalize_attempt(attempt):
+    """Grades a GRADING attempt through its exam strategy, marks it SUBMITTED and stores its AttemptResult."""
+    test = attempt.test
+    strategy = get_exam_strategy(test.exam_type)
+
+    # 1. Grade & Calculate Score
+    result_data = strategy.calculate_score(attempt)
+
+    # 2. Finalize Attempt
+    attempt.status = UserTestAttempt.Status.SUBMITTED
+    attempt.score = result_data['score']
+    if not attempt.completed_at:
+        attempt.completed_at = timezone.now()
+
+    # 3. Pass/Fail Logic
+    attempt.is_passed = resolve_passed(test, attempt.score, result_data.get('passed'))
+
+    # post_save recalculates the user's leaderboard metrics
+    attempt.save()
+    record_attempt(attempt)
+
+    # 4. Materialize the result page data once
+    build_result(attempt, score_details=result_data.get('details'))
+
+    # 5. Essays are scored out of band and re-total the attempt when done
+    enqueue_essays(attempt)
+    return attempt
+
+
+def _claimable(now):
+    return Q(status=SubmissionJob.Status.PENDING) | Q(status=SubmissionJob.Status.RUNNING, locked_at__lt=now - STALE_AFTER)
+
+
+def claim_jobs(limit, worker=None, job_ids=None, model=SubmissionJob):
+    """
+    Atomically claims up to `limit` PENDING (or stale RUNNING) jobs, oldest first.
+    Each claim is a conditional UPDATE, so concurrent workers never share a job.
+    `model` is the queue (SubmissionJob or EssayScoringJob). Returns the claimed job ids.
+    """
+    worker = (worker or worker_name())[:100]
+    now = timezone.now()
+    queryset = model.objects.filter(_claimable(now))
+    if job_ids is not None:
+        queryset = queryset.filter(id__in=job_ids)
+    candidates = list(queryset.order_by('created').values_list('id', flat=True)[:limit])
+
+    claimed = []
+    for job_id in candidates:
+        updated = model.objects.filter(_claimable(now), id=job_id).update(
+            status=SubmissionJob.Status.RUNNING, locked_at=now, locked_by=worker, modified=now
+        )
+        if updated:
+            claimed.append(job_id)
+    return claimed
+
+
+def process_job(job_id):
+    """
+    Runs one claimed job. Returns the final job status.
+    A failure is recorded on the job, which stays PENDING until MAX_TRIES and is then FAILED.
+    """
+    job = SubmissionJob.objects.get(id=job_id)
+    job.tries += 1
+    try:
+        with transaction.atomic():
+            attempt = UserTestAttempt.objects.select_for_update().select_related('test').get(id=job.attempt_id)
+            if attempt.status == UserTestAttempt.Status.GRADING:
+                finalize_attempt(attempt)
+        job.status = SubmissionJob.Status.DONE
+        job.last_error = ''
+    except Exception:
+        job.last_error = traceback.format_exc()[-4000:]
+        job.status = SubmissionJob.Status.FAILED if job.tries >= MAX_TRIES else SubmissionJob.Status.PENDING
+
+    job.locked_at = None
+    job.save(update_fields=['status', 'tries', 'last_error', 'locked_at', 'modified'])
+    return job.status
+
+
+def submit_attempt(attempt_id):
+    """
+    Entry point used by submit_test and auto-submit.
+    Returns the attempt (GRADING if async, SUBMITTED otherwise).
+    """
+    with transaction.atomic():
+        attempt = UserTestAttempt.objects.select_for_update().get(id=attempt_id)
+        job = enqueue_submission(attempt)
+
+    if job and not is_async():
+        # Claim through the queue so a concurrent worker cannot grade it twice.
+        # On failure the job stays queued for the sweeper (retry_stalled) and
+        # the candidate gets the processing page instead of an error.
+        if claim_jobs(1, job_ids=[job.id]):
+            process_job(job.id)
+            # Its essays too, so the result page shows the final score
+            essay_ids = claim_jobs(
+                100, job_ids=EssayScoringJob.objects.filter(attempt=attempt).values('id'), model=EssayScoringJob
+            )
+            if essay_ids:
+                score_batch(essay_ids)
+        attempt.refresh_from_db()
+    return attempt
+
+
+
+def _expired_filter(now, grace):
+    """
+    Q matching IN_PROGRESS attempts past started_at + duration + grace, one
+    started_at bound per distinct test duration, so the sweep is a single
+    query on the (status, test, started_at) index.
+    Returns (Q or None, {test_id: duration_minutes}).
+    """
+    durations = dict(MockTestAttributes.objects.filter(duration_minutes__gt=0).values_list('pk', 'duration_minutes'))
+    by_duration = {}
+    for test_id, minutes in durations.items():
+        by_duration.setdefault(minutes, []).append(test_id)
+
+    condition = None
+    for minutes, test_ids in by_duration.items():
+        clause = Q(test_id__in=test_ids, started_at__lt=now - timedelta(minutes=minutes) - grace)
+        condition = clause if condition is None else condition | clause
+    return condition, durations
+
+
+def sweep_expired(grace=SWEEP_GRACE, batch_size=100):
+    """
+    Auto-submits abandoned attempts whose timer ran out, grading them through
+    the submission queue. Each batch is claimed with SKIP LOCKED and closed in
+    one transaction, so sweepers on several nodes never pick the same attempt.
+    Returns the number of attempts swept.
+    """
+    now = timezone.now()
+    condition, durations = _expired_filter(now, grace)
+    if condition is None:
+        return 0
+
+    swept = 0
+    while True:
+        with transaction.atomic():
+            attempts = list(
+                UserTestAttempt.objects.select_for_update(skip_locked=True)
+                .filter(condition, status=UserTestAttempt.Status.IN_PROGRESS)
+                .order_by('started_at')[:batch_size]
+            )
+            jobs = [
+                enqueue_submission(a, completed_at=a.started_at + timedelta(minutes=durations[a.test_id]))
+                for a in attempts
+            ]
+        if not attempts:
+            return swept
+
+        # Graded here whatever ASYNC_SUBMISSIONS says; claiming keeps a concurrent worker from grading twice
+        for job_id in claim_jobs(len(jobs), job_ids=[j.id for j in jobs if j]):
+            process_job(job_id)
+        swept += len(attempts)
+
+
+def retry_stalled(batch_size=100):
+    """
+    Grades attempts left in GRADING for longer than STALE_AFTER: jobs still
+    PENDING after a failed inline grade (no worker runs when ASYNC_SUBMISSIONS
+    is off), RUNNING jobs of a dead worker and attempts that lost their job.
+    FAILED jobs have used up MAX_TRIES and are left for an admin. Returns jobs run.
+    """
+    now = timezone.now()
+    stalled = UserTestAttempt.objects.filter(status=UserTestAttempt.Status.GRADING, modified__lt=now - STALE_AFTER)
+
+    orphans = list(stalled.filter(submission_job__isnull=True).values_list('id', flat=True)[:batch_size])
+    SubmissionJob.objects.bulk_create([SubmissionJob(attempt_id=a) for a in orphans], ignore_conflicts=True)
+
+    job_ids = SubmissionJob.objects.filter(attempt__in=stalled).values('id')
+    claimed = claim_jobs(batch_size, job_ids=job_ids)
+    for job_id in claimed:
+        process_job(job_id)
+    return len(claimed)
@@ -1,3 +1,1418 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, transaction
+from django.urls import reverse
+from django.core.cache import cache, caches
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from marketplace.models import MarketplaceItem
+from enrollments.models import UserEnrollment
+from mocktests.models import (
+    MockTestAttributes, TestSection, TestQuestion, QuestionOption,
+    UserTestAttempt, UserAnswer, SubmissionJob, UserRankMetric, AttemptResult, QuestionStats,
+    ScoreHistogram, EssayScoringJob, PracticeDrill, ShiftSet, QuestionMedia, QuestionAudio
+)
+from mocktests import answer_buffer
+from mocktests.cache_backends import CacheFull, DurableFileBasedCache
+from mocktests.paper import get_media_manifest, get_paper
+from mocktests.grading import clear_answer_keys
+from mocktests.services import get_exam_strategy
+from mocktests.submissions import MAX_TRIES, claim_jobs, submit_attempt
+from mocktests import dedup
+from mocktests.item_analysis import analyze_test
+from mocktests import attempt_events
+from mocktests import percentiles
+from mocktests import essay_scoring
+from mocktests import drills
+from mocktests import normalization
+from mocktests import bands
+from mocktests.signals import _ReindexBatch, recalculate_user_rank
+from django.core.management import CommandError, call_command
+from io import StringIO
+import json
+import os
+from datetime import timedelta
+from decimal import Decimal
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import numpy as np
 
-# Create your tests here.
+User = get_user_model()
+
+
+class MockTestFixtureMixin:
+    """Small paper: one section, three MCQs with four options and one numeric question."""
+
+    def setUp(self):
+        # Token revocations go to the (cleared) locmem cache, not the on-disk store shared across runs
+        denylist = override_settings(ATTEMPT_TOKEN_CACHE='default')
+        denylist.enable()
+        self.addCleanup(denylist.disable)
+        cache.clear()
+        clear_answer_keys()
+        self.user = User.objects.create_user(username='student', email='student@test.com', password='password')
+        self.client.login(email='student@test.com', password='password')
+
+        self.item = MarketplaceItem.objects.create(title="JEE Mock 1", slug="jee-mock-1", item_type="MOCK_TEST", is_active=True, price=10)
+        self.test_attr = MockTestAttributes.objects.create(item=self.item, duration_minutes=60, pass_percentage=50)
+        self.section = TestSection.objects.create(test=self.test_attr, title="Physics", sort_order=1)
+
+        self.questions = []
+        self.correct = {}
+        self.wrong = {}
+        for i in range(3):
+            q = TestQuestion.objects.create(section=self.section, question_text=f"Q{i}", marks=4, sort_order=i)
+            opts = [QuestionOption.objects.create(question=q, option_text=f"O{j}", is_correct=(j == 1)) for j in range(4)]
+            self.questions.append(q)
+            self.correct[q.id] = opts[1]
+            self.wrong[q.id] = opts[0]
+
+        self.numeric = TestQuestion.objects.create(
+            section=self.section, question_text="N1", question_type='NUMERIC',
+            correct_answer_value='42', marks=4, sort_order=10
+        )
+        self.attempt = UserTestAttempt.objects.create(user=self.user, test=self.test_attr)
+
+
+class SaveAnswersBatchTests(MockTestFixtureMixin, TestCase):
+    def post_batch(self, answers):
+        return self.client.post(
+            reverse('save_answers_batch'),
+            json.dumps({'attempt_id': self.attempt.id, 'answers': answers}),
+            content_type='application/json'
+        )
+
+    def test_batch_upserts_and_acks(self):
+        q0, q1, _ = self.questions
+        UserAnswer.objects.create(attempt=self.attempt, question=q0, selected_option=self.wrong[q0.id])
+
+        response = self.post_batch([
+            {'question_id': q0.id, 'option_id': self.correct[q0.id].id},
+            {'question_id': q1.id, 'option_id': self.wrong[q1.id].id, 'is_reviewed': True},
+            {'question_id': self.numeric.id, 'text_input': '42'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        acks = {a['question_id']: a['status'] for a in response.json()['acks']}
+        self.assertEqual(acks, {q0.id: 'saved', q1.id: 'saved', self.numeric.id: 'saved'})
+
+        self.assertEqual(UserAnswer.objects.filter(attempt=self.attempt).count(), 3)
+        self.assertEqual(UserAnswer.objects.get(attempt=self.attempt, question=q0).selected_option, self.correct[q0.id])
+        self.assertTrue(UserAnswer.objects.get(attempt=self.attempt, question=q1).is_marked_for_review)
+        self.assertEqual(UserAnswer.objects.get(attempt=self.attempt, question=self.numeric).text_answer, '42')
+
+    def test_batch_rejects_foreign_option_and_question(self):
+        q0, q1, _ = self.questions
+        other_section = TestSection.objects.create(
+            test=MockTestAttributes.objects.create(
+                item=MarketplaceItem.objects.create(title="Other", slug="other", item_type="MOCK_TEST", price=0),
+                duration_minutes=10
+            ),
+            title="Other"
+        )
+        foreign_q = TestQuestion.objects.create(section=other_section, question_text="X")
+
+        response = self.post_batch([
+            {'question_id': q0.id, 'option_id': self.correct[q1.id].id},
+            {'question_id': foreign_q.id},
+        ])
+        statuses = {a['question_id']: a['status'] for a in response.json()['acks']}
+        self.assertEqual(statuses, {q0.id: 'rejected', foreign_q.id: 'rejected'})
+        self.assertFalse(UserAnswer.objects.exists())
+
+    def test_batch_rejects_non_object_body(self):
+        for body in ([], 'x', 3):
+            response = self.client.post(reverse('save_answers_batch'), json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_batch_refused_after_submit(self):
+        self.attempt.status = UserTestAttempt.Status.SUBMITTED
+        self.attempt.save()
+        response = self.post_batch([{'question_id': self.questions[0].id}])
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(
+    ANSWER_WRITE_BEHIND=True,
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'answers': {'BACKEND': 'mocktests.cache_backends.DurableFileBasedCache', 'LOCATION': tempfile.mkdtemp()},
+    },
+)
+class AnswerBufferTests(MockTestFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        caches['answers'].clear()
+
+    def _row(self, question, option=None):
+        return {'question_id': question.id, 'selected_option_id': option and option.id, 'text_answer': '', 'is_marked_for_review': False}
+
+    def test_autosave_is_buffered_until_submit(self):
+        q0 = self.questions[0]
+        response = self.client.post(
+            reverse('save_answer'),
+            json.dumps({'attempt_id': self.attempt.id, 'question_id': q0.id, 'option_id': self.correct[q0.id].id}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.json()['status'], 'saved')
+        self.assertFalse(UserAnswer.objects.exists())
+
+        # Resume shows the buffered answer
+        response = self.client.get(reverse('take_test', args=[self.attempt.id]))
+        self.assertIn(str(q0.id), json.loads(response.context['answers_json']))
+
+        self.client.post(reverse('submit_test', args=[self.attempt.id]))
+        answer = UserAnswer.objects.get(attempt=self.attempt, question=q0)
+        self.assertTrue(answer.is_correct)
+        self.assertEqual(answer_buffer.get_buffered_rows(self.attempt), {})
+
+    def test_timer_flush_only_touches_dirty_attempts(self):
+        q0, q1, _ = self.questions
+        answer_buffer.buffer_answers(self.attempt, [
+            {'question_id': q0.id, 'selected_option_id': self.wrong[q0.id].id, 'text_answer': '', 'is_marked_for_review': False},
+        ])
+        self.assertEqual(answer_buffer.flush_pending(), (1, 1))
+        self.assertEqual(answer_buffer.flush_pending(), (0, 0))
+
+        # A later save re-dirties the attempt and overwrites the earlier row
+        answer_buffer.buffer_answers(self.attempt, [
+            {'question_id': q0.id, 'selected_option_id': self.correct[q0.id].id, 'text_answer': '', 'is_marked_for_review': False},
+            {'question_id': q1.id, 'selected_option_id': None, 'text_answer': '', 'is_marked_for_review': True},
+        ])
+        self.assertEqual(answer_buffer.flush_pending(), (1, 2))
+        self.assertEqual(UserAnswer.objects.get(attempt=self.attempt, question=q0).selected_option, self.correct[q0.id])
+
+        # Crash recovery re-flushes staged rows even without a dirty flag
+        self.assertEqual(answer_buffer.flush_pending(include_clean=True), (1, 2))
+
+    def test_full_store_writes_through_instead_of_evicting(self):
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'answers': {
+                'BACKEND': 'mocktests.cache_backends.DurableFileBasedCache', 'LOCATION': tempfile.mkdtemp(),
+                'OPTIONS': {'MAX_ENTRIES': 3},
+            },
+        }):
+            for q in self.questions + [self.numeric]:
+                self.assertEqual(answer_buffer.buffer_answers(self.attempt, [self._row(q)]), [q.id])
+            # Only the first row (plus the dirty flag) fit the store; the rest went straight to the database
+            self.assertEqual(UserAnswer.objects.filter(attempt=self.attempt).count(), 3)
+            answer_buffer.flush_pending(include_clean=True)
+        self.assertEqual(UserAnswer.objects.filter(attempt=self.attempt).count(), 4)
+
+    def test_save_staged_after_the_submit_flush_is_refused(self):
+        q0 = self.questions[0]
+        # Submit has read the buffer but not yet committed GRADING
+        answer_buffer.flush_attempt(self.attempt, clear=True)
+
+        self.assertIsNone(answer_buffer.buffer_answers(self.attempt, [self._row(q0, self.correct[q0.id])]))
+        response = self.client.post(
+            reverse('save_answer'),
+            json.dumps({'attempt_id': self.attempt.id, 'question_id': q0.id, 'option_id': self.correct[q0.id].id}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(ATTEMPT_TOKEN_CACHE='default')
+class AttemptTokenTests(MockTestFixtureMixin, TestCase):
+    def _save(self, token, option_id):
+        q0 = self.questions[0]
+        return self.client.post(
+            reverse('save_answers_batch'),
+            json.dumps({'attempt_id': self.attempt.id, 'answers': [{'question_id': q0.id, 'option_id': option_id}]}),
+            content_type='application/json', HTTP_X_ATTEMPT_TOKEN=token
+        )
+
+    def test_token_autosave_skips_attempt_lookup_and_is_revoked_on_submit(self):
+        token = self.client.get(reverse('take_test', args=[self.attempt.id])).context['attempt_token']
+        option = self.correct[self.questions[0].id]
+
+        self._save(token, option.id)  # warms the answer key
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._save(token, option.id)
+        self.assertEqual(response.json()['acks'][0]['status'], 'saved')
+        # Validated against the cached answer key, status from the denylist: only session, user and the upsert
+        self.assertEqual(len(ctx.captured_queries), 3)
+        self.assertIn('INSERT', ctx.captured_queries[-1]['sql'])
+        self.assertTrue(UserAnswer.objects.filter(attempt=self.attempt, selected_option=option).exists())
+
+        self.assertEqual(self._save(token[:-2] + 'xx', option.id).status_code, 403)
+
+        self.client.post(reverse('submit_test', args=[self.attempt.id]))
+        response = self._save(token, option.id)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['message'], 'Test already submitted')
+
+    def test_revocation_lands_in_a_full_store(self):
+        location = tempfile.mkdtemp()
+        with override_settings(ATTEMPT_TOKEN_CACHE='answers', CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'answers': {
+                'BACKEND': 'mocktests.cache_backends.DurableFileBasedCache', 'LOCATION': location,
+                'OPTIONS': {'MAX_ENTRIES': 1},
+            },
+        }):
+            caches['answers'].set('filler', True)
+            with self.assertRaises(CacheFull):
+                caches['answers'].set('more', True)
+            token = self.client.get(reverse('take_test', args=[self.attempt.id])).context['attempt_token']
+            self.client.post(reverse('submit_test', args=[self.attempt.id]))
+
+            response = self._save(token, self.correct[self.questions[0].id].id)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(UserAnswer.objects.filter(attempt=self.attempt).exists())
+
+    def test_write_racing_submit_is_not_acknowledged(self):
+        token = self.client.get(reverse('take_test', args=[self.attempt.id])).context['attempt_token']
+        real_bulk_create = UserAnswer.objects.bulk_create
+
+        def submit_during_write(*args, **kwargs):
+            # The token was checked before submit revoked it; the write lands after
+            submit_attempt(self.attempt.id)
+            return real_bulk_create(*args, **kwargs)
+
+        with mock.patch.object(UserAnswer.objects, 'bulk_create', side_effect=submit_during_write):
+            response = self._save(token, self.correct[self.questions[0].id].id)
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(ATTEMPT_TOKEN_CACHE='default', EVENT_BUFFER_CACHE='default')
+class AttemptEventTests(MockTestFixtureMixin, TestCase):
+    def _send(self, token, events):
+        return self.client.post(
+            reverse('record_attempt_events'),
+            json.dumps({'attempt_id': self.attempt.id, 'events': events}),
+            content_type='application/json', HTTP_X_ATTEMPT_TOKEN=token
+        )
+
+    def test_events_are_buffered_then_aggregated_into_question_times(self):
+        token = self.client.get(reverse('take_test', args=[self.attempt.id])).context['attempt_token']
+        q0, q1, _ = self.questions
+        t = 1700000000000
+        first = [
+            {'type': 'focus', 'question_id': q0.id, 't': t},
+            {'type': 'blur', 'question_id': q0.id, 't': t + 30000},
+            {'type': 'focus', 'question_id': q1.id, 't': t + 30000},
+            {'type': 'hidden', 'question_id': q1.id, 't': t + 40000},
+            {'type': 'bogus', 't': t},
+        ]
+        with self.assertNumQueries(2):  # session and user only
+            response = self._send(token, first)
+        self.assertEqual(response.json(), {'status': 'saved', 'accepted': 4, 'malformed': 1})
+
+        self.assertEqual(attempt_events.flush_pending(), 4)
+        self.assertEqual(attempt_events.flush_pending(), 0)
+
+        # Second batch is a client retry of the last event plus new ones; flushed on submit
+        self._send(token, [
+            {'type': 'hidden', 'question_id': q1.id, 't': t + 40000},
+            {'type': 'visible', 'question_id': q1.id, 't': t + 100000},
+            {'type': 'review_on', 'question_id': q1.id, 't': t + 101000},
+            {'type': 'focus', 'question_id': q0.id, 't': t + 105000},
+        ])
+        self.client.post(reverse('submit_test', args=[self.attempt.id]))
+
+        result = AttemptResult.objects.get(attempt=self.attempt)
+        # q0: 30s; q1: 10s before the tab was hidden + 5s after it came back; q0 refocused at the end
+        self.assertEqual(result.question_times, {str(q0.id): 30, str(q1.id): 15})
+        self.assertEqual(result.tab_switches, 1)
+        self.assertEqual(self.attempt.event_logs.count(), 2)
+
+        items = self.client.get(reverse('test_result', args=[self.attempt.id])).context['analysis_list']
+        self.assertEqual([i['time_spent'] for i in items], [30, 15, None, None])
+
+    def test_a_slot_never_written_is_skipped_after_the_grace_period(self):
+        token = self.client.get(reverse('take_test', args=[self.attempt.id])).context['attempt_token']
+        focus = lambda t: [{'type': 'focus', 'question_id': self.questions[0].id, 't': t}]
+        self._send(token, focus(1000))
+        # The next writer takes slot 2 and dies before storing its batch
+        cache.incr(attempt_events._seq_key(self.attempt.id))
+        self._send(token, focus(3000))
+
+        now = time.time()
+        with mock.patch('time.time', return_value=now):
+            self.assertEqual(attempt_events.flush_pending(), 1)
+        with mock.patch('time.time', return_value=now + attempt_events.MISSING_GRACE):
+            self.assertEqual(attempt_events.flush_pending(), 1)
+            self.assertEqual(attempt_events.flush_pending(), 0)
+        self.assertEqual(cache.get(attempt_events._flushed_key(self.attempt.id)), 3)
+        self.assertIsNone(cache.get(attempt_events._gap_key(self.attempt.id, 2)))
+
+    def test_full_buffer_asks_the_client_to_retry(self):
+        token = self.client.get(reverse('take_test', args=[self.attempt.id])).context['attempt_token']
+        with mock.patch('mocktests.attempt_events.buffer_events', side_effect=CacheFull):
+            response = self._send(token, [{'type': 'focus', 'question_id': self.questions[0].id, 't': 1000}])
+        self.assertEqual(response.status_code, 503)
+
+
+class DurableCacheTests(TestCase):
+    def test_concurrent_incr_and_add_never_lose_updates(self):
+        store = DurableFileBasedCache(tempfile.mkdtemp(), {})
+        store.add('seq', 0)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            numbers = list(pool.map(lambda _: store.incr('seq'), range(200)))
+            added = list(pool.map(lambda i: store.add('slot', i), range(50)))
+        self.assertEqual(sorted(numbers), list(range(1, 201)))
+        self.assertEqual(store.get('seq'), 200)
+        self.assertEqual(added.count(True), 1)
+
+    def test_writes_count_the_directory_only_every_recount_interval(self):
+        store = DurableFileBasedCache(tempfile.mkdtemp(), {'OPTIONS': {'MAX_ENTRIES': 20}})
+        with mock.patch.object(store, '_list_cache_files', wraps=store._list_cache_files) as listing:
+            for i in range(10):
+                store.set(f'k{i}', i)
+            self.assertEqual(listing.call_count, 1)
+            # Nearing the limit forces a real count, and a full store still refuses writes
+            with self.assertRaises(CacheFull):
+                for i in range(10, 30):
+                    store.set(f'k{i}', i)
+        self.assertEqual(len(store._list_cache_files()), 20)
+
+    def test_events_from_concurrent_batches_are_all_kept(self):
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'answers': {'BACKEND': 'mocktests.cache_backends.DurableFileBasedCache', 'LOCATION': tempfile.mkdtemp()},
+        }):
+            batches = [attempt_events.pack_events([{'type': 'focus', 'question_id': i, 't': 1000 + i}])[0] for i in range(40)]
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                list(pool.map(lambda data: attempt_events.buffer_events(7, data), batches))
+            slots, pending = attempt_events._pending(caches['answers'], [7])[7]
+        self.assertEqual(slots, range(1, 41))
+        self.assertEqual(sorted(data for _, data in pending), sorted(batches))
+
+
+class ChunkedAudioUploadTests(MockTestFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=tmp, AUDIO_UPLOAD_TEMP_DIR=os.path.join(tmp, 'uploads'))
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.speaking = TestQuestion.objects.create(section=self.section, question_text="Speak", question_type='SPEAKING', sort_order=20)
+
+    def _start(self, total_size, content_type=''):
+        return self.client.post(
+            reverse('start_audio_upload'),
+            json.dumps({'attempt_id': self.attempt.id, 'question_id': self.speaking.id, 'total_size': total_size, 'content_type': content_type}),
+            content_type='application/json'
+        ).json()
+
+    def _chunk(self, url, offset, data):
+        return self.client.post(url, data, content_type='application/octet-stream', HTTP_X_UPLOAD_OFFSET=str(offset))
+
+    @mock.patch('mocktests.audio_uploads.CHUNK_SIZE', 1000)
+    def test_upload_resumes_from_acknowledged_offset(self):
+        audio = (b'RIFF\x00\x00\x00\x00WAVEfmt ' + bytes(range(256)) * 10)[:2560]
+        session = self._start(len(audio))
+        url = reverse('audio_upload_chunk', args=[session['upload_id']])
+
+        self.assertEqual(self._chunk(url, 0, audio[:1000]).json()['offset'], 1000)
+        # A retried chunk is refused with the offset to resume from
+        response = self._chunk(url, 0, audio[:1000])
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 1000))
+        self.assertEqual(self.client.get(url).json()['offset'], 1000)
+
+        self._chunk(url, 1000, audio[1000:2000])
+        response = self._chunk(url, 2000, audio[2000:])
+        self.assertEqual(response.json()['status'], 'uploaded')
+
+        answer = UserAnswer.objects.get(attempt=self.attempt, question=self.speaking)
+        self.assertTrue(answer.audio_answer.name.startswith('answers/audio/'))
+        self.assertTrue(answer.audio_answer.name.endswith('.wav'))
+        with answer.audio_answer.open('rb') as fh:
+            self.assertEqual(fh.read(), audio)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_file_extension_follows_the_audio_format(self):
+        # WebM from MediaRecorder is saved as .webm, by its EBML signature
+        webm = b'\x1a\x45\xdf\xa3' + bytes(96)
+        session = self._start(len(webm), 'audio/webm;codecs=opus')
+        response = self._chunk(reverse('audio_upload_chunk', args=[session['upload_id']]), 0, webm)
+        self.assertTrue(response.json()['url'].endswith('.webm'))
+
+        # An unrecognizable file falls back to the declared type
+        session = self._start(100, 'audio/ogg')
+        response = self._chunk(reverse('audio_upload_chunk', args=[session['upload_id']]), 0, bytes(100))
+        self.assertTrue(response.json()['url'].endswith('.ogg'))
+
+        response = self.client.post(
+            reverse('start_audio_upload'),
+            json.dumps({'attempt_id': self.attempt.id, 'question_id': self.speaking.id, 'total_size': 10, 'content_type': 'text/html'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 415)
+
+
+class PaperSnapshotTests(MockTestFixtureMixin, TestCase):
+    def test_paper_is_cached_and_invalidated_on_edit(self):
+        paper = get_paper(self.test_attr)
+        self.assertEqual(paper['question_count'], 4)
+        self.assertEqual(paper['total_marks'], 16)
+
+        with self.assertNumQueries(0):
+            get_paper(self.test_attr)
+
+        option = self.correct[self.questions[0].id]
+        option.option_text = "Edited"
+        option.save()
+        self.test_attr.refresh_from_db()
+
+        options = get_paper(self.test_attr)['sections'][0]['questions'][0]['options']
+        self.assertIn("Edited", [o['option_text'] for o in options])
+
+    def test_take_test_and_result_render_from_paper(self):
+        q0 = self.questions[0]
+        UserAnswer.objects.create(attempt=self.attempt, question=q0, selected_option=self.correct[q0.id])
+
+        response = self.client.get(reverse('take_test', args=[self.attempt.id]))
+        self.assertContains(response, f'q-block-{q0.id}')
+
+        self.client.post(reverse('submit_test', args=[self.attempt.id]))
+        response = self.client.get(reverse('test_result', args=[self.attempt.id]))
+        self.assertEqual(response.context['correct_answers'], 1)
+        self.assertEqual(response.context['skipped_answers'], 3)
+        self.assertEqual(response.context['total_marks'], 16)
+
+
+class PaperSectionApiTests(MockTestFixtureMixin, TestCase):
+    def test_take_test_preloads_first_section_media_and_lists_the_rest(self):
+        q0, q1, _ = self.questions
+        QuestionMedia.objects.create(question=q0, image='questions/images/circuit.png')
+        option = self.correct[q1.id]
+        option.option_image = 'options/images/graph.png'
+        option.save()
+        chemistry = TestSection.objects.create(test=self.test_attr, title="Chemistry", sort_order=2)
+        late = TestQuestion.objects.create(section=chemistry, question_text="Listen", marks=4, sort_order=1)
+        QuestionAudio.objects.create(question=late, audio_file='questions/audio/clip.mp3')
+        self.test_attr.refresh_from_db()
+
+        response = self.client.get(reverse('take_test', args=[self.attempt.id]))
+        links = response['Link'].split(', ')
+        self.assertEqual(links, [
+            '</media/questions/images/circuit.png>; rel=preload; as=image',
+            '</media/options/images/graph.png>; rel=preload; as=image',
+        ])
+        self.assertEqual(json.loads(response.context['media_manifest_json']), [
+            {'section_id': chemistry.id, 'media': [{'url': '/media/questions/audio/clip.mp3', 'as': 'audio'}]},
+        ])
+        with self.assertNumQueries(0):
+            get_media_manifest(self.test_attr)
+
+    def test_later_sections_are_served_lazily_with_etag(self):
+        chemistry = TestSection.objects.create(test=self.test_attr, title="Chemistry", sort_order=2)
+        late = TestQuestion.objects.create(section=chemistry, question_text="Late", marks=4, sort_order=1)
+        self.test_attr.refresh_from_db()
+
+        # The page carries only the first section's question blocks
+        response = self.client.get(reverse('take_test', args=[self.attempt.id]))
+        self.assertContains(response, f'q-block-{self.questions[0].id}')
+        self.assertNotContains(response, f'q-block-{late.id}')
+
+        url = reverse('paper_section', args=[self.attempt.id, self.test_attr.paper_version, chemistry.id])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['question_ids'], [late.id])
+        self.assertIn(f'q-block-{late.id}', response.json()['html'])
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        # Editing the paper retires the versioned URL
+        late.question_text = "Edited"
+        late.save()
+        self.assertEqual(self.client.get(url).status_code, 409)
+
+
+class GradingTests(MockTestFixtureMixin, TestCase):
+    def test_vectorized_grading_with_negative_marking(self):
+        self.test_attr.has_negative_marking = True
+        self.test_attr.negative_marking_percentage = 0.25
+        self.test_attr.save()
+
+        q0, q1, q2 = self.questions
+        UserAnswer.objects.create(attempt=self.attempt, question=q0, selected_option=self.correct[q0.id])
+        UserAnswer.objects.create(attempt=self.attempt, question=q1, selected_option=self.wrong[q1.id])
+        UserAnswer.objects.create(attempt=self.attempt, question=q2, is_marked_for_review=True)  # skipped
+        UserAnswer.objects.create(attempt=self.attempt, question=self.numeric, text_answer='42.0')
+
+        self.client.post(reverse('submit_test', args=[self.attempt.id]))
+        self.attempt.refresh_from_db()
+
+        # +4 +4 -1 (25% of 4) +0
+        self.assertEqual(self.attempt.score, 7)
+        scores = dict(UserAnswer.objects.filter(attempt=self.attempt).values_list('question_id', 'score_awarded'))
+        self.assertEqual(scores, {q0.id: 4, q1.id: -1, q2.id: 0, self.numeric.id: 4})
+        self.assertTrue(UserAnswer.objects.get(attempt=self.attempt, question=self.numeric).is_correct)
+
+    def test_multi_select_partial_marking(self):
+        MockTestAttributes.objects.filter(pk=self.test_attr.pk).update(
+            exam_type='JEE_ADVANCED', has_negative_marking=True, negative_marking_percentage=0.25
+        )
+        multi = []
+        for i in range(3):
+            q = TestQuestion.objects.create(section=self.section, question_text=f"M{i}", question_type='MULTI', marks=4, sort_order=20 + i)
+            for j in range(4):
+                QuestionOption.objects.create(question=q, option_text=f"O{j}", is_correct=j in (0, 2))
+            multi.append(q)
+
+        response = self.client.post(reverse('save_answers_batch'), json.dumps({'attempt_id': self.attempt.id, 'answers': [
+            {'question_id': multi[0].id, 'option_mask': 0b0101},  # both correct options
+            {'question_id': multi[1].id, 'option_mask': 0b0001},  # one of two, nothing wrong
+            {'question_id': multi[2].id, 'option_mask': 0b0011},  # one wrong option
+            {'question_id': self.questions[0].id, 'option_mask': 0b10000},  # no fifth option
+        ]}), content_type='application/json')
+        acks = {a['question_id']: a['status'] for a in response.json()['acks']}
+        self.assertEqual(acks[self.questions[0].id], 'rejected')
+
+        self.client.post(reverse('submit_test', args=[self.attempt.id]))
+        self.attempt.refresh_from_db()
+        scores = dict(UserAnswer.objects.filter(attempt=self.attempt).values_list('question_id', 'score_awarded'))
+        self.assertEqual([scores[q.id] for q in multi], [4, 1, -2])
+        self.assertEqual(self.attempt.score, 3)
+
+        items = {i['question']['id']: i for i in self.client.get(reverse('test_result', args=[self.attempt.id])).context['analysis_list']}
+        options = [o.id for o in multi[1].options.order_by('id')]
+        self.assertEqual(items[multi[1].id]['selected_options'], [options[0]])
+        self.assertEqual(items[multi[0].id]['status'], 'CORRECT')
+
+    def test_option_bits_survive_option_deletion(self):
+        MockTestAttributes.objects.filter(pk=self.test_attr.pk).update(exam_type='JEE_ADVANCED')
+        q = TestQuestion.objects.create(section=self.section, question_text="M", question_type='MULTI', marks=4, sort_order=20)
+        options = [QuestionOption.objects.create(question=q, option_text=f"O{j}", is_correct=j in (0, 2)) for j in range(4)]
+        self.assertEqual([o.mask_bit for o in options], [0, 1, 2, 3])
+        response = self.client.post(reverse('save_answer'), json.dumps(
+            {'attempt_id': self.attempt.id, 'question_id': q.id, 'option_mask': 1 << options[0].mask_bit | 1 << options[2].mask_bit}
+        ), content_type='application/json')
+        self.assertEqual(response.json()['status'], 'saved')
+        self.client.post(reverse('submit_test', args=[self.attempt.id]))
+        self.assertEqual(UserAnswer.objects.get(attempt=self.attempt, question=q).score_awarded, 4)
+
+        # Deleting an option shifts no other option's bit, so a regrade leaves the answer alone
+        options[1].delete()
+        call_command('regrade_questions', q.id, stdout=StringIO())
+        self.assertEqual(UserAnswer.objects.get(attempt=self.attempt, question=q).score_awarded, 4)
+        items = {i['question']['id']: i for i in self.client.get(reverse('test_result', args=[self.attempt.id])).context['analysis_list']}
+        self.assertEqual(items[q.id]['selected_options'], [options[0].id, options[2].id])
+
+        # A bit still set in a stored answer is not handed to a new option
+        options[0].delete()
+        self.assertEqual(QuestionOption.objects.create(question=q, option_text="O4").mask_bit, 1)
+        self.assertEqual(QuestionOption.objects.create(question=q, option_text="O5").mask_bit, 4)
+
+    def test_single_save_rejects_invalid_answers(self):
+        q0, q1, _ = self.questions
+
+        def save(**payload):
+            return self.client.post(reverse('save_answer'), json.dumps({'attempt_id': self.attempt.id, **payload}), content_type='application/json')
+
+        self.assertEqual(save(question_id=q0.id, option_mask='all').status_code, 400)
+        self.assertEqual(save(question_id=q0.id, option_mask=0b10000).status_code, 400)  # no fifth option
+        self.assertEqual(save(question_id=q0.id, option_id=self.correct[q1.id].id).status_code, 400)
+        self.assertEqual(self.client.post(reverse('save_answer'), '[]', content_type='application/json').status_code, 400)
+        self.assertFalse(UserAnswer.objects.exists())
+        self.assertEqual(save(question_id=q0.id, option_id=self.correct[q0.id].id).json()['status'], 'saved')
+
+    def test_grading_query_count(self):
+        for q in self.questions:
+            UserAnswer.objects.create(attempt=self.attempt, question=q, selected_option=self.correct[q.id])
+        get_exam_strategy('GENERAL').calculate_score(self.attempt)  # warm the paper/key cache
+
+        # One SELECT for the answers, one bulk UPDATE
+        with self.assertNumQueries(2):
+            strategy_result = get_exam_strategy('GENERAL').calculate_score(self.attempt)
+        self.assertEqual(strategy_result['correct_count'], 3)
+
+
+class AttemptResultTests(MockTestFixtureMixin, TestCase):
+    def test_result_is_materialized_at_grading(self):
+        q0, q1, _ = self.questions
+        UserAnswer.objects.create(attempt=self.attempt, question=q0, selected_option=self.correct[q0.id])
+        UserAnswer.objects.create(attempt=self.attempt, question=q1, selected_option=self.wrong[q1.id])
+        self.client.post(reverse('submit_test', args=[self.attempt.id]))
+
+        result = AttemptResult.objects.get(attempt=self.attempt)
+        self.assertEqual((result.correct_count, result.incorrect_count, result.skipped_count), (1, 1, 2))
+        self.assertEqual(result.question_status, 'CWSS')
+        self.assertEqual(result.sections[0]['score'], 4.0)
+        self.assertEqual(result.responses[str(q1.id)], [self.wrong[q1.id].id, None])
+
+        # Later edits to answers do not change the stored result page
+        UserAnswer.objects.filter(attempt=self.attempt).delete()
+        self.client.get(reverse('test_result', args=[self.attempt.id]))  # warm session/paper
+        with self.assertNumQueries(3):  # session, user, attempt + result
+            response = self.client.get(reverse('test_result', args=[self.attempt.id]))
+        items = response.context['analysis_list']
+        self.assertEqual([i['status'] for i in items], ['CORRECT', 'WRONG', 'SKIPPED', 'SKIPPED'])
+        self.assertEqual(items[1]['selected_option_id'], self.wrong[q1.id].id)
+
+    def test_result_is_backfilled_for_legacy_attempts(self):
+        self.client.post(reverse('submit_test', args=[self.attempt.id]))
+        AttemptResult.objects.all().delete()
+        response = self.client.get(reverse('test_result', args=[self.attempt.id]))
+        self.assertEqual(response.context['skipped_answers'], 4)
+        self.assertTrue(AttemptResult.objects.filter(attempt=self.attempt).exists())
+
+
+@override_settings(ASYNC_SUBMISSIONS=True)
+class AsyncSubmissionTests(MockTestFixtureMixin, TestCase):
+    def test_submit_is_queued_and_graded_by_worker(self):
+        q0 = self.questions[0]
+        UserAnswer.objects.create(attempt=self.attempt, question=q0, selected_option=self.correct[q0.id])
+
+        response = self.client.post(reverse('submit_test', args=[self.attempt.id]))
+        self.assertRedirects(response, reverse('exam_feedback', args=[self.attempt.id]))
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.status, UserTestAttempt.Status.GRADING)
+        self.assertIsNotNone(self.attempt.completed_at)
+
+        # Result page shows the processing state until the job completes
+        response = self.client.get(reverse('test_result', args=[self.attempt.id]))
+        self.assertTemplateUsed(response, 'mocktests/result_processing.html')
+        self.assertFalse(self.client.get(reverse('attempt_status', args=[self.attempt.id])).json()['is_ready'])
+
+        # Answers are frozen once submitted
+        response = self.client.post(
+            reverse('save_answers_batch'),
+            json.dumps({'attempt_id': self.attempt.id, 'answers': [{'question_id': q0.id}]}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+        call_command('process_submissions', concurrency=1, stdout=StringIO())
+
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.status, UserTestAttempt.Status.SUBMITTED)
+        self.assertEqual(self.attempt.score, 4)
+        self.assertEqual(SubmissionJob.objects.get(attempt=self.attempt).status, SubmissionJob.Status.DONE)
+        self.assertEqual(UserRankMetric.objects.get(user=self.user).total_xp, 4)
+        self.assertTrue(self.client.get(reverse('attempt_status', args=[self.attempt.id])).json()['is_ready'])
+
+    def test_double_submit_enqueues_once(self):
+        self.client.post(reverse('submit_test', args=[self.attempt.id]))
+        self.client.post(reverse('submit_test', args=[self.attempt.id]))
+        self.assertEqual(SubmissionJob.objects.filter(attempt=self.attempt).count(), 1)
+        self.assertEqual(claim_jobs(10, worker='a'), [SubmissionJob.objects.get().id])
+        self.assertEqual(claim_jobs(10, worker='b'), [])
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'answers': {'BACKEND': 'mocktests.cache_backends.DurableFileBasedCache', 'LOCATION': tempfile.mkdtemp()},
+})
+class LoadTestHarnessTests(TestCase):
+    def test_seeded_sequential_run_reports_every_request(self):
+        out = StringIO()
+        call_command('loadtest_exam', seed=True, candidates=2, concurrency=1, sections=1, questions=5, saves=3, json=True, stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(report['completed'], 2)
+        rows = {row['endpoint']: row for row in report['endpoints']}
+        self.assertEqual(
+            {endpoint: row['requests'] for endpoint, row in rows.items()},
+            {'start_test': 2, 'take_test': 2, 'save_answers_batch': 6, 'submit_test': 2, 'test_result': 2},
+        )
+        self.assertFalse([row for row in rows.values() if row['errors']])
+        self.assertEqual(UserTestAttempt.objects.filter(status=UserTestAttempt.Status.SUBMITTED).count(), 2)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp()},
+    'answers': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+})
+class PrewarmTests(MockTestFixtureMixin, TestCase):
+    def test_prewarm_refuses_a_process_local_cache(self):
+        UserEnrollment.objects.create(user=self.user, item=self.item)
+        self.attempt.delete()
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            with self.assertRaises(CommandError):
+                call_command('prewarm_test', slug=self.item.slug, stdout=StringIO())
+        self.assertFalse(UserTestAttempt.objects.exists())
+
+    def test_unopened_attempts_are_purged_after_the_test_closes(self):
+        UserTestAttempt.objects.filter(pk=self.attempt.pk).update(started_at=None)
+        MockTestAttributes.objects.filter(pk=self.test_attr.pk).update(start_datetime=timezone.now() - timedelta(minutes=90))
+        call_command('prewarm_test', stdout=StringIO())
+        self.assertTrue(UserTestAttempt.objects.filter(pk=self.attempt.pk).exists())
+
+        MockTestAttributes.objects.filter(pk=self.test_attr.pk).update(start_datetime=timezone.now() - timedelta(hours=4))
+        out = StringIO()
+        call_command('prewarm_test', stdout=out)
+        self.assertIn('Deleted 1 pre-created attempts', out.getvalue())
+        self.assertFalse(UserTestAttempt.objects.filter(pk=self.attempt.pk).exists())
+
+    def test_prewarm_precreates_attempts_and_start_uses_cache(self):
+        other = User.objects.create_user(username='other', email='other@test.com', password='password')
+        UserEnrollment.objects.create(user=self.user, item=self.item)
+        UserEnrollment.objects.create(user=other, item=self.item)
+        self.attempt.delete()
+
+        call_command('prewarm_test', slug=self.item.slug, stdout=StringIO())
+        call_command('prewarm_test', slug=self.item.slug, stdout=StringIO())  # idempotent
+
+        attempts = UserTestAttempt.objects.filter(test=self.test_attr, status=UserTestAttempt.Status.IN_PROGRESS)
+        self.assertEqual(attempts.count(), 2)
+        self.assertFalse(attempts.filter(started_at__isnull=False).exists())
+
+        # Cached slug + enrollment: one SELECT for the attempt, one UPDATE for started_at
+        with self.assertNumQueries(2 + 2):  # + session and user lookups
+            response = self.client.get(reverse('start_test', args=[self.item.slug]))
+        attempt = attempts.get(user=self.user)
+        self.assertRedirects(response, reverse('take_test', args=[attempt.id]), fetch_redirect_response=False)
+        self.assertIsNotNone(attempt.started_at)
+
+        # Timer flushes only visit the opened attempt, not the pre-created ones
+        self.assertEqual(answer_buffer.flush_pending(include_clean=True), (1, 0))
+        with CaptureQueriesContext(connection) as ctx:
+            attempt_events.flush_pending()
+        self.assertIn('started_at', ctx.captured_queries[0]['sql'])
+
+
+class DuplicateQuestionTests(MockTestFixtureMixin, TestCase):
+    TEXT = "A ball is thrown vertically upward with a speed of 20 m/s. Find the maximum height reached by the ball."
+    OPTIONS = ["10 m", "20 m", "30 m", "40 m"]
+
+    def setUp(self):
+        # Run the fixture's pending reindex as if its transaction had committed
+        with self.captureOnCommitCallbacks(execute=True):
+            super().setUp()
+
+    def test_saved_question_is_indexed_and_near_duplicates_found(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            q = TestQuestion.objects.create(section=self.section, question_text=self.TEXT, marks=4)
+            for text in self.OPTIONS:
+                QuestionOption.objects.create(question=q, option_text=text)
+        self.assertEqual(q.signature_bands.count(), dedup.BANDS)
+
+        reworded = "<p>A ball is thrown vertically upward with a speed of 20 m/s. Find the maximum height reached by the ball!</p>"
+        matches = dedup.find_duplicates(reworded, self.OPTIONS)
+        self.assertEqual(matches[0][0], q.id)
+        self.assertEqual(dedup.find_duplicates(reworded, self.OPTIONS, exclude=q.id), [])
+        self.assertEqual(dedup.find_duplicates("Define the SI unit of electric charge in terms of current.", ["C", "A"]), [])
+
+        index = dedup.DuplicateIndex.load()
+        self.assertEqual(index.find(reworded, self.OPTIONS)[0], q.id)
+        self.assertIsNone(index.find("Which gas is evolved when zinc reacts with dilute sulphuric acid?"))
+        index.add('new', "Which gas is evolved when zinc reacts with dilute sulphuric acid?")
+        self.assertEqual(index.find("which gas is evolved when zinc reacts with dilute sulphuric acid")[0], 'new')
+
+    def test_reindex_registers_one_callback_per_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            q = TestQuestion.objects.create(section=self.section, question_text=self.TEXT, marks=4)
+            for text in self.OPTIONS:
+                QuestionOption.objects.create(question=q, option_text=text)
+        self.assertEqual([c.question_ids for c in callbacks if isinstance(c, _ReindexBatch)], [{q.id}])
+
+        # A rolled-back savepoint drops its batch; the next write schedules afresh
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                QuestionOption.objects.create(question=self.questions[0], option_text="50 m")
+                raise RuntimeError
+            QuestionOption.objects.create(question=q, option_text="60 m")
+        self.assertEqual([c.question_ids for c in callbacks if isinstance(c, _ReindexBatch)], [{q.id}])
+
+    def test_rebuild_command(self):
+        TestQuestion.objects.create(section=self.section, question_text=self.TEXT, marks=4)
+        call_command('rebuild_question_index', stdout=StringIO())
+        # Every fixture question has text, so every question is indexed
+        self.assertEqual(dedup.QuestionSignature.objects.count(), TestQuestion.objects.count())
+        self.assertEqual(len(dedup.DuplicateIndex.load()), TestQuestion.objects.count())
+
+
+class ItemAnalysisTests(MockTestFixtureMixin, TestCase):
+    # Rows: attempts; columns: fixture MCQs. 1 = correct option, 0 = first wrong option, None = skipped
+    PATTERNS = [(1, 1, 1), (1, 1, 0), (1, 0, None), (0, 1, 0), (1, 0, 0)]
+
+    def test_stats_match_direct_computation_across_chunks(self):
+        self.attempt.delete()
+        for i, pattern in enumerate(self.PATTERNS):
+            user = User.objects.create_user(username=f'cand{i}', email=f'cand{i}@test.com', password='password')
+            attempt = UserTestAttempt.objects.create(user=user, test=self.test_attr, status=UserTestAttempt.Status.SUBMITTED)
+            for q, mark in zip(self.questions, pattern):
+                if mark is not None:
+                    option = self.correct[q.id] if mark else self.wrong[q.id]
+                    UserAnswer.objects.create(attempt=attempt, question=q, selected_option=option, is_correct=bool(mark))
+        # In-progress attempts are ignored
+        UserAnswer.objects.create(attempt=UserTestAttempt.objects.create(user=self.user, test=self.test_attr), question=self.questions[0], is_correct=True)
+
+        self.assertEqual(analyze_test(self.test_attr, chunk_size=2), len(self.PATTERNS))
+
+        matrix = np.array([[1 if m else 0 for m in p] for p in self.PATTERNS], dtype=float)
+        totals = matrix.sum(axis=1)
+        for j, q in enumerate(self.questions):
+            stats = QuestionStats.objects.get(question=q)
+            self.assertEqual(stats.attempts, 5)
+            self.assertAlmostEqual(stats.p_value, matrix[:, j].mean(), places=4)
+            expected = np.corrcoef(matrix[:, j], totals - matrix[:, j])[0, 1]
+            self.assertAlmostEqual(stats.discrimination, expected, places=3)
+        first = QuestionStats.objects.get(question=self.questions[0])
+        self.assertEqual(first.options[str(self.wrong[self.questions[0].id].id)]['count'], 1)
+        self.assertEqual(first.options[str(self.correct[self.questions[0].id].id)]['count'], 4)
+
+        third = QuestionStats.objects.get(question=self.questions[2])
+        self.assertEqual(third.answered, 4)
+        self.assertEqual(third.suggested_difficulty, 'HARD')
+        # Nobody answered the numeric question: no variance, no discrimination
+        self.assertIsNone(QuestionStats.objects.get(question=self.numeric).discrimination)
+
+    def test_multi_answers_count_every_option_in_the_mask(self):
+        self.attempt.delete()
+        q = TestQuestion.objects.create(section=self.section, question_text="M", question_type='MULTI', marks=4, sort_order=20)
+        options = [QuestionOption.objects.create(question=q, option_text=f"O{j}", is_correct=j in (0, 2)) for j in range(4)]
+        options[1].delete()  # bits stay 0, 2, 3
+        for i, picks in enumerate([(0, 2), (0,), (2, 3), ()]):
+            user = User.objects.create_user(username=f'multi{i}', email=f'multi{i}@test.com', password='password')
+            attempt = UserTestAttempt.objects.create(user=user, test=self.test_attr, status=UserTestAttempt.Status.SUBMITTED)
+            mask = sum(1 << options[j].mask_bit for j in picks)
+            UserAnswer.objects.create(attempt=attempt, question=q, selected_mask=mask, is_correct=picks == (0, 2))
+
+        analyze_test(self.test_attr, chunk_size=3)
+        stats = QuestionStats.objects.get(question=q)
+        self.assertEqual(stats.answered, 3)
+        counts = {int(pk): o['count'] for pk, o in stats.options.items()}
+        self.assertEqual(counts, {options[0].id: 2, options[2].id: 2, options[3].id: 1})
+        # Only the fully correct pick scored: its options pick against the higher total
+        self.assertGreater(stats.options[str(options[0].id)]['discrimination'], stats.options[str(options[3].id)]['discrimination'])
+
+
+class ScorePercentileTests(MockTestFixtureMixin, TestCase):
+    def _graded_attempt(self, user, correct):
+        attempt = UserTestAttempt.objects.create(user=user, test=self.test_attr)
+        for q in self.questions[:correct]:
+            UserAnswer.objects.create(attempt=attempt, question=q, selected_option=self.correct[q.id])
+        return submit_attempt(attempt.id)
+
+    def test_histogram_is_updated_on_grading_and_matches_rebuild(self):
+        others = [User.objects.create_user(username=f'p{i}', email=f'p{i}@test.com', password='x') for i in range(3)]
+        for user, correct in zip(others, (0, 1, 3)):
+            self._graded_attempt(user, correct)
+        # A retake replaces the candidate's previous score
+        self._graded_attempt(others[0], 2)
+        self.attempt.delete()
+        mine = self._graded_attempt(self.user, 2)  # 8 marks
+
+        hist = ScoreHistogram.objects.get(test=self.test_attr)
+        self.assertEqual(hist.total, 4)
+        self.assertEqual(hist.counts[percentiles._bin(hist, 8)], 2)
+        # The incremental histogram may keep empty bins the rebuild trims
+        rebuilt = percentiles.rebuild(self.test_attr)
+        for score in (0, 4, 8, 12, 16):
+            self.assertEqual(percentiles.standing(rebuilt, score), percentiles.standing(hist, score))
+
+        # Scores 4, 8, 8, 12: one lower, two tied
+        self.assertEqual(percentiles.standing(hist, 8), {'percentile': 50.0, 'beat': 25.0, 'total': 4})
+        response = self.client.get(reverse('test_result', args=[mine.id]))
+        self.assertEqual(response.context['standing']['beat'], 25.0)
+
+        response = self.client.get(reverse('leaderboard_slug', args=[self.item.slug]))
+        self.assertEqual(response.context['user_stats']['standing']['percentile'], 50.0)
+
+
+class SweepExpiredTests(MockTestFixtureMixin, TestCase):
+    def test_sweeper_submits_only_expired_attempts(self):
+        started = timezone.now() - timedelta(minutes=90)
+        UserTestAttempt.objects.filter(pk=self.attempt.pk).update(started_at=started)
+        q0 = self.questions[0]
+        UserAnswer.objects.create(attempt=self.attempt, question=q0, selected_option=self.correct[q0.id])
+
+        other = User.objects.create_user(username='fresh', email='fresh@test.com', password='x')
+        fresh = UserTestAttempt.objects.create(user=other, test=self.test_attr)
+        unstarted = UserTestAttempt.objects.create(user=other, test=self.test_attr, started_at=None)
+
+        out = StringIO()
+        call_command('sweep_expired_attempts', stdout=out)
+        self.assertIn('Auto-submitted 1 expired attempts', out.getvalue())
+
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.status, UserTestAttempt.Status.SUBMITTED)
+        self.assertEqual(self.attempt.score, 4)
+        # Time taken is the full duration, not the time of the sweep
+        self.assertEqual(self.attempt.completed_at, started + timedelta(minutes=60))
+        self.assertTrue(AttemptResult.objects.filter(attempt=self.attempt).exists())
+        for attempt in (fresh, unstarted):
+            attempt.refresh_from_db()
+            self.assertEqual(attempt.status, UserTestAttempt.Status.IN_PROGRESS)
+
+        call_command('sweep_expired_attempts', stdout=out)
+        self.assertIn('Auto-submitted 0 expired attempts', out.getvalue())
+
+    def test_failed_inline_grading_shows_processing_and_is_retried_by_the_sweeper(self):
+        with mock.patch('mocktests.submissions.finalize_attempt', side_effect=RuntimeError('boom')):
+            response = self.client.post(reverse('submit_test', args=[self.attempt.id]))
+        self.assertRedirects(response, reverse('exam_feedback', args=[self.attempt.id]), fetch_redirect_response=False)
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.status, UserTestAttempt.Status.GRADING)
+        job = self.attempt.submission_job
+        self.assertEqual((job.status, job.tries), (SubmissionJob.Status.PENDING, 1))
+        self.assertIn('boom', job.last_error)
+        self.assertTemplateUsed(self.client.get(reverse('test_result', args=[self.attempt.id])), 'mocktests/result_processing.html')
+
+        # Not retried while it may still be in flight
+        out = StringIO()
+        call_command('sweep_expired_attempts', stdout=out)
+        self.assertIn('Retried grading of 0 stalled attempts', out.getvalue())
+
+        long_ago = timezone.now() - timedelta(hours=2)
+        UserTestAttempt.objects.filter(pk=self.attempt.pk).update(modified=long_ago)
+        call_command('sweep_expired_attempts', stdout=out)
+        self.assertIn('Retried grading of 1 stalled attempts', out.getvalue())
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.status, UserTestAttempt.Status.SUBMITTED)
+
+    def test_sweeper_does_not_retry_jobs_out_of_tries(self):
+        with mock.patch('mocktests.submissions.finalize_attempt', side_effect=RuntimeError('boom')):
+            submit_attempt(self.attempt.id)
+            long_ago = timezone.now() - timedelta(hours=2)
+            UserTestAttempt.objects.filter(pk=self.attempt.pk).update(modified=long_ago)
+            for _ in range(5):
+                call_command('sweep_expired_attempts', stdout=StringIO())
+        job = SubmissionJob.objects.get(attempt=self.attempt)
+        self.assertEqual((job.status, job.tries), (SubmissionJob.Status.FAILED, MAX_TRIES))
+
+
+ESSAY = (
+    "Some people believe that technology has made our lives easier, while others argue it has made them more complicated.\n\n"
+    "Firstly, modern devices save time. For example, online banking allows customers to pay bills within seconds, "
+    "whereas previously they had to queue at a branch. Moreover, communication across continents is now instant and cheap.\n\n"
+    "However, constant connectivity creates new pressures. Employees often feel obliged to answer emails late at night, "
+    "and therefore their working day never truly ends. Consequently, stress levels have risen in many professions.\n\n"
+    "In conclusion, although technology brings undeniable convenience, individuals must set clear boundaries to benefit from it."
+)
+
+
+class EssayScoringTests(MockTestFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.essay_q = TestQuestion.objects.create(
+            section=self.section, question_text="Write at least 120 words.", question_type='ESSAY', marks=9, sort_order=20
+        )
+        q0 = self.questions[0]
+        UserAnswer.objects.create(attempt=self.attempt, question=q0, selected_option=self.correct[q0.id])
+        self.essay = UserAnswer.objects.create(attempt=self.attempt, question=self.essay_q, text_answer=ESSAY)
+
+    def test_heuristic_rubric_rewards_developed_essays(self):
+        scorer = essay_scoring.HeuristicEssayScorer()
+        good, short = scorer.score([
+            {'answer_id': 1, 'prompt': 'Write at least 120 words.', 'text': ESSAY, 'max_marks': 9},
+            {'answer_id': 2, 'prompt': 'Write at least 120 words.', 'text': 'Technology is good. I like it.', 'max_marks': 9},
+        ])
+        self.assertGreaterEqual(good['band'], 6)
+        self.assertLess(short['band'], 3)
+        self.assertEqual(set(good['criteria']), {'task', 'coherence', 'lexical', 'grammar'})
+        self.assertEqual(good['marks'], good['band'])
+
+    def test_sync_submit_scores_essays_and_retotals(self):
+        submit_attempt(self.attempt.id)
+        self.attempt.refresh_from_db()
+        self.essay.refresh_from_db()
+        job = EssayScoringJob.objects.get(answer=self.essay)
+        self.assertEqual(job.status, EssayScoringJob.Status.DONE)
+        self.assertEqual(job.scorer, 'heuristic')
+        self.assertGreater(self.essay.score_awarded, 0)
+        self.assertEqual(self.attempt.score, 4 + self.essay.score_awarded)
+        self.assertEqual(UserRankMetric.objects.get(user=self.user).total_xp, int(self.attempt.score))
+        self.assertEqual(ScoreHistogram.objects.get(test=self.test_attr).total, 1)
+
+    @override_settings(ASYNC_SUBMISSIONS=True)
+    @mock.patch('mocktests.services.BaseExamStrategy.passed', return_value=None)
+    def test_pass_flag_follows_the_essay_score(self, _):
+        # Pass mark 5: the MCQ alone (4) fails, the scored essay lifts it over
+        MockTestAttributes.objects.filter(pk=self.test_attr.pk).update(pass_percentage=5)
+        submit_attempt(self.attempt.id)
+        call_command('process_submissions', concurrency=1, stdout=StringIO())
+        self.attempt.refresh_from_db()
+        self.assertFalse(self.attempt.is_passed)
+
+        call_command('score_essays', concurrency=1, stdout=StringIO())
+        self.attempt.refresh_from_db()
+        self.assertGreater(self.attempt.score, 5)
+        self.assertTrue(self.attempt.is_passed)
+
+    @override_settings(ASYNC_SUBMISSIONS=True)
+    def test_worker_scores_in_batches_and_retries_scorer_errors(self):
+        submit_attempt(self.attempt.id)
+        call_command('process_submissions', concurrency=1, stdout=StringIO())
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.score, 4)
+        self.assertEqual(EssayScoringJob.objects.get().status, EssayScoringJob.Status.PENDING)
+
+        with override_settings(ESSAY_SCORER_URL='http://scorer.test/score'), \
+                mock.patch('mocktests.essay_scoring.requests.post', side_effect=ConnectionError('down')):
+            job_ids = claim_jobs(10, model=EssayScoringJob)
+            self.assertEqual(essay_scoring.score_batch(job_ids, essay_scoring.RemoteEssayScorer()), 'FAILED')
+        job = EssayScoringJob.objects.get()
+        self.assertEqual((job.status, job.tries), (EssayScoringJob.Status.PENDING, 1))
+
+        out = StringIO()
+        call_command('score_essays', concurrency=1, stdout=out)
+        self.assertIn('1 scored', out.getvalue())
+        self.attempt.refresh_from_db()
+        self.assertGreater(self.attempt.score, 4)
+        self.assertEqual(AttemptResult.objects.get(attempt=self.attempt).sections[0]['score'], float(self.attempt.score))
+
+
+class IELTSBandTests(MockTestFixtureMixin, TestCase):
+    class FixedScorer(essay_scoring.EssayScorer):
+        def score(self, essays):
+            return [{'marks': round(float(e['max_marks']) * 6.5 / 9, 2), 'band': 6.5, 'criteria': {}} for e in essays]
+
+    def test_tables_and_rounding(self):
+        listening = bands.conversion('2024', 'LISTENING')
+        self.assertEqual((listening[0], listening[30], listening[31], listening[40]), (0.0, 7.0, 7.0, 9.0))
+        self.assertEqual(bands.conversion('2024', 'READING_GENERAL')[30], 6.0)
+        self.assertEqual(bands.overall_band([6.5, 6.5, 5.0, 7.0]), 6.5)   # 6.25 rounds up
+        self.assertEqual(bands.overall_band([6.5, 7.0, 7.0, 7.0]), 7.0)   # 6.875
+        self.assertEqual(bands.overall_band([6.0, 6.0, 6.0, 6.5]), 6.0)   # 6.125 rounds down
+
+    @override_settings(ASYNC_SUBMISSIONS=True)
+    def test_bands_are_scored_and_updated_when_writing_is_marked(self):
+        MockTestAttributes.objects.filter(pk=self.test_attr.pk).update(exam_type='IELTS')
+        TestSection.objects.filter(pk=self.section.pk).update(title="Listening Part 1")
+        writing = TestSection.objects.create(test=self.test_attr, title="Task 2", subject='WRITING', sort_order=2)
+        essay_q = TestQuestion.objects.create(section=writing, question_text="Write at least 250 words.", question_type='ESSAY', marks=9)
+        for q in self.questions:
+            UserAnswer.objects.create(attempt=self.attempt, question=q, selected_option=self.correct[q.id])
+        UserAnswer.objects.create(attempt=self.attempt, question=essay_q, text_answer=ESSAY)
+
+        submit_attempt(self.attempt.id)
+        call_command('process_submissions', concurrency=1, stdout=StringIO())
+        self.attempt.refresh_from_db()
+        # 3 of 4 listening answers: 30 of 40 -> 7.0; writing not scored yet, so left out of the overall
+        details = AttemptResult.objects.get(attempt=self.attempt).score_details
+        self.assertEqual((details['raw']['listening'], details['listening'], details['writing']), (30, 7.0, None))
+        self.assertEqual(details['pending'], ['writing'])
+        self.assertEqual(float(self.attempt.score), 7.0)
+        # Band 4.5 is the pass mark at pass_percentage 50
+        self.assertTrue(self.attempt.is_passed)
+        response = self.client.get(reverse('test_result', args=[self.attempt.id]))
+        self.assertEqual(response.context['bands'], [('Listening', 7.0, 30), ('Writing', None, None)])
+        self.assertContains(response, 'Pending')
+
+        essay_scoring.score_batch(claim_jobs(10, model=EssayScoringJob), self.FixedScorer())
+        self.attempt.refresh_from_db()
+        # (7.0 + 6.5) / 2 = 6.75 -> 7.0: the overall holds but the result now shows the Writing band
+        self.assertEqual(float(self.attempt.score), 7.0)
+        self.assertTrue(self.attempt.is_passed)
+        hist = ScoreHistogram.objects.get(test=self.test_attr)
+        self.assertEqual(hist.counts[percentiles._bin(hist, 7.0)], 1)
+
+        response = self.client.get(reverse('test_result', args=[self.attempt.id]))
+        self.assertTemplateUsed(response, 'mocktests/exams/ielts/result.html')
+        self.assertEqual(response.context['bands'], [('Listening', 7.0, 30), ('Writing', 6.5, None)])
+        self.assertFalse(response.context['pending_essays'])
+
+    def test_blank_writing_is_band_zero_not_pending(self):
+        MockTestAttributes.objects.filter(pk=self.test_attr.pk).update(exam_type='IELTS')
+        TestSection.objects.filter(pk=self.section.pk).update(title="Listening Part 1")
+        writing = TestSection.objects.create(test=self.test_attr, title="Task 2", subject='WRITING', sort_order=2)
+        TestQuestion.objects.create(section=writing, question_text="Write at least 250 words.", question_type='ESSAY', marks=9)
+        for q in self.questions:
+            UserAnswer.objects.create(attempt=self.attempt, question=q, selected_option=self.correct[q.id], is_correct=True)
+
+        details = bands.band_scores(self.test_attr, [self.attempt.id])[self.attempt.id]
+        self.assertEqual((details['writing'], details['pending'], details['overall']), (0.0, [], 3.5))
+
+    def test_examiner_marks_saved_in_the_admin_retotal_the_attempt(self):
+        MockTestAttributes.objects.filter(pk=self.test_attr.pk).update(exam_type='IELTS')
+        TestSection.objects.filter(pk=self.section.pk).update(title="Listening Part 1")
+        speaking = TestSection.objects.create(test=self.test_attr, title="Speaking", subject='SPEAKING', sort_order=2)
+        speak_q = TestQuestion.objects.create(section=speaking, question_text="Describe a place.", question_type='ESSAY', marks=9)
+        for q in self.questions:
+            UserAnswer.objects.create(attempt=self.attempt, question=q, selected_option=self.correct[q.id])
+        answer = UserAnswer.objects.create(attempt=self.attempt, question=speak_q, text_answer="A transcript.")
+        submit_attempt(self.attempt.id)
+        self.attempt.refresh_from_db()
+        self.assertEqual((float(self.attempt.score), self.attempt.is_passed), (7.0, True))
+
+        User.objects.create_superuser(username='examiner', email='examiner@test.com', password='password')
+        self.client.login(username='examiner', password='password')
+        url = reverse('admin:mocktests_usertestattempt_change', args=[self.attempt.id])
+        page = self.client.get(url).context
+        data = {k: v for k, v in page['adminform'].form.initial.items() if v is not None}
+        data['user'], data['test'] = self.attempt.user_id, self.attempt.test_id
+        for formset in page['inline_admin_formsets']:
+            management = formset.formset.management_form
+            data.update({f'{management.prefix}-{k}': v for k, v in management.initial.items()})
+            for form in formset.formset.forms:
+                # An empty audio field is left out, as a browser would send it
+                data.update({f'{form.prefix}-{k}': v for k, v in form.initial.items() if v is not None and k != 'audio_answer'})
+                data[f'{form.prefix}-id'] = form.instance.pk
+                if form.instance.pk == answer.pk:
+                    data[f'{form.prefix}-score_awarded'] = '1.00'
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+
+        # Speaking 1 of 9 -> band 1.0; (7.0 + 1.0) / 2 = 4.0, under the 4.5 pass mark
+        self.attempt.refresh_from_db()
+        self.assertEqual((float(self.attempt.score), self.attempt.is_passed), (4.0, False))
+        details = AttemptResult.objects.get(attempt=self.attempt).score_details
+        self.assertEqual((details['speaking'], details['pending']), (1.0, []))
+
+
+class RegradeTests(MockTestFixtureMixin, TestCase):
+    def test_corrected_key_regrades_scores_results_and_leaderboard(self):
+        q0, q1, _ = self.questions
+        other = User.objects.create_user(username='other', email='other@test.com', password='x')
+        UserAnswer.objects.create(attempt=self.attempt, question=q0, selected_option=self.correct[q0.id])
+        mine = submit_attempt(self.attempt.id)
+        theirs = UserTestAttempt.objects.create(user=other, test=self.test_attr)
+        UserAnswer.objects.create(attempt=theirs, question=q0, selected_option=self.wrong[q0.id])
+        UserAnswer.objects.create(attempt=theirs, question=q1, selected_option=self.correct[q1.id])
+        theirs = submit_attempt(theirs.id)
+        self.assertEqual((mine.score, theirs.score), (4, 4))
+
+        # The key had it backwards
+        QuestionOption.objects.filter(pk=self.correct[q0.id].pk).update(is_correct=False)
+        option = self.wrong[q0.id]
+        option.is_correct = True
+        option.save()
+
+        out = StringIO()
+        call_command('regrade_questions', q0.id, dry_run=True, stdout=out)
+        self.assertIn('2 answers would change', out.getvalue())
+        call_command('regrade_questions', q0.id, stdout=out)
+        self.assertIn('2 answers, 2 attempt scores, 2 leaderboard entries', out.getvalue())
+
+        mine.refresh_from_db()
+        theirs.refresh_from_db()
+        self.assertEqual((mine.score, theirs.score), (0, 8))
+        result = AttemptResult.objects.get(attempt=theirs)
+        self.assertEqual((result.correct_count, result.incorrect_count), (2, 0))
+        self.assertEqual(result.sections[0]['score'], 8.0)
+        hist = ScoreHistogram.objects.get(test=self.test_attr)
+        rebuilt = percentiles.rebuild(self.test_attr)
+        for score in (0, 4, 8):
+            self.assertEqual(percentiles.standing(hist, score), percentiles.standing(rebuilt, score))
+        self.assertEqual(percentiles.standing(hist, 8)['beat'], 50.0)
+
+        # The incremental leaderboard matches a full recalculation
+        shifted = {m.user_id: (m.total_xp, m.avg_score) for m in UserRankMetric.objects.all()}
+        for user in (self.user, other):
+            recalculate_user_rank(user)
+        self.assertEqual(shifted, {m.user_id: (m.total_xp, m.avg_score) for m in UserRankMetric.objects.all()})
+        self.assertEqual(shifted[other.id][0], 8)
+
+    def test_regrade_updates_the_pass_flag(self):
+        MockTestAttributes.objects.filter(pk=self.test_attr.pk).update(exam_type='IELTS')
+        TestSection.objects.filter(pk=self.section.pk).update(title="Listening Part 1")
+        q0, q1, _ = self.questions
+        UserAnswer.objects.create(attempt=self.attempt, question=q0, selected_option=self.correct[q0.id])
+        UserAnswer.objects.create(attempt=self.attempt, question=q1, selected_option=self.wrong[q1.id])
+        attempt = submit_attempt(self.attempt.id)
+        # 1 of 4 listening answers: 10 of 40 -> band 4.0, below the 4.5 pass mark
+        self.assertEqual((attempt.score, attempt.is_passed), (4, False))
+
+        option = self.wrong[q1.id]
+        option.is_correct = True
+        option.save()
+        call_command('regrade_questions', q1.id, stdout=StringIO())
+        attempt.refresh_from_db()
+        # 2 of 4: 20 of 40 -> band 5.5
+        self.assertEqual((attempt.score, attempt.is_passed), (Decimal('5.5'), True))
+
+    def test_leaderboard_xp_follows_the_exact_sum_of_fractional_scores(self):
+        item = MarketplaceItem.objects.create(title="Mock 2", slug="mock-2", item_type="MOCK_TEST", is_active=True, price=10)
+        UserTestAttempt.objects.create(
+            user=self.user, test=MockTestAttributes.objects.create(item=item, duration_minutes=60),
+            status=UserTestAttempt.Status.SUBMITTED, score=Decimal('10.5')
+        )
+        multi = []
+        for i, key in enumerate(((0, 1, 2), (0, 1, 2, 3))):
+            q = TestQuestion.objects.create(section=self.section, question_text=f"M{i}", question_type='MULTI', marks=2, sort_order=20 + i)
+            for j in range(4):
+                QuestionOption.objects.create(question=q, option_text=f"O{j}", is_correct=j in key)
+            UserAnswer.objects.create(attempt=self.attempt, question=q, selected_mask=0b0111)
+            multi.append(q)
+        # Full marks on the first question, three of four options (1.5) on the second
+        self.assertEqual(submit_attempt(self.attempt.id).score, Decimal('3.5'))
+        self.assertEqual(UserRankMetric.objects.get(user=self.user).total_xp, 14)
+
+        # A fourth correct option drops the first question to 1.5: 10.5 + 3.0 = 13.5
+        option = multi[0].options.get(option_text="O3")
+        option.is_correct = True
+        option.save()
+        call_command('regrade_questions', multi[0].id, stdout=StringIO())
+        metric = UserRankMetric.objects.get(user=self.user)
+        self.assertEqual(metric.total_xp, 13)
+        recalculate_user_rank(self.user)
+        metric.refresh_from_db()
+        self.assertEqual(metric.total_xp, 13)
+
+
+class PracticeDrillTests(MockTestFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        UserEnrollment.objects.create(user=self.user, item=self.item)
+
+    def test_drill_skips_mastered_questions_and_stores_answers_compactly(self):
+        q0, q1, q2 = self.questions
+        UserAnswer.objects.create(attempt=self.attempt, question=q0, selected_option=self.correct[q0.id], is_correct=True)
+        topics = self.client.get(reverse('practice_home')).context['topics']
+        self.assertEqual([(t['exam_type'], t['topic'], t['count']) for t in topics], [('GENERAL', 'Physics', 3)])
+
+        response = self.client.post(reverse('practice_home'), {'exam_type': 'GENERAL', 'topic': 'physics', 'size': 10})
+        drill = PracticeDrill.objects.get()
+        self.assertRedirects(response, reverse('practice_drill', args=[drill.id]))
+        question_ids, _, _ = drills.unpack(drill)
+        self.assertEqual(sorted(question_ids.tolist()), [q1.id, q2.id])
+        self.assertEqual(len(self.client.get(reverse('practice_drill', args=[drill.id])).context['items']), 2)
+
+        self.client.post(reverse('practice_drill', args=[drill.id]), {f'q_{q1.id}': self.correct[q1.id].id, f'q_{q2.id}': self.wrong[q2.id].id})
+        drill.refresh_from_db()
+        _, selected, correct = drills.unpack(drill)
+        self.assertEqual(drill.score, 1)
+        self.assertEqual(dict(zip(question_ids.tolist(), correct.tolist())), {q1.id: True, q2.id: False})
+        self.assertEqual(len(bytes(drill.correct)), 1)
+
+        # Only the question still answered wrong is left
+        again = drills.build_drill(self.user, 'GENERAL', 'Physics')
+        self.assertEqual(drills.unpack(again)[0].tolist(), [q2.id])
+
+    def test_pools_are_rebuilt_when_a_paper_changes(self):
+        q0 = self.questions[0]
+        self.assertEqual(len(drills.get_pool('GENERAL', 'Physics', 'MEDIUM')[0]), 3)
+        new = TestQuestion.objects.create(section=self.section, question_text="Q-hard", difficulty='HARD')
+        drills.get_pool('GENERAL', 'Physics', 'HARD')
+        # A cached pool costs only the stamp query
+        with self.assertNumQueries(1):
+            self.assertEqual(drills.get_pool('GENERAL', 'Physics', 'HARD')[0].tolist(), [new.id])
+
+        # The stamp lives in the database, so an edit made by any process retires the cached pools
+        new2 = TestQuestion.objects.create(section=self.section, question_text="Q-hard-2", difficulty='HARD')
+        ids, test_ids = drills.get_pool('GENERAL', 'Physics', 'HARD')
+        self.assertEqual(ids.tolist(), [new.id, new2.id])
+        self.assertEqual(test_ids.tolist(), [self.test_attr.pk] * 2)
+
+        TestQuestion.objects.filter(pk=q0.pk).update(difficulty='HARD')
+        MockTestAttributes.objects.filter(pk=self.test_attr.pk).update(paper_version=self.test_attr.paper_version + 10)
+        self.assertNotIn(q0.id, drills.get_pool('GENERAL', 'Physics', 'MEDIUM')[0])
+        self.assertIn(q0.id, drills.get_pool('GENERAL', 'Physics', 'HARD')[0])
+
+    def test_drills_only_use_tests_the_user_may_access(self):
+        UserEnrollment.objects.filter(user=self.user).delete()
+        free = MarketplaceItem.objects.create(title="Free Mock", slug="free-mock", item_type="MOCK_TEST", is_active=True, price=0)
+        free_section = TestSection.objects.create(
+            test=MockTestAttributes.objects.create(item=free, duration_minutes=60), title="Physics", sort_order=1
+        )
+        free_q = TestQuestion.objects.create(section=free_section, question_text="Free Q", sort_order=1)
+        retired = MarketplaceItem.objects.create(title="Old Mock", slug="old-mock", item_type="MOCK_TEST", is_active=False, price=0)
+        retired_section = TestSection.objects.create(
+            test=MockTestAttributes.objects.create(item=retired, duration_minutes=60), title="Physics", sort_order=1
+        )
+        TestQuestion.objects.create(section=retired_section, question_text="Retired Q", sort_order=1)
+
+        # Only the free, active test counts: not the paid one without enrollment, nor the inactive one
+        topics = self.client.get(reverse('practice_home')).context['topics']
+        self.assertEqual([(t['topic'], t['count']) for t in topics], [('Physics', 1)])
+        drill = drills.build_drill(self.user, 'GENERAL', 'Physics', size=10)
+        self.assertEqual(drills.unpack(drill)[0].tolist(), [free_q.id])
+
+        free.is_active = False
+        free.save()
+        self.assertEqual(self.client.get(reverse('practice_home')).context['topics'], [])
+        response = self.client.post(reverse('practice_home'), {'exam_type': 'GENERAL', 'topic': 'Physics'})
+        self.assertRedirects(response, reverse('practice_home'))
+        self.assertEqual(PracticeDrill.objects.count(), 1)
+
+        UserEnrollment.objects.create(user=self.user, item=self.item)
+        drill = drills.build_drill(self.user, 'GENERAL', 'Physics', size=10)
+        self.assertEqual(sorted(drills.unpack(drill)[0].tolist()), sorted(q.id for q in self.questions))
+
+
+class NormalizationTests(MockTestFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        normalization.clear_tables()
+        self.shift_set = ShiftSet.objects.create(name="JEE Main January", slug="jee-main-january")
+        MockTestAttributes.objects.filter(pk=self.test_attr.pk).update(exam_type='JEE_MAINS', shift_set=self.shift_set)
+        self.test_attr.refresh_from_db()
+        item = MarketplaceItem.objects.create(title="JEE Mock 1 Shift 2", slug="jee-mock-1-s2", item_type="MOCK_TEST", is_active=True, price=10)
+        self.shift2 = MockTestAttributes.objects.create(item=item, exam_type='JEE_MAINS', shift_set=self.shift_set, duration_minutes=60)
+
+    def _histogram(self, test, scores):
+        hist = ScoreHistogram(test=test, bin_width=1)
+        for score in scores:
+            percentiles._add(hist, score, 1)
+        hist.save()
+        return hist
+
+    def test_percentile_within_shift_and_rank_across_shifts(self):
+        self._histogram(self.test_attr, [4, 8, 16])
+        shift2 = self._histogram(self.shift2, [20, 30, 40, 50])
+        for q in self.questions:
+            UserAnswer.objects.create(attempt=self.attempt, question=q, selected_option=self.correct[q.id])
+        attempt = submit_attempt(self.attempt.id)  # 12 marks
+
+        # Shift 1 is 4, 8, 12, 16: three of four at or below 12
+        response = self.client.get(reverse('test_result', args=[attempt.id]))
+        normalized = response.context['normalized']
+        self.assertEqual(normalized['percentile'], 75.0)
+        # Only the toppers of both shifts (100) are above 75
+        self.assertEqual((normalized['rank'], normalized['candidates'], normalized['shifts']), (3, 8, 2))
+
+        # A new shift 2 score rebuilds that shift alone: 20, 30, 40, 50, 60 now sit at 20, 40, 60, 80, 100
+        percentiles._add(shift2, 60, 1)
+        shift2.save()
+        with self.assertNumQueries(2):
+            table = normalization.get_table(self.shift_set.id)
+        self.assertEqual(table.percentile(self.shift2.pk, 40), 60.0)
+        self.assertEqual(table.predicted_rank(75.0), 4)
+        with self.assertNumQueries(1):
+            normalization.get_table(self.shift_set.id)
+
+
+class SATAdaptiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_answer_keys()
+        self.user = User.objects.create_user(username='sat', email='sat@test.com', password='password')
+        self.client.login(email='sat@test.com', password='password')
+        item = MarketplaceItem.objects.create(title="SAT 1", slug="sat-1", item_type="MOCK_TEST", is_active=True, price=10)
+        self.test_attr = MockTestAttributes.objects.create(
+            item=item, exam_type='SAT_ADAPTIVE', duration_minutes=134,
+            score_tables={'MATH': {'threshold': 2, 'M2_EASY': [200, 300, 400, 500, 600], 'M2_HARD': [200, 350, 500, 650, 800]}}
+        )
+        self.sections = {}
+        self.keys = {}
+        for order, module in enumerate(['M1', 'M2_EASY', 'M2_HARD']):
+            section = TestSection.objects.create(test=self.test_attr, title=f"Math {module}", sort_order=order, subject='MATH', module=module)
+            self.sections[module] = section
+            for i in range(2):
+                q = TestQuestion.objects.create(section=section, question_text=f"{module}-{i}", sort_order=i)
+                QuestionOption.objects.create(question=q, option_text="wrong")
+                self.keys[q.id] = QuestionOption.objects.create(question=q, option_text="right", is_correct=True)
+        self.attempt = UserTestAttempt.objects.create(user=self.user, test=self.test_attr)
+
+    def answer_all(self, module):
+        for q in self.sections[module].questions.all():
+            UserAnswer.objects.create(attempt=self.attempt, question=q, selected_option=self.keys[q.id])
+
+    def route(self):
+        return self.client.post(
+            reverse('route_module'),
+            json.dumps({'attempt_id': self.attempt.id, 'subject': 'MATH'}),
+            content_type='application/json'
+        )
+
+    def test_strong_module_one_routes_to_hard_module(self):
+        response = self.client.get(reverse('take_test', args=[self.attempt.id]))
+        self.assertEqual([s['module'] for s in response.context['sections']], ['M1'])
+
+        self.answer_all('M1')
+        self.assertEqual(self.route().json()['section_id'], self.sections['M2_HARD'].id)
+        self.assertEqual(self.route().json()['section_id'], self.sections['M2_HARD'].id)  # sticky
+
+        response = self.client.get(reverse('take_test', args=[self.attempt.id]))
+        self.assertEqual([s['module'] for s in response.context['sections']], ['M1', 'M2_HARD'])
+
+        self.answer_all('M2_HARD')
+        self.client.post(reverse('submit_test', args=[self.attempt.id]))
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.score, 800 + 200)  # 4 raw on the hard table, RW default curve at 0
+
+    def test_weak_module_one_routes_to_easy_module(self):
+        self.assertEqual(self.route().json()['section_id'], self.sections['M2_EASY'].id)
+        self.answer_all('M2_EASY')
+        result = get_exam_strategy('SAT_ADAPTIVE').calculate_score(UserTestAttempt.objects.get(pk=self.attempt.pk))
+        self.assertEqual(result['details'], {'rw': 200, 'math': 400})
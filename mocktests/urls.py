@@ -4,9 +4,18 @@ from . import views
 urlpatterns = [
     path('start/<slug:slug>/', views.start_test, name='start_test'),
     path('attempt/<int:attempt_id>/', views.take_test, name='take_test'),
+    path('api/attempt/<int:attempt_id>/paper/v<int:version>/section/<int:section_id>/', views.paper_section, name='paper_section'),
     path('api/save-answer/', views.save_answer, name='save_answer'),
+    path('api/save-answers/', views.save_answers_batch, name='save_answers_batch'),
+    path('api/attempt-events/', views.record_attempt_events, name='record_attempt_events'),
+    path('api/audio-upload/', views.start_audio_upload, name='start_audio_upload'),
+    path('api/audio-upload/<str:upload_id>/', views.audio_upload_chunk, name='audio_upload_chunk'),
+    path('api/route-module/', views.route_module, name='route_module'),
     path('submit/<int:attempt_id>/', views.submit_test, name='submit_test'),
     path('feedback/<int:attempt_id>/', views.exam_feedback, name='exam_feedback'), # <--- NEW LINE
     path('api/report-question/', views.report_question, name='report_question'),
     path('result/<int:attempt_id>/', views.test_result, name='test_result'),
+    path('api/attempt-status/<int:attempt_id>/', views.attempt_status, name='attempt_status'),
+    path('practice/', views.practice_home, name='practice_home'),
+    path('practice/<int:drill_id>/', views.practice_drill, name='practice_drill'),
 ]
\ No newline at end of file
@@ -0,0 +1,95 @@
+from django.utils import timezone
+
+from .attempt_tokens import is_revoked
+from .grading import get_answer_key
+from .models import UserAnswer
+
+# Columns overwritten when an answer for (attempt, question) already exists
+ANSWER_UPSERT_FIELDS = ['selected_option', 'selected_mask', 'text_answer', 'is_marked_for_review', 'modified']
+
+
+def normalize_answer_delta(delta):
+    """
+    Converts one client payload ({question_id, option_id, option_mask, text_input,
+    is_reviewed}) into the column values stored on UserAnswer. Returns None if it
+    is malformed.
+    """
+    try:
+        question_id = int(delta.get('question_id'))
+        option_id = int(delta['option_id']) if delta.get('option_id') else None
+        option_mask = int(delta.get('option_mask') or 0)
+    except (TypeError, ValueError, AttributeError):
+        return None
+    if option_mask < 0:
+        return None
+
+    text_input = delta.get('text_input')
+    return {
+        'question_id': question_id,
+        'selected_option_id': option_id,
+        'selected_mask': option_mask,
+        'text_answer': text_input if text_input else '',
+        'is_marked_for_review': bool(delta.get('is_reviewed', False)),
+    }
+
+
+def upsert_answers(attempt, rows):
+    """
+    Writes many answer rows for one attempt with a single INSERT ... ON CONFLICT.
+    `rows` are normalized dicts (see normalize_answer_delta); later rows for the
+    same question win, so the client can send its whole pending queue as-is.
+    Returns the list of question ids that were written, or None if the attempt
+    was closed for grading meanwhile (the rows may or may not be graded, so
+    they must not be acknowledged; see attempt_tokens.py).
+    """
+    latest = {}
+    for row in rows:
+        latest[row['question_id']] = row
+    if not latest:
+        return []
+
+    now = timezone.now()
+    objs = [
+        UserAnswer(
+            attempt_id=attempt.id,
+            question_id=row['question_id'],
+            selected_option_id=row['selected_option_id'],
+            selected_mask=row.get('selected_mask', 0),
+            text_answer=row['text_answer'],
+            is_marked_for_review=row['is_marked_for_review'],
+            created=now,
+            modified=now,
+        )
+        for row in latest.values()
+    ]
+    UserAnswer.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=['attempt', 'question'],
+        update_fields=ANSWER_UPSERT_FIELDS,
+    )
+    if is_revoked(attempt.id):
+        return None
+    return list(latest.keys())
+
+
+def validate_answer_rows(test, rows):
+    """
+    Splits normalized rows into (valid, rejected_question_ids) against the
+    cached answer key of the test version (no queries when warm): the question
+    must be on the paper, the option belong to the question, and the option
+    mask may only set the mask bits of the question's options.
+    """
+    key = get_answer_key(test)
+    positions = key.index_of([row['question_id'] for row in rows])
+
+    valid, rejected = [], []
+    for row, pos in zip(rows, positions.tolist()):
+        qid = row['question_id']
+        opt = row['selected_option_id']
+        if pos < 0 or (opt and key.option_question.get(opt) != qid) \
+                or row.get('selected_mask', 0) & ~int(key.option_bits[pos]):
+            rejected.append(qid)
+        else:
+            valid.append(row)
+    return valid, rejected
@@ -1,19 +1,35 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST
-from django.http import JsonResponse
+from django.contrib import messages
+from django.views.decorators.http import require_POST, require_http_methods
+from django.http import JsonResponse, Http404, HttpResponseNotModified
+from django.core.cache import cache
+from django.template.loader import render_to_string
 from django.utils import timezone
-from django.db.models import Prefetch
+from django.utils.cache import patch_cache_control
 import json
-from django.db import transaction
+import math
 
 from marketplace.models import MarketplaceItem, Testimonial
-from enrollments.models import UserEnrollment
 from .models import (
     QuestionReport, MockTestAttributes, UserTestAttempt, 
-    TestSection, TestQuestion, UserAnswer
+    TestQuestion, UserAnswer, PracticeDrill
 )
 from .services import get_exam_strategy
+from .paper import PAPER_CACHE_TIMEOUT, chunk_etag, get_media_manifest, get_paper
+from .results import get_result, analysis_items
+from .percentiles import get_histogram, standing
+from . import answer_buffer, attempt_events, audio_uploads, drills
+from .submissions import submit_attempt
+from .prewarm import get_cached_test_ids, is_enrolled
+from .attempt_tokens import is_revoked, issue_token, read_token
+from .cache_backends import CacheFull
+from .utils import normalize_answer_delta, validate_answer_rows, upsert_answers
+
+# Upper bound on deltas accepted by one save_answers_batch call (a full paper fits)
+MAX_BATCH_ANSWERS = 500
+# Link: rel=preload entries sent with take_test (first section's media)
+MAX_PRELOAD_LINKS = 20
 
 @login_required
 def start_test(request, slug):
@@ -21,25 +37,30 @@ def start_test(request, slug):
     Initializes the test. Handles enrollment checks and resuming.
     Directly starts the exam without showing the instruction page.
     """
-    item = get_object_or_404(MarketplaceItem, slug=slug)
+    # Scheduled tests are pre-warmed (prewarm.py): ids and enrollments come from cache
+    cached_ids = get_cached_test_ids(slug)
+    if cached_ids:
+        item_id, test_id = cached_ids
+    else:
+        item = get_object_or_404(MarketplaceItem, slug=slug)
+        item_id = item.id
+        test_id = get_object_or_404(MockTestAttributes.objects.only('pk'), item=item).pk
     
     # 1. Enrollment Check
-    if not UserEnrollment.objects.filter(user=request.user, item=item).exists():
+    if not is_enrolled(request.user.id, item_id):
         return redirect('marketplace:item_detail', slug=slug)
 
-    test_details = get_object_or_404(MockTestAttributes, item=item)
-
-    # 2. Get or Create Attempt
+    # 2. Get or Create Attempt (usually pre-created for scheduled tests)
     attempt, created = UserTestAttempt.objects.get_or_create(
         user=request.user,
-        test=test_details,
+        test_id=test_id,
         status=UserTestAttempt.Status.IN_PROGRESS
     )
 
-    # 3. Mark start time immediately if new
-    if created or not attempt.started_at:
+    # 3. Mark start time immediately if new (pre-created attempts have none yet)
+    if not attempt.started_at:
         attempt.started_at = timezone.now()
-        attempt.save()
+        attempt.save(update_fields=['started_at', 'modified'])
 
     # 4. Redirect directly to the exam environment
     return redirect('take_test', attempt_id=attempt.id)
@@ -52,8 +73,8 @@ def take_test(request, attempt_id):
     """
     attempt = get_object_or_404(UserTestAttempt, id=attempt_id, user=request.user)
     
-    # Redirect if already submitted
-    if attempt.status == UserTestAttempt.Status.SUBMITTED:
+    # Redirect if already submitted (or waiting for grading)
+    if attempt.status != UserTestAttempt.Status.IN_PROGRESS:
         return redirect('test_result', attempt_id=attempt.id)
 
     test = attempt.test
@@ -75,27 +96,149 @@ def take_test(request, attempt_id):
     # 2. Get Strategy (SAT, IELTS, or GENERAL)
     strategy = get_exam_strategy(test.exam_type)
 
-    # 3. Fetch Data (Optimized with Prefetch)
-    sections = TestSection.objects.filter(test=test).prefetch_related(
-        Prefetch('questions', queryset=TestQuestion.objects.order_by('sort_order').prefetch_related('options', 'images', 'audios'))
-    ).order_by('sort_order')
+    # 3. Fetch Data (precompiled paper, cached per test version and language)
+    paper = get_paper(test)
 
     # Load existing answers to repopulate the UI
     existing_answers = UserAnswer.objects.filter(attempt=attempt).values(
-        'question_id', 'selected_option_id', 'text_answer', 'is_marked_for_review'
+        'question_id', 'selected_option_id', 'selected_mask', 'text_answer', 'is_marked_for_review'
     )
     answers_dict = {str(a['question_id']): a for a in existing_answers}
 
+    # Overlay answers still staged in the write-behind buffer
+    if answer_buffer.is_enabled():
+        for qid, row in answer_buffer.get_buffered_rows(attempt).items():
+            answers_dict[str(qid)] = row
+
+    sections = strategy.visible_sections(paper, attempt)
+    # Media of the visible sections in order: the first preloads with the page, the rest prefetch in the background
+    manifest = {entry['section_id']: entry['media'] for entry in get_media_manifest(test)}
+    media = [{'section_id': s['id'], 'media': manifest.get(s['id'], [])} for s in sections]
+
     context = {
         'attempt': attempt,
         'test': test,
         'sections': sections,
+        'media_manifest_json': json.dumps(media[1:]),
+        'pending_routes_json': json.dumps(strategy.pending_routes(paper, attempt)),
         'answers_json': json.dumps(answers_dict),
         'remaining_seconds': remaining_seconds,
+        'attempt_token': issue_token(attempt, test),
     }
     
     template_name = strategy.get_take_test_template()
-    return render(request, template_name, context)
+    response = render(request, template_name, context)
+    if media and media[0]['media']:
+        response['Link'] = ', '.join(
+            f"<{m['url']}>; rel=preload; as={m['as']}" for m in media[0]['media'][:MAX_PRELOAD_LINKS]
+        )
+    return response
+
+
+def _get_valid_attempt(request, attempt_id):
+    """
+    Common security check for the autosave endpoints.
+    Returns (attempt, None) or (None, error JsonResponse).
+    """
+    att = get_object_or_404(UserTestAttempt.objects.select_related('test'), id=attempt_id, user=request.user)
+
+    # Check A: Is it already submitted?
+    if att.status != UserTestAttempt.Status.IN_PROGRESS:
+        return None, JsonResponse({'status': 'error', 'message': 'Test already submitted'}, status=403)
+
+    # Check B: Has the time expired? (+2 minute buffer for network latency)
+    if att.test.duration_minutes > 0 and att.started_at:
+        elapsed = (timezone.now() - att.started_at).total_seconds()
+        allowed = (att.test.duration_minutes * 60) + 120
+        if elapsed > allowed:
+            return None, JsonResponse({'status': 'error', 'message': 'Time limit exceeded'}, status=403)
+
+    return att, None
+
+
+def _get_save_attempt(request, attempt_id):
+    """
+    Authorizes an autosave. With the X-Attempt-Token header issued by take_test the
+    check is purely cryptographic (no queries) and returns an unsaved attempt
+    carrying only id/user_id/test_id and a test stub (pk, paper_version) that
+    validate_answer_rows reads the cached answer key with; without it, falls
+    back to _get_valid_attempt.
+    """
+    token = request.headers.get('X-Attempt-Token')
+    if not token:
+        return _get_valid_attempt(request, attempt_id)
+
+    claims, message = read_token(token, request.user.pk)
+    if claims is None or str(claims['a']) != str(attempt_id):
+        return None, JsonResponse({'status': 'error', 'message': message or 'Invalid attempt token'}, status=403)
+    attempt = UserTestAttempt(id=claims['a'], user_id=claims['u'], test_id=claims['t'])
+    if 'v' in claims:
+        attempt.test = MockTestAttributes(item_id=claims['t'], paper_version=claims['v'])
+    return attempt, None
+
+
+# Questions per ?page= of the section API
+SECTION_PAGE_SIZE = 20
+# Chunk URLs embed paper_version, so a cached chunk can never go stale
+SECTION_CHUNK_MAX_AGE = 365 * 24 * 3600
+
+
+@login_required
+def paper_section(request, attempt_id, version, section_id):
+    """
+    AJAX Endpoint: Rendered question blocks of one section (or one ?page= of it).
+    take_test renders only the first section; the exam UI fetches the rest on demand.
+    """
+    attempt, error = _get_valid_attempt(request, attempt_id)
+    if error:
+        return error
+
+    test = attempt.test
+    if version != test.paper_version:
+        # Edited mid-exam: the client reloads take_test to pick up the new version
+        return JsonResponse({'status': 'error', 'message': 'Paper updated', 'version': test.paper_version}, status=409)
+
+    strategy = get_exam_strategy(test.exam_type)
+    paper = get_paper(test)
+    section = next((s for s in strategy.visible_sections(paper, attempt) if s['id'] == section_id), None)
+    if section is None:
+        raise Http404("Section not available")
+
+    try:
+        page = int(request.GET.get('page') or 0)
+    except ValueError:
+        page = 0
+    questions = section['questions']
+    num_pages = max(1, math.ceil(len(questions) / SECTION_PAGE_SIZE))
+    offset = 0
+    if page:
+        if page > num_pages:
+            raise Http404("Page out of range")
+        offset = (page - 1) * SECTION_PAGE_SIZE
+        questions = questions[offset:offset + SECTION_PAGE_SIZE]
+
+    template_name = strategy.get_question_blocks_template()
+    etag = chunk_etag(paper, section_id, page, template_name)
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        cache_key = f"paperchunk:{etag}"
+        payload = cache.get(cache_key)
+        if payload is None:
+            payload = {
+                'section_id': section_id,
+                'version': paper['version'],
+                'page': page,
+                'num_pages': num_pages,
+                'question_ids': [q['id'] for q in questions],
+                'html': render_to_string(template_name, {'section': section, 'questions': questions, 'offset': offset}),
+            }
+            cache.set(cache_key, payload, PAPER_CACHE_TIMEOUT)
+        response = JsonResponse(payload)
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=SECTION_CHUNK_MAX_AGE, immutable=True)
+    return response
 
 
 @login_required
@@ -105,108 +248,221 @@ def save_answer(request):
     AJAX Endpoint: Saves answers (Text, Radio, Audio).
     Includes Security & Timer checks.
     """
-    # 1. Common Security Check Helper
-    def get_valid_attempt(att_id):
-        att = get_object_or_404(UserTestAttempt, id=att_id, user=request.user)
-        
-        # Check A: Is it already submitted?
-        if att.status == UserTestAttempt.Status.SUBMITTED:
-            return None, JsonResponse({'status': 'error', 'message': 'Test already submitted'}, status=403)
-        
-        # Check B: Has the time expired? (+2 minute buffer for network latency)
-        if att.test.duration_minutes > 0 and att.started_at:
-            elapsed = (timezone.now() - att.started_at).total_seconds()
-            allowed = (att.test.duration_minutes * 60) + 120 
-            if elapsed > allowed:
-                return None, JsonResponse({'status': 'error', 'message': 'Time limit exceeded'}, status=403)
-                
-        return att, None
-
     # A. Handle File Upload (Audio/Speaking)
     if request.content_type.startswith('multipart/form-data'):
         attempt_id = request.POST.get('attempt_id')
         question_id = request.POST.get('question_id')
         audio_file = request.FILES.get('audio_data')
         
-        attempt, error_response = get_valid_attempt(attempt_id)
+        attempt, error_response = _get_save_attempt(request, attempt_id)
         if error_response: return error_response
 
         question = get_object_or_404(TestQuestion, id=question_id)
-        
+
         answer, created = UserAnswer.objects.update_or_create(
             attempt=attempt,
             question=question,
             defaults={'audio_answer': audio_file}
         )
+        # Checked after the write: a save that still sees the attempt open is graded
+        if is_revoked(attempt.id):
+            return JsonResponse({'status': 'error', 'message': 'Test already submitted'}, status=403)
         return JsonResponse({'status': 'uploaded', 'url': answer.audio_answer.url})
 
     # B. Handle JSON (MCQ / Text)
     else:
-        data = json.loads(request.body)
-        attempt_id = data.get('attempt_id')
-        question_id = data.get('question_id')
-        option_id = data.get('option_id')
-        text_input = data.get('text_input')
-        is_reviewed = data.get('is_reviewed', False)
-
-        attempt, error_response = get_valid_attempt(attempt_id)
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({'status': 'error', 'message': 'Body must be an object'}, status=400)
+
+        attempt, error_response = _get_save_attempt(request, data.get('attempt_id'))
         if error_response: return error_response
 
-        question = get_object_or_404(TestQuestion, id=question_id)
+        # Same checks as the batch endpoint: option of the question, mask bits of its options
+        row = normalize_answer_delta(data)
+        if row is None or not validate_answer_rows(attempt.test, [row])[0]:
+            return JsonResponse({'status': 'error', 'message': 'Invalid answer'}, status=400)
+
+        # Write-behind: acknowledge from the buffer, flushed to UserAnswer later
+        if answer_buffer.is_enabled():
+            if answer_buffer.buffer_answers(attempt, [row]) is None:
+                return JsonResponse({'status': 'error', 'message': 'Test already submitted'}, status=403)
+            return JsonResponse({'status': 'saved', 'answer_id': None})
 
         answer, created = UserAnswer.objects.update_or_create(
             attempt=attempt,
-            question=question,
+            question_id=row['question_id'],
             defaults={
-                'selected_option_id': option_id if option_id else None,
-                'text_answer': text_input if text_input else '',
-                'is_marked_for_review': is_reviewed
+                'selected_option_id': row['selected_option_id'],
+                'selected_mask': row['selected_mask'],
+                'text_answer': row['text_answer'],
+                'is_marked_for_review': row['is_marked_for_review'],
             }
         )
-        
+        if is_revoked(attempt.id):
+            return JsonResponse({'status': 'error', 'message': 'Test already submitted'}, status=403)
+
         return JsonResponse({'status': 'saved', 'answer_id': answer.id})
 
 
+def _upload_error(exc):
+    payload = {'status': 'error', 'message': str(exc)}
+    if exc.offset is not None:
+        payload['offset'] = exc.offset
+    return JsonResponse(payload, status=exc.status)
+
+
+@login_required
+@require_POST
+def start_audio_upload(request):
+    """
+    AJAX Endpoint: Opens a chunked, resumable audio upload (see audio_uploads.py).
+    Body: {"attempt_id", "question_id", "total_size", "content_type"}
+    """
+    try:
+        data = json.loads(request.body)
+        total_size = int(data.get('total_size') or 0)
+        question_id = int(data.get('question_id'))
+    except (TypeError, ValueError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+
+    attempt, error_response = _get_save_attempt(request, data.get('attempt_id'))
+    if error_response: return error_response
+
+    if not TestQuestion.objects.filter(id=question_id, section__test_id=attempt.test_id).exists():
+        return JsonResponse({'status': 'error', 'message': 'Unknown question'}, status=404)
+
+    try:
+        session = audio_uploads.start_session(attempt, question_id, total_size, str(data.get('content_type') or ''))
+    except audio_uploads.UploadError as exc:
+        return _upload_error(exc)
+    return JsonResponse({'upload_id': session['upload_id'], 'chunk_size': session['chunk_size'], 'offset': 0})
+
+
+@login_required
+@require_http_methods(['GET', 'POST'])
+def audio_upload_chunk(request, upload_id):
+    """
+    AJAX Endpoint: GET returns the acknowledged offset (resume);
+    POST appends the raw body at the X-Upload-Offset header.
+    """
+    try:
+        session = audio_uploads.get_session(upload_id)
+        if session['user_id'] != request.user.pk:
+            raise audio_uploads.UploadError('Unknown upload', status=404)
+        if request.method == 'GET':
+            return JsonResponse({'upload_id': upload_id, 'offset': session['offset'], 'chunk_size': session['chunk_size']})
+
+        attempt, error_response = _get_save_attempt(request, session['attempt_id'])
+        if error_response: return error_response
+
+        offset = int(request.headers.get('X-Upload-Offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        new_offset = audio_uploads.append_chunk(session, offset, request, length)
+        if new_offset < session['total_size']:
+            return JsonResponse({'status': 'partial', 'offset': new_offset})
+        answer = audio_uploads.complete(session)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Missing X-Upload-Offset'}, status=400)
+    except audio_uploads.UploadError as exc:
+        return _upload_error(exc)
+
+    return JsonResponse({'status': 'uploaded', 'offset': new_offset, 'url': answer.audio_answer.url})
+
+
+@login_required
+@require_POST
+def save_answers_batch(request):
+    """
+    AJAX Endpoint: Saves a queue of answer deltas for one attempt.
+    Validates the attempt/timer once and upserts every row in one statement.
+    Body: {"attempt_id": 1, "answers": [{"question_id", "option_id", "text_input", "is_reviewed"}, ...]}
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'status': 'error', 'message': 'Body must be an object'}, status=400)
+
+    deltas = data.get('answers')
+    if not isinstance(deltas, list):
+        return JsonResponse({'status': 'error', 'message': 'answers must be a list'}, status=400)
+    if len(deltas) > MAX_BATCH_ANSWERS:
+        return JsonResponse({'status': 'error', 'message': 'Too many answers in one batch'}, status=400)
+
+    attempt, error_response = _get_save_attempt(request, data.get('attempt_id'))
+    if error_response: return error_response
+
+    rows = [normalize_answer_delta(d) for d in deltas]
+    malformed = len([r for r in rows if r is None])
+    valid, rejected = validate_answer_rows(attempt.test, [r for r in rows if r is not None])
+
+    if answer_buffer.is_enabled():
+        saved = answer_buffer.buffer_answers(attempt, valid)
+    else:
+        saved = upsert_answers(attempt, valid)
+    if saved is None:
+        return JsonResponse({'status': 'error', 'message': 'Test already submitted'}, status=403)
+
+    # Per-question acknowledgements let the client drop its pending queue entries
+    acks = [{'question_id': qid, 'status': 'saved'} for qid in saved]
+    acks += [{'question_id': qid, 'status': 'rejected'} for qid in rejected]
+
+    return JsonResponse({'status': 'saved', 'acks': acks, 'malformed': malformed})
+
+
+@login_required
+@require_POST
+def record_attempt_events(request):
+    """
+    AJAX Endpoint: Appends a batch of client events (question focus/blur, tab
+    visibility, review toggles) to the attempt's event buffer. Nothing is
+    written to the database here (see attempt_events.py).
+    Body: {"attempt_id": 1, "events": [{"type": "focus", "question_id": 5, "t": 1700000000000}, ...]}
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'status': 'error', 'message': 'Body must be an object'}, status=400)
+
+    events = data.get('events')
+    if not isinstance(events, list):
+        return JsonResponse({'status': 'error', 'message': 'events must be a list'}, status=400)
+    if len(events) > attempt_events.MAX_EVENTS_PER_BATCH:
+        return JsonResponse({'status': 'error', 'message': 'Too many events in one batch'}, status=400)
+
+    attempt, error_response = _get_save_attempt(request, data.get('attempt_id'))
+    if error_response: return error_response
+
+    packed, accepted = attempt_events.pack_events(events)
+    if accepted:
+        try:
+            attempt_events.buffer_events(attempt.id, packed)
+        except CacheFull:
+            # The client keeps the batch and sends it again
+            return JsonResponse({'status': 'error', 'message': 'Event buffer is full, retry later'}, status=503)
+    return JsonResponse({'status': 'saved', 'accepted': accepted, 'malformed': len(events) - accepted})
+
+
 @login_required
 def submit_test(request, attempt_id):
     """
-    Calculates score based on strategy and marks attempt as SUBMITTED.
+    Closes the attempt and queues it for grading (see submissions.py).
+    Grading runs in the submission worker, or inline when ASYNC_SUBMISSIONS is off.
     """
     attempt = get_object_or_404(UserTestAttempt, id=attempt_id, user=request.user)
-    test = attempt.test
 
     # Process if POST request OR if it's an auto-submit (via GET from take_test)
-    # Use atomic transaction and select_for_update to prevent double submissions
-    with transaction.atomic():
-        # Re-fetch with lock
-        attempt = UserTestAttempt.objects.select_for_update().get(id=attempt_id)
-        
-        if request.method == 'POST' or attempt.status != UserTestAttempt.Status.SUBMITTED:
-            # Double check status inside lock
-            if attempt.status == UserTestAttempt.Status.SUBMITTED:
-                return redirect('exam_feedback', attempt_id=attempt.id)
-
-            strategy = get_exam_strategy(test.exam_type)
-            
-            # 1. Grade & Calculate Score
-            # This calls grade_answers() internally in our new services.py
-            result_data = strategy.calculate_score(attempt)
-            
-            # 2. Finalize Attempt
-            attempt.status = UserTestAttempt.Status.SUBMITTED
-            attempt.completed_at = timezone.now()
-            attempt.score = result_data['score']
-            
-            # 3. Pass/Fail Logic
-            if isinstance(result_data.get('passed'), bool):
-                 attempt.is_passed = result_data['passed']
-            else:
-                 # Fallback
-                 attempt.is_passed = attempt.score >= test.pass_percentage
-            
-            attempt.save()
-    
-            return redirect('exam_feedback', attempt_id=attempt.id)
+    if request.method == 'POST' or attempt.status == UserTestAttempt.Status.IN_PROGRESS:
+        # Locks the row, so double submissions only enqueue once
+        submit_attempt(attempt.id)
+        return redirect('exam_feedback', attempt_id=attempt.id)
 
     return redirect('take_test', attempt_id=attempt_id)
 
@@ -218,8 +474,8 @@ def exam_feedback(request, attempt_id):
     """
     attempt = get_object_or_404(UserTestAttempt, id=attempt_id, user=request.user)
     
-    # Security: Cannot give feedback if not submitted
-    if attempt.status != UserTestAttempt.Status.SUBMITTED:
+    # Security: Cannot give feedback if not submitted (grading may still be running)
+    if attempt.status == UserTestAttempt.Status.IN_PROGRESS:
         return redirect('take_test', attempt_id=attempt.id)
 
     # Check if user has already given feedback for this Item
@@ -254,7 +510,8 @@ def exam_feedback(request, attempt_id):
 
     context = {
         'attempt': attempt,
-        'existing_review': existing_review
+        'existing_review': existing_review,
+        'is_processing': attempt.status == UserTestAttempt.Status.GRADING,
     }
     return render(request, 'mocktests/feedback_page.html', context)
 
@@ -264,83 +521,75 @@ def test_result(request, attempt_id):
     """
     Displays the result using the strategy-specific template.
     """
-    attempt = get_object_or_404(UserTestAttempt, id=attempt_id, user=request.user)
+    attempt = get_object_or_404(
+        UserTestAttempt.objects.select_related('test__item', 'test__score_histogram', 'result'), id=attempt_id, user=request.user
+    )
     
     # Prevent viewing result if test isn't finished
-    if attempt.status != UserTestAttempt.Status.SUBMITTED:
+    if attempt.status == UserTestAttempt.Status.IN_PROGRESS:
         return redirect('take_test', attempt_id=attempt.id)
 
-    strategy = get_exam_strategy(attempt.test.exam_type)
+    # Submitted but still queued for grading: show the processing page, which polls attempt_status
+    if attempt.status == UserTestAttempt.Status.GRADING:
+        return render(request, 'mocktests/result_processing.html', {'attempt': attempt})
 
-    # 1. Basic Stats
-    total_questions = TestQuestion.objects.filter(section__test=attempt.test).count()
-    correct_answers = attempt.answers.filter(is_correct=True).count()
-    
-    # Count incorrect (excluding skipped/empty)
-    incorrect_answers = attempt.answers.filter(is_correct=False).exclude(
-        selected_option__isnull=True, 
-        text_answer__exact=''
-    ).count()
-    
-    skipped_answers = total_questions - (correct_answers + incorrect_answers)
-    accuracy = (correct_answers / total_questions * 100) if total_questions > 0 else 0
-    
-    time_taken = "N/A"
-    if attempt.completed_at and attempt.started_at:
-        duration = attempt.completed_at - attempt.started_at
-        total_seconds = int(duration.total_seconds())
-        hours, remainder = divmod(total_seconds, 3600)
-        minutes, seconds = divmod(remainder, 60)
-        time_taken = f"{hours:02}:{minutes:02}:{seconds:02}"
-    
-    # Calculate Total Max Marks
-    from django.db.models import Sum
-    total_marks = TestQuestion.objects.filter(section__test=attempt.test).aggregate(Sum('marks'))['marks__sum'] or 0
-
-    # 2. Detailed Question Analysis
-    all_questions = TestQuestion.objects.filter(
-        section__test=attempt.test
-    ).select_related('section').prefetch_related('options', 'images').order_by('section__sort_order', 'sort_order')
-
-    user_answers_map = {a.question_id: a for a in attempt.answers.select_related('selected_option').all()}
-    
-    analysis_list = []
-    for question in all_questions:
-        user_answer = user_answers_map.get(question.id)
-        selected_option = None
-        status = 'SKIPPED'
-        
-        if user_answer:
-            selected_option = user_answer.selected_option
-            if user_answer.is_correct:
-                status = 'CORRECT'
-            elif selected_option or (user_answer.text_answer and user_answer.text_answer.strip()):
-                status = 'WRONG'
-        
-        analysis_list.append({
-            'question': question,
-            'user_answer': user_answer,
-            'selected_option': selected_option,
-            'status': status
-        })
+    strategy = get_exam_strategy(attempt.test.exam_type)
+    paper = get_paper(attempt.test)
+    result = get_result(attempt)
 
     context = {
         'attempt': attempt,
-        'total_questions': total_questions,
-        'correct_answers': correct_answers,
-        'incorrect_answers': incorrect_answers,
-        'skipped_answers': skipped_answers,
-        'accuracy': round(accuracy, 1),
-        'time_taken': time_taken,
-        'analysis_list': analysis_list,
+        'result': result,
+        'total_questions': result.total_questions,
+        'correct_answers': result.correct_count,
+        'incorrect_answers': result.incorrect_count,
+        'skipped_answers': result.skipped_count,
+        'accuracy': round(float(result.accuracy), 1),
+        'time_taken': result.time_taken,
+        'analysis_list': analysis_items(result, paper),
         'score_details': attempt.score, # Pass score for templates
-        'total_marks': total_marks,
+        'total_marks': result.total_marks,
+        'standing': standing(get_histogram(attempt.test), attempt.score),
     }
+    context.update(strategy.result_context(attempt))
     
     # 3. Use Strategy Template
     template_name = strategy.get_result_template()
     return render(request, template_name, context)
 
+@login_required
+@require_POST
+def route_module(request):
+    """
+    AJAX Endpoint: Adaptive exams call this when the candidate finishes module 1
+    of a subject. Returns the module-2 section the candidate was routed to.
+    """
+    data = json.loads(request.body)
+    attempt, error_response = _get_valid_attempt(request, data.get('attempt_id'))
+    if error_response: return error_response
+
+    strategy = get_exam_strategy(attempt.test.exam_type)
+    section_id = None
+    if hasattr(strategy, 'route_module'):
+        section_id = strategy.route_module(attempt, data.get('subject'))
+    if section_id is None:
+        return JsonResponse({'status': 'error', 'message': 'No adaptive module for this subject'}, status=400)
+
+    return JsonResponse({'status': 'routed', 'section_id': section_id})
+
+
+@login_required
+def attempt_status(request, attempt_id):
+    """
+    AJAX Endpoint: Polled by the processing page until grading completes.
+    """
+    attempt = get_object_or_404(UserTestAttempt.objects.only('id', 'status', 'user_id'), id=attempt_id, user=request.user)
+    return JsonResponse({
+        'status': attempt.status,
+        'is_ready': attempt.status == UserTestAttempt.Status.SUBMITTED,
+    })
+
+
 @login_required
 @require_POST
 def report_question(request):
@@ -354,4 +603,89 @@ def report_question(request):
     question = get_object_or_404(TestQuestion, id=question_id)
     QuestionReport.objects.create(user=request.user, question=question, report_text=reason)
     
-    return JsonResponse({'status': 'success', 'message': 'Report submitted.'})
\ No newline at end of file
+    return JsonResponse({'status': 'success', 'message': 'Report submitted.'})
+
+
+@login_required
+def practice_home(request):
+    """
+    Practice mode: pick an exam type, topic and difficulty and get a short
+    drill of questions not yet answered correctly, from the tests the user
+    may access (see drills.py).
+    """
+    catalog = drills.get_catalog(request.user)
+
+    if request.method == "POST":
+        exam_type = request.POST.get('exam_type', '')
+        topic = request.POST.get('topic', '')
+        difficulty = request.POST.get('difficulty', '')
+        try:
+            size = int(request.POST.get('size') or drills.DEFAULT_SIZE)
+        except ValueError:
+            size = drills.DEFAULT_SIZE
+
+        known = any(
+            p['exam_type'] == exam_type and drills.normalize_topic(p['topic']) == drills.normalize_topic(topic)
+            for p in catalog
+        )
+        if not known or difficulty not in ('', *drills.DIFFICULTIES):
+            messages.error(request, "Please choose a topic from the list.")
+            return redirect('practice_home')
+
+        drill = drills.build_drill(request.user, exam_type, topic, difficulty, size)
+        if drill is None:
+            messages.info(request, "You have already answered every question of this topic correctly. Try another one!")
+            return redirect('practice_home')
+        return redirect('practice_drill', drill_id=drill.id)
+
+    exam_labels = dict(MockTestAttributes.EXAM_TYPES)
+    topics = {}
+    for pool in catalog:
+        entry = topics.setdefault((pool['exam_type'], drills.normalize_topic(pool['topic'])), {
+            'exam_type': pool['exam_type'],
+            'exam_label': exam_labels.get(pool['exam_type'], pool['exam_type']),
+            'topic': pool['topic'],
+            'count': 0,
+        })
+        entry['count'] += pool['count']
+
+    context = {
+        'topics': sorted(topics.values(), key=lambda t: (t['exam_label'], t['topic'])),
+        'difficulties': TestQuestion.DIFFICULTY_CHOICES,
+        'default_size': drills.DEFAULT_SIZE,
+        'max_size': drills.MAX_SIZE,
+        'recent_drills': PracticeDrill.objects.filter(user=request.user).order_by('-created')[:5],
+    }
+    return render(request, 'mocktests/practice_home.html', context)
+
+
+@login_required
+def practice_drill(request, drill_id):
+    """Answers a drill (POST grades it once) and reviews it afterwards."""
+    drill = get_object_or_404(PracticeDrill, id=drill_id, user=request.user)
+
+    if request.method == "POST" and drill.completed_at is None:
+        selections = {}
+        for key, value in request.POST.items():
+            if key.startswith('q_') and key[2:].isdigit() and value.isdigit():
+                selections[int(key[2:])] = int(value)
+        drills.grade_drill(drill, selections)
+        return redirect('practice_drill', drill_id=drill.id)
+
+    question_ids, selected, correct = drills.unpack(drill)
+    questions = TestQuestion.objects.filter(id__in=question_ids.tolist()).prefetch_related('options').in_bulk()
+    items = [
+        {
+            'question': questions[qid],
+            'selected_option_id': int(selected[i]) or None,
+            'is_correct': bool(correct[i]),
+        }
+        for i, qid in enumerate(question_ids.tolist()) if qid in questions
+    ]
+
+    context = {
+        'drill': drill,
+        'items': items,
+        'is_completed': drill.completed_at is not None,
+    }
+    return render(request, 'mocktests/practice_drill.html', context)